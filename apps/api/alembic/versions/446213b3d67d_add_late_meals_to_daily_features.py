@@ -0,0 +1,32 @@
+"""Add late_meals to daily_features
+
+Revision ID: 446213b3d67d
+Revises: d4d29da5c370
+Create Date: 2026-10-18 11:40:07.518392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '446213b3d67d'
+down_revision: Union[str, Sequence[str], None] = 'd4d29da5c370'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('daily_features') as batch_op:
+        batch_op.add_column(
+            sa.Column('late_meals', sa.Integer(), nullable=False, server_default='0')
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('daily_features') as batch_op:
+        batch_op.drop_column('late_meals')
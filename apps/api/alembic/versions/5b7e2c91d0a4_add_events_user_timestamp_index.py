@@ -0,0 +1,28 @@
+"""Add composite (user_id, timestamp) index on events
+
+Revision ID: 5b7e2c91d0a4
+Revises: 82c3be6edde5
+Create Date: 2026-10-18 16:42:08.517203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2c91d0a4'
+down_revision: Union[str, Sequence[str], None] = '82c3be6edde5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_events_user_id_timestamp', 'events', ['user_id', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_events_user_id_timestamp', table_name='events')
@@ -0,0 +1,42 @@
+"""Add recommendations table for precomputed results
+
+Revision ID: 82c3be6edde5
+Revises: 446213b3d67d
+Create Date: 2026-10-18 13:05:52.930144
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '82c3be6edde5'
+down_revision: Union[str, Sequence[str], None] = '446213b3d67d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('recommendations',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('channel', sa.String(), nullable=True),
+    sa.Column('content', sa.JSON(), nullable=True),
+    sa.Column('rules_applied', sa.JSON(), nullable=True),
+    sa.Column('model_version', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('feedback', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'date', 'model_version', name='uq_recommendations_user_date_version')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('recommendations')
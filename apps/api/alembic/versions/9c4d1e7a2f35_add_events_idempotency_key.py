@@ -0,0 +1,32 @@
+"""Add idempotency_key with a unique index to events
+
+Revision ID: 9c4d1e7a2f35
+Revises: 5b7e2c91d0a4
+Create Date: 2026-10-18 18:03:44.120586
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4d1e7a2f35'
+down_revision: Union[str, Sequence[str], None] = '5b7e2c91d0a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('events') as batch_op:
+        batch_op.add_column(sa.Column('idempotency_key', sa.String(), nullable=True))
+    op.create_index('uq_events_idempotency_key', 'events', ['idempotency_key'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_events_idempotency_key', table_name='events')
+    with op.batch_alter_table('events') as batch_op:
+        batch_op.drop_column('idempotency_key')
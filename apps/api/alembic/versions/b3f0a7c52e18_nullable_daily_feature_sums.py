@@ -0,0 +1,67 @@
+"""Make daily_features sums nullable so days without data are told apart
+
+Revision ID: b3f0a7c52e18
+Revises: e2a6f0b4c813
+Create Date: 2026-10-18 21:05:12.304518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f0a7c52e18'
+down_revision: Union[str, Sequence[str], None] = 'e2a6f0b4c813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Daily columns and the event type that sets them
+SUM_COLUMNS = {
+    'calories': 'diet',
+    'protein_g': 'diet',
+    'carbs_g': 'diet',
+    'fat_g': 'diet',
+    'fiber_g': 'diet',
+    'steps': 'activity',
+    'sleep_hours': 'sleep',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('daily_features') as batch_op:
+        for column in SUM_COLUMNS:
+            batch_op.alter_column(column, existing_type=sa.Float(), nullable=True)
+
+    # Zeros written for event types a day never had become NULL. Days whose
+    # events are no longer stored are left as they are.
+    for event_type in sorted(set(SUM_COLUMNS.values())):
+        columns = [column for column, source in SUM_COLUMNS.items() if source == event_type]
+        op.execute(
+            f"""
+            UPDATE daily_features
+            SET {', '.join(f'{column} = NULL' for column in columns)}
+            WHERE EXISTS (
+                SELECT 1 FROM events
+                WHERE events.user_id = daily_features.user_id
+                AND date(events.timestamp) = daily_features.date
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM events
+                WHERE events.user_id = daily_features.user_id
+                AND date(events.timestamp) = daily_features.date
+                AND events.event_type = '{event_type}'
+            )
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in SUM_COLUMNS:
+        op.execute(f"UPDATE daily_features SET {column} = 0 WHERE {column} IS NULL")
+    with op.batch_alter_table('daily_features') as batch_op:
+        for column in SUM_COLUMNS:
+            batch_op.alter_column(column, existing_type=sa.Float(), nullable=False)
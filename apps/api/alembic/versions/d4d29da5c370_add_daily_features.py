@@ -0,0 +1,49 @@
+"""Add daily_features and per-event fiber/steps columns
+
+Revision ID: d4d29da5c370
+Revises: f81b85363b82
+Create Date: 2026-10-18 09:12:31.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4d29da5c370'
+down_revision: Union[str, Sequence[str], None] = 'f81b85363b82'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('events') as batch_op:
+        batch_op.add_column(sa.Column('fiber_g', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('steps', sa.Integer(), nullable=True))
+
+    op.create_table('daily_features',
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('calories', sa.Float(), nullable=False),
+    sa.Column('protein_g', sa.Float(), nullable=False),
+    sa.Column('carbs_g', sa.Float(), nullable=False),
+    sa.Column('fat_g', sa.Float(), nullable=False),
+    sa.Column('fiber_g', sa.Float(), nullable=False),
+    sa.Column('steps', sa.Float(), nullable=False),
+    sa.Column('sleep_hours', sa.Float(), nullable=False),
+    sa.Column('event_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'date')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('daily_features')
+    with op.batch_alter_table('events') as batch_op:
+        batch_op.drop_column('steps')
+        batch_op.drop_column('fiber_g')
@@ -0,0 +1,40 @@
+"""Add user_deletion_jobs table for background user deletion
+
+Revision ID: e2a6f0b4c813
+Revises: 9c4d1e7a2f35
+Create Date: 2026-10-18 19:21:37.664091
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a6f0b4c813'
+down_revision: Union[str, Sequence[str], None] = '9c4d1e7a2f35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_deletion_jobs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('deleted', sa.JSON(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_deletion_jobs_user_id'), 'user_deletion_jobs', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_user_deletion_jobs_user_id'), table_name='user_deletion_jobs')
+    op.drop_table('user_deletion_jobs')
@@ -12,17 +12,27 @@ The Settings class reads configuration from environment variables. Adjust the
 `allowed_origins` list and `api_key` to reflect real values in production.
 """
 
-from fastapi import FastAPI, Depends, HTTPException, Security, status
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Security, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
 from pydantic_settings import BaseSettings
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Any
 
-from .routes import ingest, users
+from .routes import blobs, ingest, users
 from .routers import events, recommendations, image_analyzer
 import logging
 
+from .models.database import get_async_db
+from .services.daily_features import get_daily_features, row_to_metrics
 from .services.privacy import PIIFilter
+from .services import write_behind
+from .services.dispatch import event_dispatcher
+from .services.http_client import shared_http_client
 
 
 class Settings(BaseSettings):
@@ -67,11 +77,32 @@ async def verify_api_key(
     return api_key
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start background workers and open the shared HTTP client.
+
+    On shutdown, flush events still queued for writing and publishing and
+    close the HTTP client's pooled connections.
+    """
+    writer = write_behind.event_writer
+    if writer.enabled:
+        await writer.start()
+    shared_http_client.get()
+    try:
+        yield
+    finally:
+        await writer.stop()
+        await asyncio.to_thread(event_dispatcher.stop)
+        await shared_http_client.aclose()
+
+
 # Create FastAPI application with metadata from settings
 app = FastAPI(
     title=settings.api_title,
     description=settings.api_description,
     version=settings.api_version,
+    lifespan=lifespan,
 )
 
 # Configure CORS middleware
@@ -91,6 +122,9 @@ app.include_router(
     dependencies=[Depends(verify_api_key)],
 )
 
+# blobs router serves signed URLs: the signature replaces the API key
+app.include_router(blobs.router)
+
 # events router already declares its own prefix (/events)
 app.include_router(
     events.router,
@@ -122,18 +156,17 @@ app.include_router(
 
 
 @app.get("/api/metrics", tags=["metrics"])
-async def get_metrics(user_id: str = "default") -> dict[str, Any]:
-    """Get aggregated metrics for a user (placeholder for now)."""
-    # TODO: Fetch real events from database and aggregate
-    from .services.recommendations import aggregate_metrics
-    # Mock events for demo
-    mock_events = [
-        {"type": "diet", "calories": 500, "fiber_g": 5},
-        {"type": "activity", "steps": 3000},
-        {"type": "sleep", "duration_minutes": 480}
-    ]
-    metrics = aggregate_metrics(mock_events)
-    return metrics
+async def get_metrics(
+    user_id: str = "default",
+    day: date | None = Query(None, alias="date"),
+    db: AsyncSession = Depends(get_async_db),
+) -> dict[str, Any]:
+    """Get a user's aggregated metrics for a day (defaults to today, UTC).
+
+    Reads the materialized daily_features row instead of re-summing events.
+    """
+    row = await db.run_sync(get_daily_features, user_id, day or datetime.utcnow().date())
+    return row_to_metrics(row)
 
 
 @app.get("/", tags=["health"])
@@ -1,16 +1,54 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text
+import os
+from sqlalchemy import create_engine, Column, Integer, String, Float, Date, DateTime, ForeignKey, Index, Text, JSON, UniqueConstraint
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, Session
 from datetime import datetime
-from typing import Generator
+from typing import Any, AsyncGenerator, Dict, Generator
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./nutrition.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./nutrition.db")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Async drivers used for the same database on the async engine
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_database_url(url: str) -> str:
+    """Rewrite a sync database URL to use the matching async driver."""
+    scheme, _, rest = url.partition("://")
+    backend = scheme.split("+", 1)[0]
+    return f"{ASYNC_DRIVERS.get(backend, scheme)}://{rest}"
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """
+    Connection and pool options for an engine, configurable via environment.
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT and DB_POOL_RECYCLE tune the
+    connection pool; in-memory SQLite keeps SQLAlchemy's default single-connection pool.
+    """
+    options: Dict[str, Any] = {}
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in url or url.rstrip("/").endswith(":"):
+            return options
+    options.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        pool_pre_ping=not url.startswith("sqlite"),
+    )
+    return options
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_database_url(SQLALCHEMY_DATABASE_URL))
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 class User(Base):
@@ -23,6 +61,7 @@ class User(Base):
     # Relationships
     events = relationship("Event", back_populates="user")
     targets = relationship("UserTarget", back_populates="user")
+    daily_features = relationship("DailyFeature", back_populates="user")
 
 class UserTarget(Base):
     __tablename__ = "user_targets"
@@ -40,6 +79,12 @@ class UserTarget(Base):
 
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        # Serves per-user time-range reads: GET /events/{user_id}, daily rebuilds
+        Index("ix_events_user_id_timestamp", "user_id", "timestamp"),
+        # Rejects re-sent events; see services/idempotency.py
+        Index("uq_events_idempotency_key", "idempotency_key", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String, ForeignKey("users.id"))
@@ -52,18 +97,78 @@ class Event(Base):
     protein_g = Column(Float, nullable=True)
     carbs_g = Column(Float, nullable=True)
     fat_g = Column(Float, nullable=True)
+    fiber_g = Column(Float, nullable=True)
 
     # Activity event fields
     activity_type = Column(String, nullable=True)
     duration_minutes = Column(Float, nullable=True)
     calories_burned = Column(Float, nullable=True)
+    steps = Column(Integer, nullable=True)
 
     # Sleep event fields
     sleep_hours = Column(Float, nullable=True)
     sleep_quality = Column(String, nullable=True)
 
+    # Content hash of user, type, timestamp and fields; NULL for events stored before it existed
+    idempotency_key = Column(String, nullable=True)
+
     user = relationship("User", back_populates="events")
 
+class DailyFeature(Base):
+    """Running per-(user, day) totals, updated as each event is ingested."""
+
+    __tablename__ = "daily_features"
+
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    # NULL until an event of the matching type is ingested for the day
+    calories = Column(Float, nullable=True)
+    protein_g = Column(Float, nullable=True)
+    carbs_g = Column(Float, nullable=True)
+    fat_g = Column(Float, nullable=True)
+    fiber_g = Column(Float, nullable=True)
+    steps = Column(Float, nullable=True)
+    sleep_hours = Column(Float, nullable=True)
+    late_meals = Column(Integer, nullable=False, default=0)
+    event_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user = relationship("User", back_populates="daily_features")
+
+class Recommendation(Base):
+    """Recommendations precomputed for a user and day by the nightly job."""
+
+    __tablename__ = "recommendations"
+    __table_args__ = (
+        UniqueConstraint("user_id", "date", "model_version", name="uq_recommendations_user_date_version"),
+    )
+
+    id = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    channel = Column(String, nullable=True)
+    content = Column(JSON, nullable=True)
+    rules_applied = Column(JSON, nullable=True)
+    model_version = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="ready")
+    feedback = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class UserDeletionJob(Base):
+    """Progress of a background deletion of all data of a user."""
+
+    __tablename__ = "user_deletion_jobs"
+
+    id = Column(String, primary_key=True)
+    # No foreign key: the user row is the last thing the job deletes
+    user_id = Column(String, nullable=False, index=True)
+    status = Column(String, nullable=False, default="pending")  # pending, running, completed, failed
+    deleted = Column(JSON, nullable=True)  # Rows deleted so far, per table
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
 class Food(Base):
     __tablename__ = "foods"
 
@@ -86,4 +191,24 @@ def get_db() -> Generator[Session, None, None]:
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Async session for ``async def`` routes; queries never block the event loop.
+
+    Existing helpers written against ``Session`` can run unchanged on it via
+    ``await db.run_sync(helper, *args)``: their statements still go through
+    the async driver.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    """
+    Session factory for responses that read after the route returns.
+
+    A streamed body is produced after request-scoped dependencies have been
+    closed, so it opens (and closes) its own session from this factory.
+    """
+    return AsyncSessionLocal
\ No newline at end of file
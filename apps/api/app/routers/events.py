@@ -1,8 +1,11 @@
 """Events router for ingesting diet, activity, and sleep events."""
 
-from fastapi import APIRouter, Depends
-from typing import List
-from pydantic import BaseModel
+import json
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from pydantic import BaseModel, ValidationError
 from datetime import datetime
 
 # Simple event models if database models not available
@@ -14,6 +17,7 @@ class DietEvent(BaseModel):
     protein: float
     carbs: float
     fat: float
+    fiber: Optional[float] = None
 
 class ActivityEvent(BaseModel):
     user_id: str
@@ -21,6 +25,7 @@ class ActivityEvent(BaseModel):
     activity_type: str
     duration_minutes: float
     calories_burned: float
+    steps: Optional[int] = None
 
 class SleepEvent(BaseModel):
     user_id: str
@@ -30,118 +35,385 @@ class SleepEvent(BaseModel):
 
 # Try to import database components
 try:
-    from ..models.database import Event, User, get_db
+    from ..models.database import get_async_db, get_async_sessionmaker, get_db
+    from ..services.event_batch import PayloadTooLarge, RecordError, iter_records, publish_changes, store_event_chunk
+    from ..services.export import EXPORT_DIR, export_events, export_lock
+    from ..services.event_queries import decode_cursor, encode_cursor, event_row_to_dict, user_events_query
+    from ..services.idempotency import event_key, recent_event_keys
+    from ..services.users import known_users
+    from ..services import write_behind
+    from sqlalchemy.exc import SQLAlchemyError
+    from sqlalchemy.ext.asyncio import AsyncSession
     from sqlalchemy.orm import Session
     use_db = True
 except ImportError:
     use_db = False
-    Session = None
-    get_db = None
+    AsyncSession = Session = None
+    get_async_db = get_async_sessionmaker = get_db = None
 
-from ..services.tasks import process_event
+from ..services.dispatch import event_dispatcher
 
 router = APIRouter(prefix="/events", tags=["events"])
 
+EVENT_MODELS = {"diet": DietEvent, "activity": ActivityEvent, "sleep": SleepEvent}
+
+# Events per bulk INSERT and commit in POST /events/batch
+BATCH_CHUNK_SIZE = int(os.getenv("EVENT_BATCH_CHUNK_SIZE", "1000"))
+
+# Largest POST /events/batch body in bytes, and largest single record in characters
+BATCH_MAX_BYTES = int(os.getenv("EVENT_BATCH_MAX_BYTES", str(256 * 1024 * 1024)))
+BATCH_MAX_RECORD_CHARS = int(os.getenv("EVENT_BATCH_MAX_RECORD_CHARS", str(64 * 1024)))
+
+# Per-record errors listed in a batch response; further errors are only counted
+MAX_REPORTED_ERRORS = 100
+
+# Set to "true" on a single-event response when the event was already stored
+DUPLICATE_HEADER = "X-Duplicate-Event"
+
+# Events per page of GET /events/{user_id}: default and largest allowed ?limit=
+EVENTS_PAGE_SIZE = int(os.getenv("EVENTS_PAGE_SIZE", "100"))
+EVENTS_MAX_PAGE_SIZE = int(os.getenv("EVENTS_MAX_PAGE_SIZE", "1000"))
+
+# Rows fetched per round trip from the server-side cursor of GET /events/{user_id}/stream
+EVENT_STREAM_BATCH_SIZE = int(os.getenv("EVENT_STREAM_BATCH_SIZE", "1000"))
+
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _event_fields(event_type: str, event: BaseModel) -> Dict[str, Any]:
+    """Map a validated event onto ``events`` table columns."""
+    if event_type == "diet":
+        return {
+            "food_name": event.food,
+            "calories": event.calories,
+            "protein_g": event.protein,
+            "carbs_g": event.carbs,
+            "fat_g": event.fat,
+            "fiber_g": event.fiber,
+        }
+    if event_type == "activity":
+        return {
+            "activity_type": event.activity_type,
+            "duration_minutes": event.duration_minutes,
+            "calories_burned": event.calories_burned,
+            "steps": event.steps,
+        }
+    return {
+        "sleep_hours": event.duration_minutes / 60,
+        "sleep_quality": event.sleep_quality,
+    }
+
+
+# Batch record field of ``events`` table columns named differently
+EVENT_COLUMN_FIELDS = {
+    "event_type": "type",
+    "food_name": "food",
+    "protein_g": "protein",
+    "carbs_g": "carbs",
+    "fat_g": "fat",
+    "fiber_g": "fiber",
+}
+
+
+def record_from_columns(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Map ``events`` table column values back onto a batch record; the inverse of ``_event_fields``."""
+    record = {EVENT_COLUMN_FIELDS.get(name, name): value for name, value in values.items() if value is not None}
+    sleep_hours = record.pop("sleep_hours", None)
+    if sleep_hours is not None:
+        record.setdefault("duration_minutes", sleep_hours * 60)
+    return record
+
+
+async def _persist_event(db: AsyncSession, event_type: str, event: BaseModel) -> bool:
+    """
+    Store an event on the async session, publish its changes and dispatch it to Celery.
+
+    Returns True when the event was already stored and has been skipped. In
+    write-behind mode the event is queued for the background writer instead,
+    which dispatches it once stored; re-sends of recently seen events are
+    still reported here, and the writer skips any other duplicate.
+    """
+    row = (event.user_id, event_type, _parse_timestamp(event.timestamp), _event_fields(event_type, event))
+    writer = write_behind.event_writer
+    if writer.enabled:
+        if event_key(*row) in recent_event_keys:
+            return True
+        try:
+            writer.submit(row, (event_type, event.model_dump()))
+        except write_behind.WriterUnavailable as exc:
+            raise HTTPException(
+                status_code=429 if exc.queue_full else 503,
+                detail=str(exc),
+                headers={"Retry-After": str(exc.retry_after)},
+            ) from None
+        return False
+
+    changes, new_users, duplicates = await db.run_sync(store_event_chunk, [row])
+    known_users.add(new_users)
+    publish_changes(changes)
+    if duplicates:
+        return True
+    event_dispatcher.submit(event_type, event.model_dump())
+    return False
+
 
 @router.post("/diet", response_model=DietEvent)
-async def ingest_diet(event: DietEvent, db: Session = Depends(get_db) if use_db else None) -> DietEvent:
+async def ingest_diet(
+    event: DietEvent, response: Response, db: AsyncSession = Depends(get_async_db) if use_db else None
+) -> DietEvent:
     """Ingest a diet event and store it in the database."""
     if use_db and db:
-        user = db.query(User).filter(User.id == event.user_id).first()
-        if not user:
-            user = User(id=event.user_id)
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-
-        db_event = Event(
-            user_id=event.user_id,
-            event_type="diet",
-            food_name=event.food,
-            calories=event.calories,
-            protein_g=event.protein,
-            carbs_g=event.carbs,
-            fat_g=event.fat,
-            timestamp=datetime.fromisoformat(event.timestamp.replace('Z', '+00:00'))
-        )
-        db.add(db_event)
-        db.commit()
-
-    process_event.delay("diet", event.model_dump())
+        if await _persist_event(db, "diet", event):
+            response.headers[DUPLICATE_HEADER] = "true"
+    else:
+        event_dispatcher.submit("diet", event.model_dump())
     return event
 
 
 @router.post("/activity", response_model=ActivityEvent)
-async def ingest_activity(event: ActivityEvent, db: Session = Depends(get_db) if use_db else None) -> ActivityEvent:
+async def ingest_activity(
+    event: ActivityEvent, response: Response, db: AsyncSession = Depends(get_async_db) if use_db else None
+) -> ActivityEvent:
     """Ingest an activity event and store it in the database."""
     if use_db and db:
-        user = db.query(User).filter(User.id == event.user_id).first()
-        if not user:
-            user = User(id=event.user_id)
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-
-        db_event = Event(
-            user_id=event.user_id,
-            event_type="activity",
-            activity_type=event.activity_type,
-            duration_minutes=event.duration_minutes,
-            calories_burned=event.calories_burned,
-            timestamp=datetime.fromisoformat(event.timestamp.replace('Z', '+00:00'))
-        )
-        db.add(db_event)
-        db.commit()
-
-    process_event.delay("activity", event.model_dump())
+        if await _persist_event(db, "activity", event):
+            response.headers[DUPLICATE_HEADER] = "true"
+    else:
+        event_dispatcher.submit("activity", event.model_dump())
     return event
 
 
 @router.post("/sleep", response_model=SleepEvent)
-async def ingest_sleep(event: SleepEvent, db: Session = Depends(get_db) if use_db else None) -> SleepEvent:
+async def ingest_sleep(
+    event: SleepEvent, response: Response, db: AsyncSession = Depends(get_async_db) if use_db else None
+) -> SleepEvent:
     """Ingest a sleep event and store it in the database."""
     if use_db and db:
-        user = db.query(User).filter(User.id == event.user_id).first()
-        if not user:
-            user = User(id=event.user_id)
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-
-        db_event = Event(
-            user_id=event.user_id,
-            event_type="sleep",
-            sleep_hours=event.duration_minutes / 60,
-            sleep_quality=event.sleep_quality,
-            timestamp=datetime.fromisoformat(event.timestamp.replace('Z', '+00:00'))
-        )
-        db.add(db_event)
-        db.commit()
-
-    process_event.delay("sleep", event.model_dump())
+        if await _persist_event(db, "sleep", event):
+            response.headers[DUPLICATE_HEADER] = "true"
+    else:
+        event_dispatcher.submit("sleep", event.model_dump())
     return event
 
 
+def _validate_record(record: Any) -> Tuple[str, BaseModel, datetime]:
+    """Validate one batch record; raises ValueError with a client-facing message."""
+    if isinstance(record, RecordError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Record must be a JSON object")
+    record = dict(record)
+    event_type = record.pop("type", None) or record.pop("event_type", None)
+    model = EVENT_MODELS.get(event_type)
+    if model is None:
+        raise ValueError(f"Unknown event type {event_type!r}; expected one of {sorted(EVENT_MODELS)}")
+    try:
+        event = model.model_validate(record)
+    except ValidationError as exc:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+        )) from None
+    try:
+        timestamp = _parse_timestamp(event.timestamp)
+    except ValueError:
+        raise ValueError(f"timestamp: invalid ISO 8601 datetime {event.timestamp!r}") from None
+    return event_type, event, timestamp
+
+
+@router.post("/batch")
+async def ingest_batch(request: Request, db: AsyncSession = Depends(get_async_db) if use_db else None) -> Dict[str, Any]:
+    """
+    Ingest many mixed events from an NDJSON body or a JSON array.
+
+    Each record has a ``type`` of diet, activity or sleep plus the fields of
+    the matching single-event endpoint. Records are validated as the body
+    streams in and stored in chunks of ``EVENT_BATCH_CHUNK_SIZE``, with one
+    bulk insert and one commit per chunk. Invalid records are reported by line
+    (NDJSON) or element (array) number and do not stop the rest of the batch.
+    Events already stored are skipped; they are counted in ``duplicates`` and
+    listed by line in ``duplicate_lines``, not in ``accepted``.
+
+    A body over ``EVENT_BATCH_MAX_BYTES`` or a record over
+    ``EVENT_BATCH_MAX_RECORD_CHARS`` fails with 413. The limits are enforced
+    while streaming, so chunks stored before one is reached stay stored;
+    sending the batch again skips them as duplicates.
+    """
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > BATCH_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Body is larger than {BATCH_MAX_BYTES} bytes")
+
+    async def body() -> AsyncIterator[bytes]:
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > BATCH_MAX_BYTES:
+                raise PayloadTooLarge(f"Body is larger than {BATCH_MAX_BYTES} bytes")
+            yield chunk
+
+    try:
+        return await ingest_records(db, iter_records(body(), BATCH_MAX_RECORD_CHARS))
+    except PayloadTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc)) from None
+
+
+async def ingest_records(db: Optional[AsyncSession], records: AsyncIterator[Tuple[int, Any]]) -> Dict[str, Any]:
+    """Validate and store ``(position, record)`` pairs in chunks; returns the batch summary."""
+    accepted = 0
+    rejected = 0
+    errors: List[Dict[str, Any]] = []
+    duplicate_lines: List[int] = []
+    duplicates = 0
+    chunk: List[Tuple[int, str, BaseModel, datetime]] = []
+
+    def reject(position: int, message: str) -> None:
+        nonlocal rejected
+        rejected += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": position, "error": message})
+
+    async def flush() -> None:
+        nonlocal accepted, duplicates
+        if not chunk:
+            return
+        stored = chunk
+        if use_db and db:
+            rows = [
+                (event.user_id, event_type, timestamp, _event_fields(event_type, event))
+                for _, event_type, event, timestamp in chunk
+            ]
+            try:
+                changes, new_users, skipped = await db.run_sync(store_event_chunk, rows)
+            except SQLAlchemyError as exc:
+                await db.rollback()
+                for position, _, _, _ in chunk:
+                    reject(position, f"Could not store chunk: {exc.__class__.__name__}")
+                chunk.clear()
+                return
+            known_users.add(new_users)
+            publish_changes(changes)
+            if skipped:
+                duplicates += len(skipped)
+                room = MAX_REPORTED_ERRORS - len(duplicate_lines)
+                duplicate_lines.extend(chunk[index][0] for index in skipped[:room])
+                skipped_indexes = set(skipped)
+                stored = [item for index, item in enumerate(chunk) if index not in skipped_indexes]
+        event_dispatcher.submit_many([(event_type, event.model_dump()) for _, event_type, event, _ in stored])
+        accepted += len(stored)
+        chunk.clear()
+
+    async for position, record in records:
+        try:
+            event_type, event, timestamp = _validate_record(record)
+        except ValueError as exc:
+            reject(position, str(exc))
+            continue
+        chunk.append((position, event_type, event, timestamp))
+        if len(chunk) >= BATCH_CHUNK_SIZE:
+            await flush()
+    await flush()
+
+    return {
+        "accepted": accepted,
+        "rejected": rejected,
+        "errors": errors,
+        "errors_truncated": rejected > len(errors),
+        "duplicates": duplicates,
+        "duplicate_lines": duplicate_lines,
+    }
+
+
+@router.post("/export")
+def export_events_to_parquet(db: Session = Depends(get_db) if use_db else None) -> Dict[str, Any]:
+    """
+    Append events added since the last export to the Parquet export.
+
+    Files are partitioned by event type and date under ``EVENT_EXPORT_DIR``.
+    A plain ``def`` route, so the chunked reads and Parquet writes run on the
+    threadpool instead of the event loop.
+    """
+    if not (use_db and db):
+        raise HTTPException(status_code=503, detail="Database not available")
+    if not export_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="An export is already running")
+    try:
+        return export_events(db, EXPORT_DIR)
+    finally:
+        export_lock.release()
+
+
+@router.get("/writer/stats")
+async def get_writer_stats() -> Dict[str, Any]:
+    """Queue depth and counters of the write-behind event writer."""
+    return write_behind.event_writer.stats()
+
+
+def _check_event_type(event_type: Optional[str]) -> None:
+    if event_type is not None and event_type not in EVENT_MODELS:
+        raise HTTPException(
+            status_code=422, detail=f"Unknown event type {event_type!r}; expected one of {sorted(EVENT_MODELS)}"
+        )
+
+
 @router.get("/{user_id}")
-async def get_user_events(user_id: str, db: Session = Depends(get_db) if use_db else None) -> List[dict]:
-    """Get all events for a specific user."""
+async def get_user_events(
+    user_id: str,
+    response: Response,
+    start: Optional[datetime] = Query(None, alias="from", description="Earliest timestamp, inclusive"),
+    end: Optional[datetime] = Query(None, alias="to", description="Latest timestamp, exclusive"),
+    event_type: Optional[str] = Query(None, alias="type", description="diet, activity or sleep"),
+    limit: int = Query(EVENTS_PAGE_SIZE, ge=1, le=EVENTS_MAX_PAGE_SIZE, description="Events per page"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_db) if use_db else None,
+) -> List[dict]:
+    """
+    Get one page of a user's events, oldest first.
+
+    Optionally limited to a time range and type. When more events follow, the
+    ``X-Next-Cursor`` response header holds the ``cursor`` for the next page;
+    it is absent on the last page.
+    """
+    _check_event_type(event_type)
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from None
     if use_db and db:
-        events = db.query(Event).filter(Event.user_id == user_id).all()
-        return [
-            {
-                "id": event.id,
-                "event_type": event.event_type,
-                "timestamp": event.timestamp.isoformat() if event.timestamp else None,
-                "food": getattr(event, 'food_name', None),
-                "calories": getattr(event, 'calories', None),
-                "protein": getattr(event, 'protein_g', None),
-                "carbs": getattr(event, 'carbs_g', None),
-                "fat": getattr(event, 'fat_g', None),
-                "activity_type": getattr(event, 'activity_type', None),
-                "duration_minutes": getattr(event, 'duration_minutes', None),
-                "calories_burned": getattr(event, 'calories_burned', None),
-                "sleep_quality": getattr(event, 'sleep_quality', None),
-            }
-            for event in events
-        ]
+        # One extra row tells whether another page follows
+        result = await db.execute(user_events_query(user_id, start, end, event_type, after).limit(limit + 1))
+        rows = result.all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = encode_cursor(rows[-1])
+        return [event_row_to_dict(row) for row in rows]
     return []
+
+
+@router.get("/{user_id}/stream")
+async def stream_user_events(
+    user_id: str,
+    start: Optional[datetime] = Query(None, alias="from", description="Earliest timestamp, inclusive"),
+    end: Optional[datetime] = Query(None, alias="to", description="Latest timestamp, exclusive"),
+    event_type: Optional[str] = Query(None, alias="type", description="diet, activity or sleep"),
+    sessions=Depends(get_async_sessionmaker) if use_db else None,
+) -> StreamingResponse:
+    """
+    Stream all of a user's matching events as NDJSON, oldest first.
+
+    Rows come from a server-side cursor ``EVENT_STREAM_BATCH_SIZE`` at a time
+    and are written out as they arrive, so memory stays flat however long the
+    history is.
+    """
+    _check_event_type(event_type)
+
+    async def lines() -> AsyncIterator[str]:
+        if not (use_db and sessions):
+            return
+        stmt = user_events_query(user_id, start, end, event_type)
+        async with sessions() as db:
+            result = await db.stream(stmt, execution_options={"yield_per": EVENT_STREAM_BATCH_SIZE})
+            async for rows in result.partitions():
+                yield "".join(json.dumps(event_row_to_dict(row)) + "\n" for row in rows)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
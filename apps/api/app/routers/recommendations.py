@@ -1,26 +1,140 @@
-from fastapi import APIRouter
-from ..schemas.user_input import RecommendationRequest, RecommendationResponse
-from ..services.recommender import generate_recommendations
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..models.database import UserTarget, get_async_db
+from ..schemas.user_input import (
+    BatchRecommendationRequest,
+    BatchRecommendationResponse,
+    RecommendationRequest,
+    RecommendationResponse,
+    UserRecommendations,
+)
+from ..services.daily_features import get_daily_features, row_to_features, user_targets_to_features
+from ..services.precompute import get_precomputed
+from ..services.recommender import generate_recommendations, recommendation_cache, recommender
+from ..services.trends import get_trends
+from ..services.windows import feature_windows
 
 
 router = APIRouter(prefix="", tags=["recommendations"])
 
-@router.post("/recommendations", response_model=RecommendationResponse)
+@router.post("", response_model=RecommendationResponse)
 def post_recommendations(payload: RecommendationRequest):
-    recs = generate_recommendations(payload.daily_features, payload.user_targets)
-    return RecommendationResponse(recommendations=recs)
+    result = generate_recommendations(payload.model_dump(exclude_none=True))
+    return RecommendationResponse(recommendations=result["recommendations"])
+
+
+@router.get("/cache/stats")
+def get_cache_stats() -> Dict[str, Any]:
+    """Hit/miss/eviction counters of the recommendation result cache."""
+    return {"rules_version": recommender.rules_version, **recommendation_cache.stats()}
+
+
+@router.post("/batch", response_model=BatchRecommendationResponse)
+def post_recommendations_batch(payload: BatchRecommendationRequest):
+    """Evaluate recommendations for many users with vectorized rule masks."""
+    n_users = len(payload.user_ids)
+    columns = {**payload.daily_features, **payload.user_targets}
+    if payload.personas is not None:
+        columns["personas"] = payload.personas
+    for name, column in columns.items():
+        if len(column) != n_users:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Column '{name}' has {len(column)} values, expected {n_users}",
+            )
+
+    recs = recommender.generate_recommendations_batch(
+        daily_features=payload.daily_features,
+        user_targets=payload.user_targets,
+        top_n=payload.top_n,
+        n_rows=n_users,
+        personas=payload.personas,
+    )
+    return BatchRecommendationResponse(
+        results=[
+            UserRecommendations(user_id=user_id, recommendations=user_recs)
+            for user_id, user_recs in zip(payload.user_ids, recs)
+        ]
+    )
+
+
+def _user_targets(db: Session, user_id: str) -> Dict[str, Any]:
+    """Latest stored targets for a user, keyed by the recommender's feature names."""
+    target = (
+        db.query(UserTarget)
+        .filter(UserTarget.user_id == user_id)
+        .order_by(UserTarget.created_at.desc())
+        .first()
+    )
+    return user_targets_to_features(target)
+
 
-from typing import Any, Dict, List, Optional
+@router.get("/{user_id}", response_model=RecommendationResponse)
+async def get_user_recommendations(
+    user_id: str,
+    day: Optional[date] = Query(None, alias="date"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Recommendations for a user and day (defaults to today, UTC).
 
-def generate_recommendations(payload: Dict[str, Any]) -> Dict[str, Any]:
+    Serves the nightly precomputed result when it is still current, otherwise
+    evaluates the user's materialized daily features live. The live result is
+    tracked per user and kept current by ingested events.
     """
-    Temporary stub to unblock API startup.
-    Replace with real recommendation logic later.
+    return await db.run_sync(_user_recommendations, user_id, day or datetime.utcnow().date())
+
+
+def _user_recommendations(db: Session, user_id: str, day: date) -> RecommendationResponse:
+    precomputed = get_precomputed(db, user_id, day, recommender.rules_version)
+    if precomputed is not None:
+        return RecommendationResponse(recommendations=precomputed.content["recommendations"])
+
+    # Kept current by ingested events, which re-evaluate only the rules they affect
+    recs = recommender.tracked_recommendations(user_id, day, top_n=5)
+    if recs is not None:
+        return RecommendationResponse(recommendations=recs)
+
+    row = get_daily_features(db, user_id, day)
+    if row is None:
+        raise HTTPException(status_code=404, detail="No daily features for this user and date")
+
+    recs = recommender.track_user(
+        user_id,
+        day,
+        daily_features={**row_to_features(row), **feature_windows.features(db, user_id, day)},
+        user_targets=_user_targets(db, user_id),
+        top_n=5,
+    )
+    return RecommendationResponse(recommendations=recs)
+
+
+@router.get("/{user_id}/insights")
+async def get_user_insights(
+    user_id: str,
+    day: Optional[date] = Query(None, alias="date"),
+    db: AsyncSession = Depends(get_async_db),
+) -> Dict[str, Any]:
+    """Summary, alerts and history trends for a user and day (defaults to today, UTC).
+
+    Trends come from the nightly precomputed row when it is current, otherwise
+    from the per-user-day trend cache backed by the rolling windows.
     """
-    return {
-        "status": "ok",
-        "message": "generate_recommendations stub",
-        "input": payload,
-        "recommendations": []
-    }
+    return await db.run_sync(_user_insights, user_id, day or datetime.utcnow().date())
+
+
+def _user_insights(db: Session, user_id: str, day: date) -> Dict[str, Any]:
+    row = get_daily_features(db, user_id, day)
+    if row is None:
+        raise HTTPException(status_code=404, detail="No daily features for this user and date")
 
+    precomputed = get_precomputed(db, user_id, day, recommender.rules_version)
+    if precomputed is not None and "trends" in precomputed.content:
+        trends = precomputed.content
+    else:
+        trends = get_trends(db, user_id, day)
+    return recommender.generate_insights(row_to_features(row), trends=trends)
@@ -0,0 +1,68 @@
+"""
+apps/api/app/routes/blobs.py
+
+Signed download URLs for blobs stored by the ingest proxy.
+"""
+
+import os
+import time
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from ..services.blob_store import blob_store
+from ..services.signed_urls import sign_url, verify_signature
+
+# Mounted without the API key: the signature is the credential
+router = APIRouter(prefix="/blobs", tags=["blobs"])
+
+# Remote content types served inline; any other (HTML, SVG, scripts, PDF...)
+# could run in this API's origin, so it is sent as a download instead
+INLINE_TYPES = frozenset({
+    "image/png", "image/jpeg", "image/gif", "image/webp", "image/avif", "image/bmp",
+    "audio/mpeg", "audio/ogg", "audio/wav", "audio/webm",
+    "video/mp4", "video/ogg", "video/webm",
+})
+
+
+def _blob_url(digest: str, content_type: str) -> str:
+    return f"{router.prefix}/{digest}?{urlencode({'type': content_type})}"
+
+
+def signed_blob_url(digest: str, content_type: str, ttl_seconds: int | None) -> str:
+    """Relative URL serving a stored blob as ``content_type`` until it expires."""
+    ttl = ttl_seconds or 300
+    if blob_store.max_age is not None:
+        # Not past the blob's own removal
+        ttl = min(ttl, blob_store.max_age)
+    return sign_url(_blob_url(digest, content_type), ttl)
+
+
+@router.get("/{digest}")
+def get_blob(
+    digest: str, expires: int, sig: str, content_type: str = Query("application/octet-stream", alias="type")
+) -> FileResponse:
+    """
+    Serve a blob stored by the ingest proxy.
+
+    The URL must carry a valid, unexpired signature from ``signed_blob_url``;
+    the content type is part of what is signed. Only ``INLINE_TYPES`` are
+    served as such; anything else is an ``application/octet-stream``
+    attachment. Range requests are answered with 206 partial content, and the
+    file is sent without being read into memory.
+    """
+    if not verify_signature(_blob_url(digest, content_type), expires, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired signature")
+    path = blob_store.path(digest)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Blob not found")
+    headers = {
+        "Cache-Control": f"private, max-age={max(0, expires - int(time.time()))}",
+        "Content-Security-Policy": "default-src 'none'; sandbox",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if content_type.split(";")[0].strip().lower() not in INLINE_TYPES:
+        content_type = "application/octet-stream"
+        headers["Content-Disposition"] = f'attachment; filename="{digest}"'
+    return FileResponse(path, media_type=content_type, headers=headers)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 from ..models.events import DietEvent, ActivityEvent, SleepEvent
-from ..services.tasks import process_event
+from ..services.dispatch import event_dispatcher
 
 router = APIRouter(prefix="/events", tags=["events"])
 
@@ -8,17 +8,17 @@ router = APIRouter(prefix="/events", tags=["events"])
 async def ingest_diet(event: DietEvent) -> DietEvent:
     """Ingest a diet event and return it for confirmation."""
     # TODO: persist to database or message queue
-    process_event.delay("diet", event.model_dump())
+    event_dispatcher.submit("diet", event.model_dump())
     return event
 
 @router.post("/activity", response_model=ActivityEvent)
 async def ingest_activity(event: ActivityEvent) -> ActivityEvent:
     """Ingest an activity event and return it for confirmation."""
-    process_event.delay("activity", event.model_dump())
+    event_dispatcher.submit("activity", event.model_dump())
     return event
 
 @router.post("/sleep", response_model=SleepEvent)
 async def ingest_sleep(event: SleepEvent) -> SleepEvent:
     """Ingest a sleep event and return it for confirmation."""
-    process_event.delay("sleep", event.model_dump())
+    event_dispatcher.submit("sleep", event.model_dump())
     return event
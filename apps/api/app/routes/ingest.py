@@ -1,22 +1,54 @@
-import base64
-import csv
-import hashlib
-import hmac
+import asyncio
+import json
 import os
-import time
-from io import StringIO
-from typing import Any
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
 
 import httpx
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, HttpUrl
+import polars as pl
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, HttpUrl
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
+
+from ..models.database import get_async_db
+from ..routers.events import EVENT_COLUMN_FIELDS, EVENT_MODELS, MAX_REPORTED_ERRORS, ingest_records, record_from_columns
+from ..services.blob_store import blob_store
+from ..services.csv_parsing import EVENT_FIELD_TYPES, CsvBatch, CsvSchema, iter_csv_batches, json_ready, to_records
+from ..services.event_batch import RecordError, iter_records
+from ..services.fetch_cache import fetch_cache
+from ..services.http_client import get_http_client
+from ..services.signed_urls import sign_url
+from .blobs import signed_blob_url
 
 router = APIRouter(prefix="/ingest", tags=["ingest"])
 
+# Largest remote body and most rows read per fetch; a request may only lower them
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(100 * 1024 * 1024)))
+INGEST_MAX_ROWS = int(os.getenv("INGEST_MAX_ROWS", "1000000"))
+
+# Records written per chunk of the /fetch/stream response
+INGEST_STREAM_BATCH_SIZE = int(os.getenv("INGEST_STREAM_BATCH_SIZE", "500"))
+
+# Bytes gathered from the network before each write of a blob, made off the event loop
+_BLOB_WRITE_SIZE = 256 * 1024
+
+# Events table column of a batch record field named differently
+_FIELD_EVENT_COLUMNS = {field: column for column, field in EVENT_COLUMN_FIELDS.items()}
+
 
 class FetchRequest(BaseModel):
     url: HttpUrl
     signed_ttl_seconds: int | None = 300
+    max_bytes: int | None = Field(None, gt=0)
+    max_rows: int | None = Field(None, gt=0)
+    # Declared CSV schema: source column -> Event field, typed like the field
+    columns: dict[str, str] | None = None
+
+
+class FetchEventsRequest(FetchRequest):
+    # Type of rows without their own ``type`` column
+    event_type: str | None = None
 
 
 class FetchResponse(BaseModel):
@@ -26,58 +58,185 @@ class FetchResponse(BaseModel):
     data: list[dict[str, Any]] | None = None
 
 
-async def _sign_url(url: str, ttl_seconds: int | None) -> str:
-    secret = os.environ.get("DATA_PROXY_SECRET", "dev-secret")
-    expiry = int(time.time()) + (ttl_seconds or 300)
-    signature = hmac.new(secret.encode(), f"{url}:{expiry}".encode(), hashlib.sha256).hexdigest()
-    return f"{url}?expires={expiry}&sig={signature}"
+class _FetchLimits:
+    """Stops reading a remote body at the byte or row limit and records why."""
+
+    def __init__(self, payload: FetchRequest):
+        self.max_bytes = min(payload.max_bytes or INGEST_MAX_BYTES, INGEST_MAX_BYTES)
+        self.max_rows = min(payload.max_rows or INGEST_MAX_ROWS, INGEST_MAX_ROWS)
+        self.exceeded: Optional[str] = None
+
+    async def bytes(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        received = 0
+        async for chunk in chunks:
+            received += len(chunk)
+            if received > self.max_bytes:
+                self.exceeded = f"Remote file is larger than {self.max_bytes} bytes"
+                return
+            yield chunk
+
+    async def rows(self, records: AsyncIterator[Tuple[int, Any]]) -> AsyncIterator[Tuple[int, Any]]:
+        count = 0
+        async for item in records:
+            if count == self.max_rows:
+                self.exceeded = f"Remote file has more than {self.max_rows} rows"
+                return
+            count += 1
+            yield item
+
+    async def batches(self, batches: AsyncIterator[CsvBatch]) -> AsyncIterator[CsvBatch]:
+        count = 0
+        async for positions, frame, errors in batches:
+            room = self.max_rows - count
+            if len(positions) > room:
+                self.exceeded = f"Remote file has more than {self.max_rows} rows"
+                if room:
+                    yield positions[:room], frame.head(room), {i: e for i, e in errors.items() if i < room}
+                return
+            count += len(positions)
+            yield positions, frame, errors
+
+
+async def _store_blob(response: httpx.Response, limits: _FetchLimits) -> Optional[str]:
+    """Write a body to the blob store as it downloads; returns its digest, or None past the byte limit."""
+    writer = await asyncio.to_thread(blob_store.writer)
+    try:
+        pending = bytearray()
+        async for chunk in limits.bytes(response.aiter_bytes()):
+            pending += chunk
+            if len(pending) >= _BLOB_WRITE_SIZE:
+                await asyncio.to_thread(writer.write, bytes(pending))
+                pending.clear()
+        if pending and not limits.exceeded:
+            await asyncio.to_thread(writer.write, bytes(pending))
+    except BaseException:
+        await asyncio.to_thread(writer.abort)
+        raise
+    if limits.exceeded:
+        await asyncio.to_thread(writer.abort)
+        return None
+    digest, _ = await asyncio.to_thread(writer.commit)
+    await asyncio.to_thread(blob_store.prune)
+    return digest
+
+
+def _is_csv(url: str, content_type: str) -> bool:
+    return "csv" in content_type or url.lower().endswith(".csv")
+
+
+def _is_json(url: str, content_type: str) -> bool:
+    return "json" in content_type or url.lower().endswith((".json", ".ndjson", ".jsonl"))
+
+
+def _declared_schema(payload: FetchRequest) -> Optional[Callable[[pl.DataFrame], CsvSchema]]:
+    if payload.columns is None:
+        return None
+    try:
+        schema = CsvSchema.declared(payload.columns)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+    return lambda frame: schema
+
+
+def _event_schema(frame: pl.DataFrame) -> CsvSchema:
+    """Schema of the columns named like a batch record field or Event column, typed like the column."""
+    columns = {name: _FIELD_EVENT_COLUMNS.get(name, name) for name in frame.columns}
+    return CsvSchema.declared({name: column for name, column in columns.items() if column in EVENT_FIELD_TYPES})
+
+
+async def _open_remote(client: httpx.AsyncClient, url: str, limits: _FetchLimits) -> httpx.Response:
+    """Send the GET and return the response with its body still unread; the caller closes it."""
+    try:
+        response = await client.send(client.build_request("GET", url), stream=True)
+    except httpx.HTTPError as exc:
+        raise HTTPException(status_code=502, detail=f"Failed to fetch remote asset: {exc}") from exc
+    try:
+        response.raise_for_status()
+    except httpx.HTTPError as exc:
+        await response.aclose()
+        raise HTTPException(status_code=502, detail=f"Failed to fetch remote asset: {exc}") from exc
+    length = response.headers.get("content-length", "")
+    if length.isdigit() and int(length) > limits.max_bytes:
+        await response.aclose()
+        raise HTTPException(status_code=413, detail=f"Remote file is larger than {limits.max_bytes} bytes")
+    return response
 
 
-def _parse_csv(text: str) -> list[dict[str, Any]]:
-    buffer = StringIO(text)
-    reader = csv.DictReader(buffer)
-    return [
-        {
-            key: (float(value) if value and value.replace(".", "", 1).isdigit() else value)
-            for key, value in row.items()
-        }
-        for row in reader
-        if any(row.values())
-    ]
+async def _csv_records(batches: AsyncIterator[CsvBatch]) -> AsyncIterator[Tuple[int, Any]]:
+    async for positions, frame, errors in batches:
+        for index, (position, record) in enumerate(zip(positions, to_records(frame))):
+            yield position, RecordError(errors[index]) if index in errors else record
+
+
+def _error_lines(positions: list[int], errors: dict[int, str]) -> list[dict[str, Any]]:
+    return [{"line": positions[index], "error": message} for index, message in sorted(errors.items())]
 
 
 @router.post("/fetch", response_model=FetchResponse)
-async def fetch_remote(payload: FetchRequest) -> FetchResponse:
-    """Fetch remote files server-side to avoid CORS/credential leakage."""
-    async with httpx.AsyncClient(follow_redirects=True, timeout=15) as client:
-        try:
-            response = await client.get(str(payload.url))
-            response.raise_for_status()
-        except httpx.HTTPError as exc:
-            raise HTTPException(status_code=502, detail=f"Failed to fetch remote asset: {exc}") from exc
+async def fetch_remote(payload: FetchRequest, client: httpx.AsyncClient = Depends(get_http_client)) -> FetchResponse:
+    """
+    Fetch remote files server-side to avoid CORS/credential leakage.
+
+    The body is read as it downloads, and the fetch fails with 413 as soon as
+    it passes ``INGEST_MAX_BYTES`` or, for CSV, ``INGEST_MAX_ROWS`` rows.
+    CSV columns are typed as described in ``services/csv_parsing.py``; cells
+    that do not fit their column's type fail the fetch with 422. Use
+    ``/fetch/stream`` or ``/fetch/events`` for files too large to return in
+    one response.
 
+    Other binary content (images) is written to the blob store as it
+    downloads; ``signed_url`` is then a signed ``/blobs/{digest}`` link that
+    serves it, ranges included, until it expires.
+    """
+    url = str(payload.url)
+    schema = _declared_schema(payload)
+    limits = _FetchLimits(payload)
+    response = await _open_remote(client, url, limits)
     content_type = response.headers.get("content-type", "application/octet-stream").lower()
     data: list[dict[str, Any]] | None = None
+    content = b""
+    digest: Optional[str] = None
+    errors: list[dict[str, Any]] = []
+    try:
+        if _is_csv(url, content_type):
+            data = []
+            batches = iter_csv_batches(limits.bytes(response.aiter_bytes()), schema)
+            async for positions, frame, batch_errors in limits.batches(batches):
+                data.extend(to_records(frame))
+                errors.extend(_error_lines(positions, batch_errors))
+        elif "json" in content_type:
+            # Parsed whole: the response inlines every record, and a top-level object has no stream form
+            content = bytearray()
+            async for chunk in limits.bytes(response.aiter_bytes()):
+                content += chunk
+        else:
+            digest = await _store_blob(response, limits)
+    except httpx.HTTPError as exc:
+        raise HTTPException(status_code=502, detail=f"Failed to fetch remote asset: {exc}") from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+    finally:
+        await response.aclose()
+    if limits.exceeded:
+        raise HTTPException(status_code=413, detail=limits.exceeded)
+    if errors:
+        raise HTTPException(status_code=422, detail=errors[:MAX_REPORTED_ERRORS])
 
     if "json" in content_type:
         try:
-            payload_json = response.json()
+            payload_json = json.loads(content)
             if isinstance(payload_json, list):
                 data = payload_json  # type: ignore[assignment]
             elif isinstance(payload_json, dict):
                 data = [payload_json]  # type: ignore[list-item]
         except Exception as exc:  # pragma: no cover - defensive
             raise HTTPException(status_code=422, detail=f"Invalid JSON payload: {exc}") from exc
-    elif "csv" in content_type or str(payload.url).lower().endswith(".csv"):
-        decoded = response.content.decode("utf-8", errors="ignore")
-        data = _parse_csv(decoded)
-
-    signed_url = await _sign_url(str(payload.url), payload.signed_ttl_seconds)
 
-    # For images or other binary assets, prefer a short-lived data URL preview
-    if data is None:
-        encoded = base64.b64encode(response.content).decode()
-        signed_url = f"data:{content_type};base64,{encoded}"
+    if digest is not None:
+        # Images and other binary assets are served from the blob store, not inlined
+        signed_url = signed_blob_url(digest, content_type, payload.signed_ttl_seconds)
+    else:
+        signed_url = sign_url(url, payload.signed_ttl_seconds)
 
     return FetchResponse(
         source=payload.url,
@@ -85,3 +244,124 @@ async def fetch_remote(payload: FetchRequest) -> FetchResponse:
         signed_url=signed_url,
         data=data,
     )
+
+
+@router.post("/fetch/stream")
+async def stream_remote(payload: FetchRequest, client: httpx.AsyncClient = Depends(get_http_client)) -> StreamingResponse:
+    """
+    Fetch a remote CSV, NDJSON or JSON array file and stream its records as NDJSON.
+
+    Records are written out as the file downloads, so memory stays flat
+    whatever its size; CSV batches are typed and serialized by polars. A
+    record that cannot be parsed becomes a ``{"line": ..., "error": ...}``
+    line. Once the response has started, a limit or network failure can no
+    longer change its status: it ends the stream with a final
+    ``{"error": ...}`` line instead.
+    """
+    url = str(payload.url)
+    schema = _declared_schema(payload)
+    limits = _FetchLimits(payload)
+    response = await _open_remote(client, url, limits)
+    content_type = response.headers.get("content-type", "").lower()
+    if not (_is_csv(url, content_type) or _is_json(url, content_type)):
+        await response.aclose()
+        raise HTTPException(status_code=415, detail=f"Cannot read records from {content_type or 'unknown'} content")
+    chunks = limits.bytes(response.aiter_bytes())
+
+    async def csv_lines() -> AsyncIterator[str]:
+        async for positions, frame, errors in limits.batches(iter_csv_batches(chunks, schema)):
+            if errors:
+                frame = frame.filter(pl.Series([index not in errors for index in range(frame.height)]))
+            text = json_ready(frame).write_ndjson() if frame.height else ""
+            yield text + "".join(json.dumps(line) + "\n" for line in _error_lines(positions, errors))
+
+    async def json_lines() -> AsyncIterator[str]:
+        batch: list[str] = []
+        async for position, record in limits.rows(iter_records(chunks)):
+            if isinstance(record, RecordError):
+                batch.append(json.dumps({"line": position, "error": str(record)}))
+            else:
+                batch.append(json.dumps(record))
+            if len(batch) >= INGEST_STREAM_BATCH_SIZE:
+                yield "\n".join(batch) + "\n"
+                batch.clear()
+        if batch:
+            yield "\n".join(batch) + "\n"
+
+    async def lines() -> AsyncIterator[str]:
+        try:
+            async for text in (csv_lines() if _is_csv(url, content_type) else json_lines()):
+                yield text
+        except httpx.HTTPError as exc:
+            yield json.dumps({"error": f"Failed to fetch remote asset: {exc}"}) + "\n"
+        except ValueError as exc:
+            yield json.dumps({"error": str(exc)}) + "\n"
+        finally:
+            await response.aclose()
+        if limits.exceeded:
+            yield json.dumps({"error": limits.exceeded}) + "\n"
+
+    # Also closes the upstream response if the client disconnects before the stream starts
+    return StreamingResponse(lines(), media_type="application/x-ndjson", background=BackgroundTask(response.aclose))
+
+
+@router.post("/fetch/events")
+async def ingest_remote(
+    payload: FetchEventsRequest,
+    client: httpx.AsyncClient = Depends(get_http_client),
+    db: AsyncSession = Depends(get_async_db),
+) -> dict[str, Any]:
+    """
+    Fetch a remote CSV, NDJSON or JSON array file and ingest its rows as events.
+
+    Rows are validated and stored as the file downloads, in the chunks of
+    ``POST /events/batch``, and the response is that endpoint's summary.
+    CSV columns are read as the Event fields they are declared as in
+    ``columns``, or else as those they are named after (a batch record field
+    such as ``protein``, or an Event column such as ``protein_g``); other
+    columns are ignored. Rows without a ``type`` take ``event_type``.
+    Reading stops at the byte or row limit: rows before it stay stored, and
+    ``limit_exceeded`` says which limit was hit.
+    """
+    if payload.event_type is not None and payload.event_type not in EVENT_MODELS:
+        raise HTTPException(status_code=422, detail=f"event_type must be one of {sorted(EVENT_MODELS)}")
+    url = str(payload.url)
+    schema = _declared_schema(payload) or _event_schema
+    limits = _FetchLimits(payload)
+    response = await _open_remote(client, url, limits)
+    content_type = response.headers.get("content-type", "").lower()
+    chunks = limits.bytes(response.aiter_bytes())
+    from_csv = _is_csv(url, content_type)
+    if from_csv:
+        records = _csv_records(limits.batches(iter_csv_batches(chunks, schema)))
+    elif _is_json(url, content_type):
+        records = limits.rows(iter_records(chunks))
+    else:
+        await response.aclose()
+        raise HTTPException(status_code=415, detail=f"Cannot read records from {content_type or 'unknown'} content")
+
+    async def events() -> AsyncIterator[Tuple[int, Any]]:
+        async for position, record in records:
+            if isinstance(record, dict):
+                if from_csv:
+                    record = record_from_columns(record)
+                if payload.event_type and "type" not in record and "event_type" not in record:
+                    record["type"] = payload.event_type
+            yield position, record
+
+    try:
+        summary = await ingest_records(db, events())
+    except httpx.HTTPError as exc:
+        raise HTTPException(status_code=502, detail=f"Failed to fetch remote asset: {exc}") from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+    finally:
+        await response.aclose()
+    summary["limit_exceeded"] = limits.exceeded
+    return summary
+
+
+@router.get("/cache/stats")
+def get_fetch_cache_stats() -> Dict[str, Any]:
+    """Hit/revalidation/miss counters and size of the on-disk fetch cache."""
+    return fetch_cache.stats()
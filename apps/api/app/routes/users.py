@@ -4,15 +4,39 @@ apps/api/app/routes/users.py
 User management routes for privacy features.
 """
 
-from fastapi import APIRouter, status, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.database import get_async_db, get_async_sessionmaker
+from ..services.user_deletion import create_deletion_job, get_deletion_job, job_to_dict, run_deletion_job
 
 router = APIRouter()
 
-@router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(user_id: str):
+@router.get("/deletion-jobs/{job_id}")
+async def get_user_deletion_job(job_id: str, db: AsyncSession = Depends(get_async_db)) -> dict:
+    """Status and per-table progress of a user deletion job."""
+    job = await get_deletion_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return job_to_dict(job)
+
+@router.delete("/{user_id}", status_code=status.HTTP_202_ACCEPTED)
+async def delete_user(
+    user_id: str,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    sessions=Depends(get_async_sessionmaker),
+) -> dict:
     """
-    Schedule deletion of all data associated with a user. In a real implementation,
-    this would enqueue a task to delete user data from the database and storage.
+    Schedule deletion of all data associated with a user.
+
+    Returns the deletion job at once; its status URL (also in ``Location``)
+    reports progress until the job is completed. Deleting a user whose
+    deletion is still running returns the running job.
     """
-    # TODO: integrate with data store to delete user data. For now, we just return 204.
-    return None
+    job = await create_deletion_job(db, user_id)
+    # A no-op unless the job still needs a runner
+    background_tasks.add_task(run_deletion_job, sessions, job.id)
+    response.headers["Location"] = f"/users/deletion-jobs/{job.id}"
+    return job_to_dict(job)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class FoodItem(BaseModel):
     name: str
@@ -28,6 +28,7 @@ class DailyFeatures(BaseModel):
     kcal_avg: Optional[float] = None
     protein_g: Optional[float] = None
     fiber_g: Optional[float] = None
+    fiber_g_7d_avg: Optional[float] = Field(None, description="Rolling 7-day average fiber (g)")
     late_meal_freq: Optional[float] = None
     steps: Optional[float] = None
     sleep_hours: Optional[float] = None
@@ -42,8 +43,31 @@ class Recommendation(BaseModel):
     tags: List[str] = []
 
 class RecommendationRequest(BaseModel):
+    user_id: Optional[str] = Field(
+        None, description="Tags the cached result so the user's new events free it; results without it expire by TTL"
+    )
     daily_features: DailyFeatures
     user_targets: UserTargets
 
 class RecommendationResponse(BaseModel):
     recommendations: List[Recommendation]
+
+class BatchRecommendationRequest(BaseModel):
+    user_ids: List[str]
+    daily_features: Dict[str, List[Optional[float]]] = Field(
+        default_factory=dict, description="Columnar daily features aligned with user_ids"
+    )
+    user_targets: Dict[str, List[Optional[float]]] = Field(
+        default_factory=dict, description="Columnar user targets aligned with user_ids"
+    )
+    personas: Optional[List[Optional[str]]] = Field(
+        None, description="Persona per user, aligned with user_ids; selects the rule bundle"
+    )
+    top_n: int = Field(5, ge=1, le=20, description="Recommendations to return per user")
+
+class UserRecommendations(BaseModel):
+    user_id: str
+    recommendations: List[Recommendation]
+
+class BatchRecommendationResponse(BaseModel):
+    results: List[UserRecommendations]
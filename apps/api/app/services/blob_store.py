@@ -0,0 +1,122 @@
+"""
+services/blob_store.py
+
+Content-addressed file store.
+
+Each blob is stored once under the SHA-256 of its bytes::
+
+    <blob dir>/ab/ab3f...e9
+
+so identical files fetched from different URLs share one copy. Blobs are
+written to a temporary file while they stream in, hashed on the way, and
+moved into place atomically when complete; a blob is therefore either
+absent or whole, also for other processes sharing the directory.
+
+Blobs not stored again for ``BLOB_MAX_AGE_SECONDS`` are removed by
+``prune``, which the store runs at most every tenth of that age.
+"""
+
+import hashlib
+import os
+import re
+import time
+import uuid
+from typing import Iterator, Optional, Tuple
+
+BLOB_DIR = os.getenv("BLOB_STORE_DIR", "data/blobs")
+BLOB_MAX_AGE_SECONDS = int(os.getenv("BLOB_MAX_AGE_SECONDS", str(24 * 3600)))
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobWriter:
+    """A blob being written; ``commit`` stores it, ``abort`` discards it."""
+
+    def __init__(self, store: "BlobStore"):
+        self._store = store
+        self._hash = hashlib.sha256()
+        self.size = 0
+        os.makedirs(store.tmp_dir, exist_ok=True)
+        self._tmp_path = os.path.join(store.tmp_dir, uuid.uuid4().hex)
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> Tuple[str, bool]:
+        """Store the blob; returns its digest and whether it was new."""
+        self._file.close()
+        digest = self._hash.hexdigest()
+        path = self._store.path(digest)
+        if os.path.exists(path):
+            os.remove(self._tmp_path)
+            # Stored again: restart its age
+            os.utime(path)
+            return digest, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self._tmp_path, path)
+        return digest, True
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class BlobStore:
+    def __init__(self, root: str = BLOB_DIR, max_age: Optional[int] = BLOB_MAX_AGE_SECONDS):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.max_age = max_age
+        self._pruned_at = 0.0
+
+    def path(self, digest: str) -> str:
+        if not _DIGEST.match(digest):
+            raise ValueError(f"Not a blob digest: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def size(self, digest: str) -> Optional[int]:
+        """Size of a stored blob, or None when it is not stored."""
+        try:
+            return os.path.getsize(self.path(digest))
+        except FileNotFoundError:
+            return None
+
+    def writer(self) -> BlobWriter:
+        return BlobWriter(self)
+
+    def read(self, digest: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        with open(self.path(digest), "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def delete(self, digest: str) -> None:
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def prune(self, force: bool = False) -> int:
+        """Remove blobs (and abandoned temporary files) older than ``max_age``; returns how many."""
+        now = time.time()
+        if self.max_age is None or (not force and now - self._pruned_at < self.max_age / 10):
+            return 0
+        self._pruned_at = now
+        removed = 0
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) < now - self.max_age:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+blob_store = BlobStore()
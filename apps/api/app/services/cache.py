@@ -0,0 +1,151 @@
+"""
+services/cache.py
+
+Bounded in-process LRU cache with per-entry TTL and per-user invalidation,
+and a bounded LRU set for remembering recently seen keys.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+
+def canonical_hash(*parts: Any) -> str:
+    """Stable SHA-256 of JSON-serializable values, independent of dict key order."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LRUTTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after ``ttl_seconds``.
+
+    Entries can be tagged with a user id so that everything cached for a user
+    is dropped at once when new data for that user arrives.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, Optional[str]]]" = OrderedDict()
+        self._keys_by_user: Dict[str, Set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, _ = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, user_id: Optional[str] = None) -> None:
+        """Store a value, evicting the least recently used entries when full."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self._clock() + self.ttl_seconds, value, user_id)
+            if user_id is not None:
+                self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: str) -> int:
+        """Drop every entry tagged with ``user_id``; returns how many were removed."""
+        with self._lock:
+            keys = self._keys_by_user.pop(user_id, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for sizing the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, user_id = self._entries.pop(key)
+        if user_id is not None:
+            keys = self._keys_by_user.get(user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[user_id]
+
+
+class LRUSet:
+    """Bounded, thread-safe set that forgets its least recently used members first."""
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._members: "OrderedDict[Hashable, None]" = OrderedDict()
+
+    def __contains__(self, member: Hashable) -> bool:
+        with self._lock:
+            if member not in self._members:
+                return False
+            self._members.move_to_end(member)
+            return True
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def add(self, members: Iterable[Hashable]) -> None:
+        with self._lock:
+            for member in members:
+                self._members[member] = None
+                self._members.move_to_end(member)
+            while len(self._members) > self.max_entries:
+                self._members.popitem(last=False)
+
+    def discard(self, member: Hashable) -> None:
+        with self._lock:
+            self._members.pop(member, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._members.clear()
@@ -0,0 +1,364 @@
+"""
+services/csv_parsing.py
+
+Typed, columnar parsing of CSV files fetched by the ingest proxy.
+
+Rows are split off the byte stream as it downloads (quoted values may span
+lines and chunks), read by polars in batches of ``CSV_BATCH_ROWS`` as text,
+and then converted a whole column at a time instead of cell by cell in
+Python. Column types come from a :class:`CsvSchema` fixed on the first
+batch: either inferred from it, or declared as a mapping of source columns
+onto ``Event`` fields, each column then taking its field's type.
+
+Numbers may be signed, use exponents or thousands separators ("1,234.5");
+timestamps are normalized to naive UTC. A non-empty cell that does not
+convert to its column's type makes its row an error instead of a silent
+null.
+"""
+
+import codecs
+import io
+import os
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import polars as pl
+from sqlalchemy import DateTime, Float, Integer
+
+from ..models.database import Event
+
+CSV_BATCH_ROWS = int(os.getenv("CSV_BATCH_ROWS", "10000"))
+
+# Event columns a declared schema may map source columns onto, and their types
+EVENT_FIELD_TYPES: Dict[str, pl.DataType] = {
+    column.name: (
+        pl.Int64 if isinstance(column.type, Integer)
+        else pl.Float64 if isinstance(column.type, Float)
+        else pl.Datetime("us") if isinstance(column.type, DateTime)
+        else pl.String
+    )
+    for column in Event.__table__.columns
+    if column.name not in ("id", "idempotency_key")
+}
+
+_THOUSANDS = r"^[+-]?\d{1,3}(,\d{3})+(\.\d*)?([eE][+-]?\d+)?$"
+_INTEGER = r"^[+-]?\d+$"
+# Identifiers such as zip codes or barcodes, which are not numbers
+_LEADING_ZERO = r"^[+-]?0\d"
+_UTC_OFFSET = r"(Z|[+-]\d{2}:?\d{2})$"
+
+# Column name -> (source column, type)
+SchemaColumns = Dict[str, Tuple[str, pl.DataType]]
+
+
+def _number_text(column: pl.Expr) -> pl.Expr:
+    text = column.str.strip_chars()
+    return pl.when(text.str.contains(_THOUSANDS)).then(text.str.replace_all(",", "", literal=True)).otherwise(text)
+
+
+def _convert(column: pl.Expr, dtype: pl.DataType, plain: bool = False) -> pl.Expr:
+    """Conversion of text to ``dtype``; ``plain`` skips cleaning numbers (whitespace, separators)."""
+    if dtype == pl.String:
+        return column
+    if dtype == pl.Datetime:
+        # Parsed apart, as one format is inferred per call; offsets are converted to UTC
+        text = column.str.strip_chars()
+        has_offset = text.str.contains(_UTC_OFFSET)
+        aware = pl.when(has_offset).then(text).str.to_datetime(strict=False, time_unit="us", time_zone="UTC")
+        naive = pl.when(~has_offset).then(text).str.to_datetime(strict=False, time_unit="us")
+        return pl.coalesce(aware.dt.replace_time_zone(None), naive)
+    return (column if plain else _number_text(column)).cast(dtype, strict=False)
+
+
+class CsvSchema:
+    """Names, source columns and types of the columns of a parsed CSV file."""
+
+    def __init__(self, columns: SchemaColumns):
+        self.columns = columns
+
+    @classmethod
+    def declared(cls, mapping: Dict[str, str]) -> "CsvSchema":
+        """Schema keeping only the mapped source columns, renamed to their Event fields."""
+        unknown = sorted(set(mapping.values()) - set(EVENT_FIELD_TYPES))
+        if unknown:
+            raise ValueError(f"Unknown Event fields {unknown}; expected some of {sorted(EVENT_FIELD_TYPES)}")
+        if len(set(mapping.values())) != len(mapping):
+            raise ValueError("Each Event field may be mapped from one column only")
+        return cls({field: (source, EVENT_FIELD_TYPES[field]) for source, field in mapping.items()})
+
+    @classmethod
+    def infer(cls, frame: pl.DataFrame) -> "CsvSchema":
+        """
+        Schema of a frame of text columns: all-integer columns become Int64,
+        other all-numeric ones Float64, and everything else stays text.
+        """
+        counts = frame.select(
+            expr
+            for index, name in enumerate(frame.columns)
+            for expr in (
+                pl.col(name).count().alias(f"present_{index}"),
+                _number_text(pl.col(name)).cast(pl.Float64, strict=False).count().alias(f"number_{index}"),
+                _number_text(pl.col(name)).str.contains(_INTEGER).sum().alias(f"integer_{index}"),
+                pl.col(name).str.strip_chars().str.contains(_LEADING_ZERO).any().alias(f"zero_{index}"),
+            )
+        ).row(0)
+        columns: SchemaColumns = {}
+        for index, name in enumerate(frame.columns):
+            present, numbers, integers, leading_zero = counts[4 * index:4 * index + 4]
+            if present == 0 or numbers < present or leading_zero:
+                dtype: pl.DataType = pl.String
+            else:
+                dtype = pl.Int64 if integers == present else pl.Float64
+            columns[name] = (name, dtype)
+        return cls(columns)
+
+    def apply(self, frame: pl.DataFrame) -> Tuple[pl.DataFrame, Dict[int, str]]:
+        """
+        Convert a frame of text columns; returns the typed frame and, by row
+        index, the rows with a cell that did not convert.
+        """
+        missing = sorted({source for source, _ in self.columns.values()} - set(frame.columns))
+        if missing:
+            raise ValueError(f"Columns {missing} are not in the file")
+        typed = frame.select(
+            _convert(pl.col(source), dtype, plain=True).alias(name) for name, (source, dtype) in self.columns.items()
+        )
+
+        # Most cells are plain values; only columns with some that are not take the slower path
+        converted = [(name, source, dtype) for name, (source, dtype) in self.columns.items() if dtype != pl.String]
+        if not converted:
+            return typed, {}
+        misses = typed.select(
+            (frame.get_column(source).is_not_null() & pl.col(name).is_null()).sum().alias(name)
+            for name, source, _ in converted
+        ).row(0)
+        failed = [column for column, count in zip(converted, misses) if count]
+        if not failed:
+            return typed, {}
+        retry = [(name, source, dtype) for name, source, dtype in failed if dtype != pl.Datetime]
+        if retry:
+            slow = frame.select(_convert(pl.col(source), dtype).alias(name) for name, source, dtype in retry)
+            typed = typed.with_columns(slow.get_columns())
+
+        # A cell failed when there was text but the converted value is null
+        bad = frame.select(
+            ((pl.col(source).str.strip_chars().str.len_chars() > 0).fill_null(False) & typed.get_column(name).is_null())
+            .alias(name)
+            for name, source, _ in failed
+        )
+        errors: Dict[int, str] = {}
+        for index, row in zip(*_bad_rows(bad)):
+            source, dtype = next(
+                (source, dtype) for (_, source, dtype), is_bad in zip(failed, row) if is_bad
+            )
+            errors[index] = f"{source}: cannot read {frame.get_column(source)[index]!r} as {_type_name(dtype)}"
+        return typed, errors
+
+
+def _bad_rows(bad: pl.DataFrame) -> Tuple[List[int], List[Tuple[bool, ...]]]:
+    any_bad = bad.select(pl.any_horizontal(pl.all())).to_series()
+    indexes = any_bad.arg_true().to_list()
+    return indexes, [bad.row(index) for index in indexes]
+
+
+def _type_name(dtype: pl.DataType) -> str:
+    if dtype == pl.Int64:
+        return "an integer"
+    if dtype == pl.Float64:
+        return "a number"
+    return "a timestamp"
+
+
+def read_text_frame(header: str, text: str) -> pl.DataFrame:
+    """Read CSV rows as text columns, without any type inference."""
+    data = (header + "\n" + text).encode()
+    return pl.read_csv(io.BytesIO(data), infer_schema=False, truncate_ragged_lines=True)
+
+
+def to_records(frame: pl.DataFrame) -> List[dict]:
+    """Rows as dicts, timestamps as ISO 8601 strings."""
+    return json_ready(frame).to_dicts()
+
+
+def json_ready(frame: pl.DataFrame) -> pl.DataFrame:
+    return frame.with_columns(
+        pl.col(name).dt.to_string("%Y-%m-%dT%H:%M:%S%.f")
+        for name, dtype in frame.schema.items()
+        if isinstance(dtype, pl.Datetime)
+    )
+
+
+# Positions (1-based line each row starts on), typed rows, errors by row index
+CsvBatch = Tuple[List[int], pl.DataFrame, Dict[int, str]]
+
+
+async def iter_csv_batches(
+    chunks: AsyncIterator[bytes],
+    schema: Optional[Callable[[pl.DataFrame], CsvSchema]] = None,
+    batch_rows: int = CSV_BATCH_ROWS,
+) -> AsyncIterator[CsvBatch]:
+    """
+    Yield typed batches of rows from a CSV byte stream whose first row is the header.
+
+    ``schema`` is called once, with the first batch as text columns, and its
+    result converts every batch; by default the schema is inferred from the
+    first batch. Blank rows are skipped. Raises ValueError when the schema
+    does not fit the file.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    splitter = _BlockSplitter()
+    fixed: Optional[CsvSchema] = None
+    blocks: List[str] = []
+    first_line = 0
+    lines = 0
+
+    def convert() -> CsvBatch:
+        nonlocal fixed
+        frame, positions = _read_block(splitter.header, "".join(blocks), first_line)
+        blocks.clear()
+        if fixed is None:
+            fixed = (schema or CsvSchema.infer)(frame)
+        typed, errors = fixed.apply(frame)
+        return positions, typed, errors
+
+    async for chunk in chunks:
+        block = splitter.feed(decoder.decode(chunk))
+        if block is not None:
+            if not blocks:
+                first_line, lines = block[0], 0
+            blocks.append(block[1])
+            lines += block[1].count("\n")
+            if lines >= batch_rows:
+                yield convert()
+    block = splitter.feed(decoder.decode(b"", final=True), final=True)
+    if block is not None:
+        if not blocks:
+            first_line = block[0]
+        blocks.append(block[1])
+    if blocks:
+        yield convert()
+
+
+def _read_block(header: str, text: str, first_line: int) -> Tuple[pl.DataFrame, List[int]]:
+    """Rows of a block of whole rows starting on ``first_line``, and the line each starts on."""
+    n_lines = text.count("\n") + (not text.endswith("\n"))
+    malformed = f"Malformed CSV between lines {first_line} and {first_line + n_lines - 1}"
+    try:
+        frame = read_text_frame(header, text)
+        if frame.height == n_lines:
+            positions = pl.int_range(first_line, first_line + n_lines, eager=True)
+        else:
+            # Quoted values span lines: find where each row starts
+            starts, rows = _split_rows(text, first_line)
+            frame = read_text_frame(header, "\n".join(rows))
+            if frame.height != len(rows):
+                raise ValueError(malformed)
+            positions = pl.Series(starts)
+    except pl.exceptions.PolarsError as exc:
+        # Such as a quoted value left open at the end of the file
+        raise ValueError(f"{malformed}: {str(exc).splitlines()[0]}") from None
+    keep = frame.select(
+        pl.any_horizontal((pl.all().str.strip_chars().str.len_chars() > 0).fill_null(False))
+    ).to_series()
+    if not keep.all():
+        frame = frame.filter(keep)
+        positions = positions.filter(keep)
+    return frame, positions.to_list()
+
+
+def _split_rows(text: str, first_line: int) -> Tuple[List[int], List[str]]:
+    starts: List[int] = []
+    rows: List[str] = []
+    record: List[str] = []
+    quotes = 0
+    for line_number, line in enumerate(text.split("\n"), first_line):
+        if not record:
+            starts.append(line_number)
+        record.append(line)
+        # An escaped quote ("") counts twice, so an odd count means an open value
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            rows.append("\n".join(record))
+            record, quotes = [], 0
+    if record:
+        rows.append("\n".join(record))
+    if text.endswith("\n") and rows and rows[-1] == "":
+        starts.pop()
+        rows.pop()
+    return starts, rows
+
+
+def _row_end(text: str, quoted: bool) -> Tuple[int, bool]:
+    """
+    Offset just past the last newline of ``text`` that is not inside a quoted
+    value (0 if there is none), given whether ``text`` starts inside one, and
+    whether it ends inside one.
+    """
+    end = start = 0
+    while True:
+        newline = text.find("\n", start)
+        # An escaped quote ("") counts twice, so an odd count toggles
+        quoted ^= text.count('"', start, len(text) if newline == -1 else newline) % 2 == 1
+        if newline == -1:
+            return end, quoted
+        if not quoted:
+            end = newline + 1
+        start = newline + 1
+
+
+def _first_row_end(text: str) -> Optional[int]:
+    """Offset just past the first newline of ``text`` that is not inside a quoted value."""
+    quotes = start = 0
+    while True:
+        end = text.find("\n", start)
+        if end == -1:
+            return None
+        quotes += text.count('"', start, end)
+        if quotes % 2 == 0:
+            return end + 1
+        start = end + 1
+
+
+class _BlockSplitter:
+    """Cuts CSV text into blocks of whole rows, keeping the header row apart."""
+
+    def __init__(self):
+        self.header = ""
+        # Text after the last whole row, joined once a row ends in it; quote
+        # parity is carried across chunks so each chunk is scanned only once
+        self._parts: List[str] = []
+        self._quoted = False  # Whether the pending text ends inside a quoted value
+        self._line = 1  # Line the pending text starts on
+
+    def feed(self, text: str, final: bool = False) -> Optional[Tuple[int, str]]:
+        """The line the next block of whole rows starts on and the block, if there is one."""
+        if not self.header:
+            if "\n" not in text and not final:
+                self._parts.append(text)
+                return None
+            buffer = "".join(self._parts) + text
+            self._parts = []
+            stripped = buffer.lstrip("\r\n")
+            self._line += buffer.count("\n", 0, len(buffer) - len(stripped))
+            end = _first_row_end(stripped)
+            if end is None:
+                if final:
+                    self.header = stripped.rstrip("\r")
+                else:
+                    self._parts = [stripped]
+                return None
+            self.header = stripped[:end].rstrip("\r\n")
+            self._line += stripped.count("\n", 0, end)
+            text = stripped[end:]
+        if final:
+            block = "".join(self._parts) + text
+            self._parts = []
+        else:
+            end, self._quoted = _row_end(text, self._quoted)
+            if not end:
+                self._parts.append(text)
+                return None
+            block = "".join(self._parts) + text[:end]
+            self._parts = [text[end:]]
+        first_line = self._line
+        self._line += block.count("\n")
+        return (first_line, block) if block else None
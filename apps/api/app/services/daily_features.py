@@ -0,0 +1,159 @@
+"""
+services/daily_features.py
+
+Incremental materialization of per-(user_id, date) daily features.
+
+Every accepted event adds its contribution to the user's row for that day with
+a single upsert, so reading a day's metrics is one primary-key lookup instead
+of re-summing the day's events. A column stays NULL until an event that sets
+it arrives (diet for the nutrients, activity for steps, sleep for
+sleep_hours), so a day without sleep data is not a day of zero sleep.
+"""
+
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..models.database import DailyFeature, UserTarget
+
+# Columns holding running sums, and the metric names they are exposed as
+SUM_COLUMNS = ("calories", "protein_g", "carbs_g", "fat_g", "fiber_g", "steps", "sleep_hours")
+
+# Meals at or after this hour count towards late_meals
+LATE_MEAL_HOUR = 21
+
+
+def event_deltas(
+    event_type: str, values: Dict[str, Any], timestamp: Optional[datetime] = None
+) -> Dict[str, float]:
+    """
+    Return the amounts an event adds to its day's running totals.
+
+    Args:
+        event_type: One of 'diet', 'activity' or 'sleep'
+        values: Event fields using the ``events`` table column names
+        timestamp: Event time, used to flag late meals
+    """
+    if event_type == "diet":
+        columns = ("calories", "protein_g", "carbs_g", "fat_g", "fiber_g")
+        deltas = {column: float(values.get(column) or 0) for column in columns}
+        if timestamp is not None and timestamp.hour >= LATE_MEAL_HOUR:
+            deltas["late_meals"] = 1
+        return deltas
+    if event_type == "activity":
+        return {"steps": float(values.get("steps") or 0)}
+    if event_type == "sleep":
+        return {"sleep_hours": float(values.get("sleep_hours") or 0)}
+    return {}
+
+
+def daily_features_upsert(
+    dialect_name: str, user_id: str, day: date, deltas: Dict[str, float], event_count: int = 1
+):
+    """
+    Build an ``INSERT ... ON CONFLICT DO UPDATE`` adding ``deltas`` to a day's row.
+
+    ``deltas`` may be the sum of several events; ``event_count`` says how many.
+
+    Returns None for dialects without native upsert support.
+    """
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+
+    values = {column: deltas[column] for column in SUM_COLUMNS if column in deltas}
+    stmt = insert(DailyFeature).values(
+        user_id=user_id,
+        date=day,
+        late_meals=deltas.get("late_meals", 0),
+        event_count=event_count,
+        updated_at=datetime.utcnow(),
+        **values,
+    )
+    table = DailyFeature.__table__
+    updates = {
+        column: func.coalesce(table.c[column], 0) + stmt.excluded[column] for column in deltas
+    }
+    updates["event_count"] = table.c.event_count + stmt.excluded.event_count
+    updates["updated_at"] = stmt.excluded.updated_at
+    return stmt.on_conflict_do_update(index_elements=["user_id", "date"], set_=updates)
+
+
+def apply_event(
+    db: Session, user_id: str, day: date, deltas: Dict[str, float], event_count: int = 1
+) -> None:
+    """
+    Add an event's deltas to the user's daily row inside the caller's transaction.
+
+    Summed deltas of several events can be applied at once by passing their
+    ``event_count``. The caller is responsible for committing.
+    """
+    stmt = daily_features_upsert(db.get_bind().dialect.name, user_id, day, deltas, event_count)
+    if stmt is not None:
+        db.execute(stmt)
+        return
+
+    row = db.get(DailyFeature, (user_id, day))
+    if row is None:
+        row = DailyFeature(user_id=user_id, date=day, late_meals=0, event_count=0)
+        db.add(row)
+    for column, delta in deltas.items():
+        setattr(row, column, (getattr(row, column) or 0) + delta)
+    row.event_count += event_count
+
+
+def get_daily_features(db: Session, user_id: str, day: date) -> Optional[DailyFeature]:
+    """Fetch the materialized row for a user and day, if any events were ingested."""
+    return db.get(DailyFeature, (user_id, day))
+
+
+def row_to_metrics(row: Optional[DailyFeature]) -> Dict[str, Any]:
+    """Convert a daily row into the dict shape returned by ``aggregate_metrics``."""
+    metrics: Dict[str, Any] = {column: 0.0 for column in SUM_COLUMNS}
+    if row is not None:
+        metrics.update({column: getattr(row, column) or 0.0 for column in SUM_COLUMNS})
+    return metrics
+
+
+def row_to_features(row: Optional[DailyFeature]) -> Dict[str, Any]:
+    """Convert a daily row into the feature names read by ``NutritionRecommender``."""
+    if row is None:
+        return {}
+    metrics = row_to_metrics(row)
+    return {
+        "date": row.date.isoformat(),
+        "calories": metrics["calories"],
+        "total_calories": metrics["calories"],
+        "protein_g": metrics["protein_g"],
+        "carbs_g": metrics["carbs_g"],
+        "fat_g": metrics["fat_g"],
+        "fiber_g": metrics["fiber_g"],
+        "steps": metrics["steps"],
+        "sleep_hours": metrics["sleep_hours"],
+        "late_meals": row.late_meals or 0,
+    }
+
+
+def deltas_to_features(deltas: Dict[str, float]) -> Dict[str, float]:
+    """Key an event's deltas by the feature names of ``row_to_features``."""
+    features = dict(deltas)
+    if "calories" in features:
+        features["total_calories"] = features["calories"]
+    return features
+
+
+def user_targets_to_features(target: Optional[UserTarget]) -> Dict[str, Any]:
+    """Convert a stored UserTarget into the target names read by ``NutritionRecommender``."""
+    if target is None:
+        return {}
+    values = {
+        "target_kcal": target.kcal,
+        "target_protein_g": target.protein_g,
+        "target_fiber_g": target.fiber_g,
+    }
+    return {key: value for key, value in values.items() if value is not None}
@@ -0,0 +1,141 @@
+"""
+services/dispatch.py
+
+Batched publishing of ingested events to Celery.
+
+Calling ``process_event.delay`` from a request handler costs one blocking
+broker round trip per event, and it runs on the event loop, so broker
+latency shows up directly in ingest latency. Instead, handlers hand events to
+the process-wide :data:`event_dispatcher`. That only appends them to an
+in-memory buffer. A background thread publishes the buffer as a single
+``process_events_batch`` task once it holds ``TASK_BATCH_SIZE`` events or
+every ``TASK_BATCH_FLUSH_MS`` milliseconds, whichever comes first. Every
+worker process has its own dispatcher, and a forked child starts a fresh
+thread on first use.
+
+Delivery is at most once. Events still buffered when the process dies are
+lost, as is a batch whose publish fails; both are logged and counted. The
+application lifespan flushes the buffer on shutdown. When the broker is
+unreachable the buffer is capped at ``TASK_BATCH_MAX_BUFFER`` events, and the
+oldest events are dropped first.
+"""
+
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .tasks import process_events_batch
+
+logger = logging.getLogger(__name__)
+
+# (event_type, event payload) as passed to process_event
+TaskEvent = Tuple[str, Dict[str, Any]]
+
+
+class EventDispatcher:
+    """Per-process buffer of events, published in batches by a background thread."""
+
+    def __init__(
+        self,
+        publish: Callable[[List[TaskEvent]], Any],
+        batch_size: int = 500,
+        flush_interval_ms: float = 200.0,
+        max_buffer: int = 100_000,
+    ):
+        self._publish = publish
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_buffer = max_buffer
+        self._buffer: Deque[TaskEvent] = deque()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._stopping = False
+        self.published = 0
+        self.batches = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def submit(self, event_type: str, event_data: Dict[str, Any]) -> None:
+        """Buffer one event for publishing; never blocks on the broker."""
+        self.submit_many([(event_type, event_data)])
+
+    def submit_many(self, events: List[TaskEvent]) -> None:
+        """Buffer several events for publishing; never blocks on the broker."""
+        with self._condition:
+            self._ensure_thread()
+            self._buffer.extend(events)
+            overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                for _ in range(overflow):
+                    self._buffer.popleft()
+                self.dropped += overflow
+                logger.warning("Task buffer full; dropped %d oldest events", overflow)
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    def _ensure_thread(self) -> None:
+        # Threads do not survive fork, so a child process starts its own
+        if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+            if self._pid is not None and self._pid != os.getpid():
+                self._buffer.clear()  # The parent publishes its own events
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="event-dispatcher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._stopping and len(self._buffer) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                done = self._stopping and not self._buffer
+            if batch:
+                self._flush(batch)
+            if done:
+                return
+
+    def _flush(self, batch: List[TaskEvent]) -> None:
+        try:
+            self._publish(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Publishing a batch of %d events failed", len(batch))
+            return
+        self.published += len(batch)
+        self.batches += 1
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Publish everything buffered and stop the background thread."""
+        with self._condition:
+            thread = self._thread
+            if thread is None or self._pid != os.getpid():
+                return
+            self._stopping = True
+            self._condition.notify()
+        thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "published": self.published,
+            "batches": self.batches,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+def _publish_batch(events: List[TaskEvent]) -> None:
+    process_events_batch.delay([[event_type, event_data] for event_type, event_data in events])
+
+
+event_dispatcher = EventDispatcher(
+    publish=_publish_batch,
+    batch_size=int(os.getenv("TASK_BATCH_SIZE", "500")),
+    flush_interval_ms=float(os.getenv("TASK_BATCH_FLUSH_MS", "200")),
+    max_buffer=int(os.getenv("TASK_BATCH_MAX_BUFFER", "100000")),
+)
@@ -0,0 +1,264 @@
+"""
+services/event_batch.py
+
+Streaming parsing and chunked persistence for bulk event ingestion.
+
+Request bodies are parsed incrementally (NDJSON line by line, or the elements
+of a JSON array as they arrive) so a large backfill is never held in memory
+as a whole. Valid events are written in chunks: one bulk INSERT for the
+events that skips already stored ones, one upsert per affected (user, day)
+daily row and a single commit per chunk.
+"""
+
+import codecs
+import json
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from ..models.database import Event
+from .daily_features import apply_event, deltas_to_features, event_deltas
+from .idempotency import event_key, recent_event_keys
+from .recommender import recommendation_cache, recommender
+from .trends import trend_cache
+from .users import ensure_users
+from .windows import feature_windows
+
+# (user_id, event_type, timestamp, Event column values) of a validated event
+EventRow = Tuple[str, str, datetime, Dict[str, Any]]
+
+
+class RecordError(ValueError):
+    """A record of the request body that is not valid JSON."""
+
+
+class PayloadTooLarge(Exception):
+    """A request body, or one of its records, over the configured size."""
+
+
+async def iter_records(
+    chunks: AsyncIterator[bytes], max_record_chars: Optional[int] = None
+) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yield ``(position, record)`` from an NDJSON or JSON array byte stream.
+
+    The format is detected from the first non-whitespace byte. Positions are
+    1-based line numbers for NDJSON and element indexes for arrays. A line that
+    is not valid JSON is yielded as a :class:`RecordError` and parsing goes on
+    with the next line; a malformed array cannot be resynchronized, so it
+    yields one final error. A line or element longer than ``max_record_chars``
+    raises :class:`PayloadTooLarge` as soon as it gets that long.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    parser = None
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        if parser is None:
+            stripped = buffer.lstrip()
+            if not stripped:
+                continue
+            parser = (_JsonArrayParser if stripped[0] == "[" else _NdjsonParser)(max_record_chars)
+        for item in parser.feed(buffer):
+            yield item
+        buffer = ""
+
+    buffer += decoder.decode(b"", final=True)
+    if parser is None:
+        parser = _NdjsonParser(max_record_chars)
+    for item in parser.feed(buffer, final=True):
+        yield item
+
+
+class _NdjsonParser:
+    def __init__(self, max_record_chars: Optional[int] = None):
+        # The line still being received, joined once its end arrives
+        self._parts: List[str] = []
+        self._size = 0
+        self._line = 0
+        self._max_record_chars = max_record_chars
+
+    def _check_size(self, size: int) -> None:
+        if self._max_record_chars is not None and size > self._max_record_chars:
+            raise PayloadTooLarge(f"Line {self._line + 1} is longer than {self._max_record_chars} characters")
+
+    def feed(self, text: str, final: bool = False):
+        self._parts.append(text)
+        self._size += len(text)
+        if "\n" not in text and not final:
+            self._check_size(self._size)
+            return
+        lines = "".join(self._parts).split("\n")
+        tail = "" if final else lines.pop()
+        self._parts = [tail]
+        self._size = len(tail)
+        for line in lines:
+            self._check_size(len(line))
+            self._line += 1
+            if not line.strip():
+                continue
+            try:
+                yield self._line, json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield self._line, RecordError(f"Invalid JSON: {exc.msg}")
+        self._check_size(self._size)
+
+
+class _JsonArrayParser:
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, max_record_chars: Optional[int] = None):
+        # Text not parsed yet, joined only once it may hold a whole element
+        self._parts: List[str] = []
+        self._size = 0
+        # An incomplete element is decoded again only once the pending text
+        # has doubled, so a large element costs linear rather than quadratic
+        # time however many chunks it spans
+        self._retry_at = 0
+        self._index = 0
+        self._state = "start"  # start -> value -> separator -> value ... -> done
+        self._max_record_chars = max_record_chars
+
+    def _check_size(self, size: int) -> None:
+        if self._max_record_chars is not None and size > self._max_record_chars:
+            raise PayloadTooLarge(f"Element {self._index + 1} is larger than {self._max_record_chars} characters")
+
+    def feed(self, text: str, final: bool = False):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size < self._retry_at and not final:
+            return
+        pending = "".join(self._parts)
+        self._retry_at = 0
+        position = 0
+        while True:
+            while position < len(pending) and pending[position].isspace():
+                position += 1
+            if position == len(pending) or self._state == "done":
+                break
+            char = pending[position]
+
+            if self._state == "start":
+                position += 1  # The opening bracket, checked by format detection
+                self._state = "value"
+            elif self._state == "separator":
+                if char not in ",]":
+                    yield self._index + 1, RecordError(f"Expected ',' or ']' after element {self._index}")
+                    self._state = "done"
+                    break
+                position += 1
+                self._state = "value" if char == "," else "done"
+            elif char == "]" and self._index == 0:
+                position += 1
+                self._state = "done"
+            else:
+                try:
+                    value, end = self._decoder.raw_decode(pending, position)
+                except json.JSONDecodeError as exc:
+                    if final:
+                        yield self._index + 1, RecordError(f"Invalid JSON: {exc.msg}")
+                        self._state = "done"
+                    else:
+                        # Incomplete element; wait for more data
+                        self._check_size(len(pending) - position)
+                        self._retry_at = 2 * (len(pending) - position)
+                    break
+                if end == len(pending) and not final and char not in '{["':
+                    break  # A number or literal may continue in the next chunk
+                self._check_size(end - position)
+                self._index += 1
+                position = end
+                self._state = "separator"
+                yield self._index, value
+
+        pending = pending[position:]
+        self._parts = [pending]
+        self._size = len(pending)
+        if final and self._state != "done":
+            yield self._index + 1, RecordError("Unterminated JSON array")
+
+
+def store_event_chunk(
+    db: Session, events: List[EventRow]
+) -> Tuple[Dict[Tuple[str, date], Dict[str, float]], List[str], List[int]]:
+    """
+    Insert a chunk of validated events and update their daily rows in one transaction.
+
+    Events already stored (per their idempotency key) are skipped and do not
+    touch the daily rows. Returns the summed deltas per (user_id, day), the
+    user ids that were not known yet, for the caller to publish to in-memory
+    state after the commit, and the positions in ``events`` of duplicates.
+    """
+    keys = [event_key(*event) for event in events]
+    duplicates: List[int] = []
+    candidates: List[int] = []
+    seen = set()
+    for position, key in enumerate(keys):
+        if key in seen or key in recent_event_keys:
+            duplicates.append(position)
+        else:
+            seen.add(key)
+            candidates.append(position)
+    if not candidates:
+        return {}, [], duplicates
+
+    new_users = ensure_users(db, (events[position][0] for position in candidates))
+    inserted = _insert_events(db, [(events[position], keys[position]) for position in candidates])
+
+    totals: Dict[Tuple[str, date], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    counts: Dict[Tuple[str, date], int] = defaultdict(int)
+    for position in candidates:
+        if keys[position] not in inserted:
+            duplicates.append(position)
+            continue
+        user_id, event_type, timestamp, fields = events[position]
+        key = (user_id, timestamp.date())
+        for column, delta in event_deltas(event_type, fields, timestamp).items():
+            totals[key][column] += delta
+        counts[key] += 1
+    for (user_id, day), deltas in totals.items():
+        apply_event(db, user_id, day, deltas, event_count=counts[(user_id, day)])
+
+    db.commit()
+    recent_event_keys.add(keys[position] for position in candidates)
+    return {key: dict(deltas) for key, deltas in totals.items()}, new_users, sorted(duplicates)
+
+
+def _insert_events(db: Session, rows: List[Tuple[EventRow, str]]) -> Set[str]:
+    """Insert events whose idempotency key is not stored yet; returns the keys inserted."""
+    values = [
+        {"user_id": user_id, "event_type": event_type, "timestamp": timestamp, "idempotency_key": key, **fields}
+        for (user_id, event_type, timestamp, fields), key in rows
+    ]
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name in ("sqlite", "postgresql"):
+        if dialect_name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = (
+            dialect_insert(Event)
+            .on_conflict_do_nothing(index_elements=["idempotency_key"])
+            .returning(Event.idempotency_key)
+        )
+        return set(db.scalars(stmt, values))
+
+    keys = [value["idempotency_key"] for value in values]
+    existing = set(db.scalars(select(Event.idempotency_key).where(Event.idempotency_key.in_(keys))))
+    missing = [value for value in values if value["idempotency_key"] not in existing]
+    if missing:
+        db.execute(insert(Event), missing)
+    return {value["idempotency_key"] for value in missing}
+
+
+def publish_changes(changes: Dict[Tuple[str, date], Dict[str, float]]) -> None:
+    """Push committed daily deltas to in-memory windows and rule state and drop stale cached results."""
+    for (user_id, day), deltas in changes.items():
+        feature_windows.observe(user_id, day, deltas)
+        recommender.observe(user_id, day, deltas_to_features(deltas), feature_windows.cached_features(user_id, day))
+    for user_id in {user_id for user_id, _ in changes}:
+        recommendation_cache.invalidate_user(user_id)
+        trend_cache.invalidate_user(user_id)
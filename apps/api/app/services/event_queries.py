@@ -0,0 +1,89 @@
+"""
+services/event_queries.py
+
+Per-user event reads.
+
+Every query filters on ``user_id`` and a half-open ``[start, end)`` timestamp
+range and orders by ``(timestamp, id)``, so it is answered by an index range
+scan on ``ix_events_user_id_timestamp`` rather than a scan of the whole events
+table. The event type, when given, is applied to the rows of that range.
+
+Pages are keyset-paginated: the cursor is the ``(timestamp, id)`` of the last
+event returned, and the next page starts strictly after it. Unlike an offset,
+this costs the same for page 1 and page 10,000 and does not skip or repeat
+events when new ones arrive between requests.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, select, tuple_
+
+from ..models.database import Event
+
+# Response field -> events column, in response order
+EVENT_FIELDS = {
+    "id": Event.id,
+    "event_type": Event.event_type,
+    "timestamp": Event.timestamp,
+    "food": Event.food_name,
+    "calories": Event.calories,
+    "protein": Event.protein_g,
+    "carbs": Event.carbs_g,
+    "fat": Event.fat_g,
+    "activity_type": Event.activity_type,
+    "duration_minutes": Event.duration_minutes,
+    "calories_burned": Event.calories_burned,
+    "sleep_quality": Event.sleep_quality,
+}
+_FIELD_NAMES = tuple(EVENT_FIELDS)
+_TIMESTAMP_POSITION = _FIELD_NAMES.index("timestamp")
+
+# (timestamp, id) of the last event of a page
+Cursor = Tuple[datetime, int]
+
+
+def user_events_query(
+    user_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    event_type: Optional[str] = None,
+    after: Optional[Cursor] = None,
+) -> Select:
+    """Select the response columns of a user's events with ``start <= timestamp < end``, oldest first."""
+    stmt = select(*EVENT_FIELDS.values()).where(Event.user_id == user_id)
+    if start is not None:
+        stmt = stmt.where(Event.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(Event.timestamp < end)
+    if event_type is not None:
+        stmt = stmt.where(Event.event_type == event_type)
+    if after is not None:
+        stmt = stmt.where(tuple_(Event.timestamp, Event.id) > tuple_(*after))
+    return stmt.order_by(Event.timestamp, Event.id)
+
+
+def event_row_to_dict(row: Sequence[Any]) -> Dict[str, Any]:
+    """Turn a row of ``user_events_query`` into its JSON-ready response dict."""
+    event = dict(zip(_FIELD_NAMES, row))
+    timestamp = row[_TIMESTAMP_POSITION]
+    event["timestamp"] = timestamp.isoformat() if timestamp else None
+    return event
+
+
+def encode_cursor(row: Sequence[Any]) -> str:
+    """Opaque cursor pointing just past ``row``."""
+    payload = json.dumps([row[_TIMESTAMP_POSITION].isoformat(), row[0]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Parse a cursor from :func:`encode_cursor`; raises ValueError when it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, event_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(timestamp), int(event_id)
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"Invalid cursor {cursor!r}") from exc
@@ -0,0 +1,163 @@
+"""
+services/export.py
+
+Incremental export of the events table to Parquet for analytics.
+
+Events are written under a Hive-style layout, one directory per event type
+and day::
+
+    <export dir>/event_type=diet/date=2024-01-31/part-000000012345.parquet
+
+so analysts can scan the whole export lazily with
+``polars.scan_parquet("<export dir>/**/*.parquet", hive_partitioning=True)``
+instead of querying the OLTP database.
+
+Runs are incremental. Events are read in chunks of ``EXPORT_CHUNK_SIZE`` in
+id order, and the highest exported id (the high-water mark) is stored in
+``_export_state.json`` after every chunk. The next run starts after it, so it
+only appends new rows, and memory stays bounded by the chunk size however
+large the table is. Each part file is named after the first event id of its
+chunk and written atomically. A run interrupted between writing a chunk and
+advancing the mark rewrites the same files when restarted, so rows are never
+duplicated. The mark assumes ids become visible in increasing order, which
+holds for SQLite's single writer; with concurrent writers on PostgreSQL an
+event committed late under a lower id than the mark would be missed.
+
+Usage (from apps/api):
+    python -m app.services.export --output exports/events
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict
+
+import polars as pl
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..models.database import SQLALCHEMY_DATABASE_URL, Event
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.getenv("EVENT_EXPORT_DIR", "exports/events")
+EXPORT_CHUNK_SIZE = int(os.getenv("EVENT_EXPORT_CHUNK_SIZE", "50000"))
+STATE_FILE = "_export_state.json"
+
+# Exported columns and their Parquet types; event_type and date live in the path
+EXPORT_SCHEMA = {
+    "id": pl.Int64,
+    "user_id": pl.Utf8,
+    "event_type": pl.Utf8,
+    "timestamp": pl.Datetime("us"),
+    "food_name": pl.Utf8,
+    "calories": pl.Float64,
+    "protein_g": pl.Float64,
+    "carbs_g": pl.Float64,
+    "fat_g": pl.Float64,
+    "fiber_g": pl.Float64,
+    "activity_type": pl.Utf8,
+    "duration_minutes": pl.Float64,
+    "calories_burned": pl.Float64,
+    "steps": pl.Int64,
+    "sleep_hours": pl.Float64,
+    "sleep_quality": pl.Utf8,
+}
+_COLUMNS = [getattr(Event, name) for name in EXPORT_SCHEMA]
+
+# Serializes runs within a process; two concurrent runs would export the same chunk
+export_lock = threading.Lock()
+
+
+def read_high_water_mark(output_dir: str) -> int:
+    """Highest event id already exported to ``output_dir`` (0 before the first run)."""
+    try:
+        with open(os.path.join(output_dir, STATE_FILE)) as f:
+            return int(json.load(f)["high_water_mark"])
+    except FileNotFoundError:
+        return 0
+
+
+def _write_atomic(path: str, write) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_high_water_mark(output_dir: str, high_water_mark: int) -> None:
+    def write(path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({"high_water_mark": high_water_mark}, f)
+
+    _write_atomic(os.path.join(output_dir, STATE_FILE), write)
+
+
+def write_partitions(chunk: pl.DataFrame, output_dir: str) -> int:
+    """Write one chunk of events as a part file per (event_type, date); returns files written."""
+    part_name = f"part-{chunk['id'].min():012d}.parquet"
+    chunk = chunk.with_columns(pl.col("timestamp").dt.date().alias("date"))
+    files = 0
+    for (event_type, day), partition in chunk.group_by(["event_type", "date"], maintain_order=True):
+        directory = os.path.join(output_dir, f"event_type={event_type}", f"date={day.isoformat()}")
+        frame = partition.drop("event_type", "date")
+        _write_atomic(os.path.join(directory, part_name), frame.write_parquet)
+        files += 1
+    return files
+
+
+def export_events(db: Session, output_dir: str = EXPORT_DIR, chunk_size: int = EXPORT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Append events newer than the high-water mark of ``output_dir`` to its Parquet partitions.
+
+    Returns the number of events and files written and the new high-water mark.
+    """
+    high_water_mark = read_high_water_mark(output_dir)
+    exported = 0
+    files = 0
+    while True:
+        rows = db.execute(
+            select(*_COLUMNS).where(Event.id > high_water_mark).order_by(Event.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        chunk = pl.DataFrame(rows, schema=EXPORT_SCHEMA, orient="row")
+        files += write_partitions(chunk, output_dir)
+        high_water_mark = rows[-1][0]
+        _write_high_water_mark(output_dir, high_water_mark)
+        exported += len(rows)
+        if len(rows) < chunk_size:
+            break
+
+    return {"exported": exported, "files": files, "high_water_mark": high_water_mark}
+
+
+def run_export(
+    output_dir: str = EXPORT_DIR,
+    database_url: str = SQLALCHEMY_DATABASE_URL,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    engine = create_engine(database_url)
+    try:
+        with sessionmaker(bind=engine)() as db, export_lock:
+            return export_events(db, output_dir, chunk_size)
+    finally:
+        engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export new events to partitioned Parquet files.")
+    parser.add_argument("--output", default=EXPORT_DIR, help=f"Export directory (default: {EXPORT_DIR})")
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    summary = run_export(args.output, database_url=args.database_url, chunk_size=args.chunk_size)
+    logger.info("Export finished: %s", summary)
+
+
+if __name__ == "__main__":
+    main()
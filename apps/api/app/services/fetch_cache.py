@@ -0,0 +1,411 @@
+"""
+services/fetch_cache.py
+
+On-disk HTTP cache for files fetched by the ingest proxy.
+
+Partners' nutrition CSVs and images rarely change, so the shared HTTP client
+(services/http_client.py) keeps the bodies of GET responses in a blob store
+(services/blob_store.py), with an entry per URL holding the response's validators and
+freshness:
+
+- while ``Cache-Control: max-age`` (or ``s-maxage``) says an entry is fresh,
+  it is served without any request;
+- after that, an entry with an ``ETag`` or ``Last-Modified`` is revalidated
+  with ``If-None-Match`` / ``If-Modified-Since``, and ``304 Not Modified``
+  serves the stored body: one small round trip instead of a full transfer;
+- responses marked ``no-store`` or ``private``, or with neither freshness
+  nor validators, are not stored.
+
+Bodies are stored as received (still content-encoded), and only once the
+response has been read to the end, so a download stopped at a size limit
+never becomes an entry. Once the stored bodies exceed
+``FETCH_CACHE_MAX_BYTES``, entries are evicted least recently used first.
+The cache is off unless ``FETCH_CACHE_MAX_BYTES`` is set, since it takes that
+much local disk. Entries are small JSON files under ``FETCH_CACHE_DIR`` and
+survive restarts.
+
+``FetchCache`` is synchronous and thread-safe; the transport calls every
+method that touches the disk through ``asyncio.to_thread`` so file IO never
+runs on the event loop.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import httpx
+
+from .blob_store import BlobStore, BlobWriter
+
+logger = logging.getLogger(__name__)
+
+# Where entries and bodies are kept, and the bytes of bodies kept there; 0 disables the cache
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR", "data/fetch_cache")
+FETCH_CACHE_MAX_BYTES = int(os.getenv("FETCH_CACHE_MAX_BYTES", "0"))
+
+# Response headers kept with a stored body and replayed when it is served
+STORED_HEADERS = ("content-type", "content-encoding", "content-length", "etag", "last-modified", "cache-control")
+
+_CONDITIONAL_HEADERS = ("if-none-match", "if-modified-since")
+
+# Bytes of a body being stored gathered before each write to its blob
+_WRITE_SIZE = 256 * 1024
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    digest: str
+    size: int
+    headers: Dict[str, str]
+    validated_at: float
+    max_age: Optional[float]
+    last_used: float
+
+    def is_fresh(self, now: float) -> bool:
+        return self.max_age is not None and now < self.validated_at + self.max_age
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if "etag" in self.headers:
+            headers["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["last-modified"]
+        return headers
+
+
+def cache_control(headers: httpx.Headers) -> Dict[str, Optional[str]]:
+    directives: Dict[str, Optional[str]] = {}
+    for part in headers.get("cache-control", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+def freshness(headers: httpx.Headers) -> Optional[float]:
+    """Seconds a response stays fresh, from ``s-maxage`` or ``max-age`` less its ``Age``; None if unstated."""
+    directives = cache_control(headers)
+    if "no-cache" in directives:
+        return 0.0
+    value = directives.get("s-maxage") or directives.get("max-age")
+    if value is None or not value.isdigit():
+        return None
+    age = headers.get("age", "0")
+    return max(0.0, float(value) - (float(age) if age.isdigit() else 0.0))
+
+
+def is_storable(response: httpx.Response) -> bool:
+    directives = cache_control(response.headers)
+    if response.status_code != 200 or "no-store" in directives or "private" in directives:
+        return False
+    if response.headers.get("vary", "").strip() == "*":
+        return False
+    return bool(freshness(response.headers)) or "etag" in response.headers or "last-modified" in response.headers
+
+
+class FetchCache:
+    """URL entries pointing into the blob store, evicted least recently used first."""
+
+    def __init__(
+        self,
+        directory: str = FETCH_CACHE_DIR,
+        max_bytes: int = FETCH_CACHE_MAX_BYTES,
+        blobs: Optional[BlobStore] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Own blob directory: the cache decides when its bodies go
+        self.blobs = blobs or BlobStore(os.path.join(directory, "blobs"), max_age=None)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._references: Dict[str, int] = {}
+        self._bytes = 0
+        self._loaded = False
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.stored = 0
+        self.evictions = 0
+        self.bytes_served = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _entry_path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    def _load(self) -> None:
+        """Read the entries left by earlier runs, least recently used first."""
+        self._loaded = True
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        entries = []
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    entries.append(CacheEntry(**json.load(f)))
+            except (OSError, ValueError, TypeError):
+                logger.warning("Skipping unreadable fetch cache entry %s", name)
+        for entry in sorted(entries, key=lambda entry: entry.last_used):
+            if self.blobs.size(entry.digest) is not None:
+                self._add(entry)
+        self._evict()
+
+    def _add(self, entry: CacheEntry) -> None:
+        self._entries[entry.url] = entry
+        self._entries.move_to_end(entry.url)
+        if self._references.get(entry.digest, 0) == 0:
+            self._bytes += entry.size
+        self._references[entry.digest] = self._references.get(entry.digest, 0) + 1
+
+    def _release(self, entry: CacheEntry) -> None:
+        self._references[entry.digest] -= 1
+        if self._references[entry.digest] == 0:
+            # No other URL has the same body
+            del self._references[entry.digest]
+            self._bytes -= entry.size
+            self.blobs.delete(entry.digest)
+
+    def _remove(self, url: str) -> None:
+        entry = self._entries.pop(url, None)
+        if entry is None:
+            return
+        self._release(entry)
+        try:
+            os.remove(self._entry_path(url))
+        except FileNotFoundError:
+            pass
+
+    def _save(self, entry: CacheEntry) -> None:
+        path = self._entry_path(entry.url)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(entry), f)
+        os.replace(tmp_path, path)
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def now(self) -> float:
+        return self._clock()
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+                entry.last_used = self._clock()
+            return entry
+
+    def open(self, entry: CacheEntry) -> Optional["_BlobStream"]:
+        """The stored body of an entry; None, and the entry dropped, if it is gone."""
+        try:
+            stream = _BlobStream(open(self.blobs.path(entry.digest), "rb"))
+        except FileNotFoundError:
+            self.discard(entry.url)
+            return None
+        with self._lock:
+            self.bytes_served += entry.size
+        return stream
+
+    def store(self, url: str, writer: BlobWriter, headers: httpx.Headers, max_age: Optional[float]) -> CacheEntry:
+        digest, _ = writer.commit()
+        now = self._clock()
+        stored_headers = {name: headers[name] for name in STORED_HEADERS if name in headers}
+        stored_headers["content-length"] = str(writer.size)
+        entry = CacheEntry(url, digest, writer.size, stored_headers, now, max_age, now)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            previous = self._entries.pop(url, None)
+            self._add(entry)
+            if previous is not None:
+                self._release(previous)
+            self._save(entry)
+            self.stored += 1
+            self._evict()
+        return entry
+
+    def refresh(self, entry: CacheEntry, headers: httpx.Headers) -> None:
+        """Record a 304: the entry is valid again, with any updated validators and freshness."""
+        with self._lock:
+            if self._entries.get(entry.url) is not entry:
+                # Evicted or replaced while the request was in flight; saving would leave an orphan
+                return
+            for name in ("etag", "last-modified", "cache-control"):
+                if name in headers:
+                    entry.headers[name] = headers[name]
+            entry.validated_at = self._clock()
+            entry.max_age = freshness(headers) if "cache-control" in headers else entry.max_age
+            self._save(entry)
+
+    def discard(self, url: str) -> None:
+        with self._lock:
+            self._remove(url)
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for sizing the cache; revalidations count as hits in ``hit_rate``."""
+        with self._lock:
+            lookups = self.hits + self.revalidated + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.revalidated) / lookups if lookups else 0.0,
+                "stored": self.stored,
+                "evictions": self.evictions,
+                "bytes_served": self.bytes_served,
+            }
+
+
+class _BlobStream(httpx.AsyncByteStream):
+    """A stored body, read off the event loop."""
+
+    def __init__(self, file, chunk_size: int = 64 * 1024):
+        self._file = file
+        self._chunk_size = chunk_size
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        while chunk := await asyncio.to_thread(self._file.read, self._chunk_size):
+            yield chunk
+
+    async def aclose(self) -> None:
+        self._file.close()
+
+
+class _StoringStream(httpx.AsyncByteStream):
+    """
+    Response body that is copied to a blob and stored once read to the end.
+
+    Writes and ``on_complete`` run in worker threads.
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream, writer: BlobWriter, on_complete: Callable[[BlobWriter], None]):
+        self._stream = stream
+        self._writer: Optional[BlobWriter] = writer
+        self._on_complete = on_complete
+        self._complete = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        pending = bytearray()
+        async for chunk in self._stream:
+            if self._writer is not None:
+                pending += chunk
+                if len(pending) >= _WRITE_SIZE:
+                    await asyncio.to_thread(self._writer.write, bytes(pending))
+                    pending.clear()
+            yield chunk
+        if self._writer is not None and pending:
+            await asyncio.to_thread(self._writer.write, bytes(pending))
+        self._complete = True
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                try:
+                    if self._complete:
+                        await asyncio.to_thread(self._on_complete, writer)
+                    else:
+                        await asyncio.to_thread(writer.abort)
+                except OSError:
+                    logger.warning("Could not store fetched body in the cache", exc_info=True)
+                    await asyncio.to_thread(writer.abort)
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """Serves GETs from a :class:`FetchCache`, revalidating and filling it on the way."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, cache: FetchCache):
+        self._transport = transport
+        self.cache = cache
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if (
+            not self.cache.enabled
+            or request.method != "GET"
+            or "authorization" in request.headers
+            or any(name in request.headers for name in _CONDITIONAL_HEADERS)
+        ):
+            return await self._transport.handle_async_request(request)
+
+        url = str(request.url)
+        entry = await asyncio.to_thread(self.cache.lookup, url)
+        if entry is not None:
+            if entry.is_fresh(self.cache.now()):
+                cached = await self._cached_response(request, entry)
+                if cached is not None:
+                    self.cache.count("hits")
+                    return cached
+            request.headers.update(entry.conditional_headers())
+
+        response = await self._transport.handle_async_request(request)
+        if response.status_code == 304 and entry is not None:
+            await response.aclose()
+            await asyncio.to_thread(self.cache.refresh, entry, response.headers)
+            cached = await self._cached_response(request, entry)
+            if cached is not None:
+                self.cache.count("revalidated")
+                return cached
+            # The body went missing: ask again for all of it
+            for name in _CONDITIONAL_HEADERS:
+                request.headers.pop(name, None)
+            response = await self._transport.handle_async_request(request)
+
+        self.cache.count("misses")
+        if is_storable(response):
+            try:
+                writer = await asyncio.to_thread(self.cache.blobs.writer)
+            except OSError:
+                logger.warning("Could not open a blob for %s", url, exc_info=True)
+                return response
+            max_age = freshness(response.headers)
+            headers = response.headers
+            response.stream = _StoringStream(
+                response.stream, writer, lambda writer: self.cache.store(url, writer, headers, max_age)
+            )
+        elif response.status_code == 200 and entry is not None:
+            await asyncio.to_thread(self.cache.discard, url)
+        return response
+
+    async def _cached_response(self, request: httpx.Request, entry: CacheEntry) -> Optional[httpx.Response]:
+        stream = await asyncio.to_thread(self.cache.open, entry)
+        if stream is None:
+            return None
+        return httpx.Response(200, headers=entry.headers, stream=stream, request=request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+fetch_cache = FetchCache()
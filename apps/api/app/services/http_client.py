@@ -0,0 +1,179 @@
+"""
+services/http_client.py
+
+Shared outbound HTTP client for server-side fetches.
+
+One ``httpx.AsyncClient`` per process, opened on first use and closed by the
+application lifespan, so repeated fetches from the same data source reuse
+kept-alive connections instead of paying a TCP (and TLS) handshake each
+time. Limits come from the environment:
+
+- ``HTTP_MAX_CONNECTIONS`` / ``HTTP_MAX_KEEPALIVE``: size of the pool
+- ``HTTP_KEEPALIVE_EXPIRY``: seconds an idle connection is kept
+- ``HTTP_MAX_PER_HOST``: concurrent requests to one origin, so a single slow
+  source cannot take the whole pool
+- ``HTTP_TIMEOUT``: seconds per request
+- ``HTTP_ENABLE_HTTP2``: negotiate HTTP/2 where the server supports it; needs
+  the optional ``h2`` package (``pip install httpx[http2]``)
+- ``FETCH_CACHE_MAX_BYTES``: bytes of GET response bodies kept on disk under
+  ``FETCH_CACHE_DIR`` and revalidated by services/fetch_cache.py; off when
+  unset or ``0``
+"""
+
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from .fetch_cache import CachingTransport, FetchCache, fetch_cache
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "10"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_ENABLE_HTTP2 = os.getenv("HTTP_ENABLE_HTTP2", "0").lower() in ("1", "true", "yes")
+
+try:
+    import h2  # noqa: F401
+    http2_available = True
+except ImportError:
+    http2_available = False
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that frees its per-host slot once it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release: Optional[Callable[[], None]] = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class PerHostLimitTransport(httpx.AsyncBaseTransport):
+    """
+    Caps in-flight requests per (scheme, host, port) on top of a pooled transport.
+
+    An origin's semaphore is kept only while requests to it are in flight or
+    waiting, so fetching from many different hosts does not grow the map.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_per_host: int):
+        self._transport = transport
+        self.max_per_host = max_per_host
+        # Origin -> (semaphore, requests holding or waiting for a slot)
+        self._semaphores: Dict[Tuple[bytes, bytes, Optional[int]], Tuple[asyncio.Semaphore, int]] = {}
+
+    def _enter(self, origin: Tuple[bytes, bytes, Optional[int]]) -> asyncio.Semaphore:
+        semaphore, users = self._semaphores.get(origin) or (asyncio.Semaphore(self.max_per_host), 0)
+        self._semaphores[origin] = (semaphore, users + 1)
+        return semaphore
+
+    def _leave(self, origin: Tuple[bytes, bytes, Optional[int]]) -> None:
+        semaphore, users = self._semaphores[origin]
+        if users == 1:
+            # Nothing holds or waits for it: a new one is equivalent
+            del self._semaphores[origin]
+        else:
+            self._semaphores[origin] = (semaphore, users - 1)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        origin = (request.url.raw_scheme, request.url.raw_host, request.url.port)
+        semaphore = self._enter(origin)
+        try:
+            await semaphore.acquire()
+        except BaseException:
+            self._leave(origin)
+            raise
+
+        def release() -> None:
+            semaphore.release()
+            self._leave(origin)
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def create_http_client(
+    max_connections: int = HTTP_MAX_CONNECTIONS,
+    max_keepalive: int = HTTP_MAX_KEEPALIVE,
+    keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+    max_per_host: int = HTTP_MAX_PER_HOST,
+    timeout: float = HTTP_TIMEOUT,
+    http2: bool = HTTP_ENABLE_HTTP2,
+    cache: Optional[FetchCache] = fetch_cache,
+) -> httpx.AsyncClient:
+    """Pooled client with the configured limits, answering GETs from ``cache`` where it can."""
+    if http2 and not http2_available:
+        logger.warning("HTTP_ENABLE_HTTP2 is set but the h2 package is missing; using HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=keepalive_expiry,
+    )
+    transport: httpx.AsyncBaseTransport = PerHostLimitTransport(
+        httpx.AsyncHTTPTransport(limits=limits, http2=http2), max_per_host
+    )
+    if cache is not None and cache.enabled:
+        # Outside the per-host limit: cache hits take no connection slot
+        transport = CachingTransport(transport, cache)
+    return httpx.AsyncClient(
+        transport=transport,
+        follow_redirects=True,
+        timeout=timeout,
+    )
+
+
+class SharedHTTPClient:
+    """Lazily opened process-wide client; pooled connections belong to one event loop."""
+
+    def __init__(self, factory: Callable[[], httpx.AsyncClient] = create_http_client):
+        self._factory = factory
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def get(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            # Connections opened on another (finished) loop cannot be reused
+            self._client = self._factory()
+            self._loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+
+
+shared_http_client = SharedHTTPClient()
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    """Dependency returning the shared client."""
+    return shared_http_client.get()
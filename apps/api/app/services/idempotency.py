@@ -0,0 +1,35 @@
+"""
+services/idempotency.py
+
+Content-derived idempotency keys for ingested events.
+
+Mobile clients retry on timeouts and wearable syncs re-send overlapping
+windows, so the same event can arrive many times. Each event gets a key
+hashed from its user, type, timestamp and stored fields. The key is stored in
+``events.idempotency_key`` under a unique index, and rows are inserted with
+``ON CONFLICT DO NOTHING``. A re-sent event therefore never becomes a second
+row and is never added to the daily aggregates twice.
+
+Keys of events stored or rejected recently are kept in a bounded LRU set.
+Retries usually follow the original within seconds, so most duplicates are
+rejected from memory without a database round trip. The set is exact, unlike
+a Bloom filter, which could reject a new event on a false positive. The
+unique index remains the authority for everything the set has forgotten or
+never saw, e.g. events taken by another worker process.
+"""
+
+import os
+from datetime import datetime
+from typing import Any, Dict
+
+from .cache import LRUSet, canonical_hash
+
+# Hex digits of the SHA-256 kept per key (128 bits)
+KEY_LENGTH = 32
+
+recent_event_keys = LRUSet(max_entries=int(os.getenv("RECENT_EVENT_KEYS_SIZE", "100000")))
+
+
+def event_key(user_id: str, event_type: str, timestamp: datetime, fields: Dict[str, Any]) -> str:
+    """Idempotency key of an event; equal for re-sent copies, whatever the field order."""
+    return canonical_hash(user_id, event_type, timestamp.isoformat(), fields)[:KEY_LENGTH]
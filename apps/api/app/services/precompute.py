@@ -0,0 +1,272 @@
+"""
+services/precompute.py
+
+Nightly batch job that precomputes recommendations into the recommendations table.
+
+Users with daily features for the target day are split into chunks and
+evaluated on a process pool with the vectorized recommender. Each chunk's
+results are upserted in its own short transaction, so a crashed run can simply
+be restarted: users that already have a current row for the day and rules
+version are skipped.
+
+Usage (from apps/api):
+    python -m app.services.precompute --date 2024-01-31 --workers 4
+"""
+
+import argparse
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import and_, create_engine, insert, or_, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..models.database import (
+    SQLALCHEMY_DATABASE_URL,
+    DailyFeature,
+    Recommendation,
+    UserTarget,
+)
+from .daily_features import row_to_features, user_targets_to_features
+from .recommender import recommender
+from .trends import TREND_DAYS, TREND_FEATURES, compute_trends
+from .windows import WINDOW_SIZES, UserWindows
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "app"
+
+# Session factory of a pool worker process, created by _init_worker
+_worker_sessions: Optional[sessionmaker] = None
+
+
+def _make_sessionmaker(database_url: str) -> sessionmaker:
+    connect_args = {"check_same_thread": False} if database_url.startswith("sqlite") else {}
+    engine = create_engine(database_url, connect_args=connect_args)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _is_current():
+    """SQL condition: the recommendation was computed after the day's last event."""
+    return and_(
+        DailyFeature.user_id == Recommendation.user_id,
+        DailyFeature.date == Recommendation.date,
+        or_(DailyFeature.updated_at.is_(None), DailyFeature.updated_at <= Recommendation.created_at),
+    )
+
+
+def get_precomputed(db: Session, user_id: str, day: date, model_version: str) -> Optional[Recommendation]:
+    """Return the user's precomputed row for a day if it is still current."""
+    return (
+        db.query(Recommendation)
+        .join(DailyFeature, _is_current())
+        .filter(
+            Recommendation.user_id == user_id,
+            Recommendation.date == day,
+            Recommendation.model_version == model_version,
+            Recommendation.status == "ready",
+        )
+        .first()
+    )
+
+
+def pending_user_ids(db: Session, day: date, model_version: str) -> List[str]:
+    """Users with daily features for ``day`` and no current precomputed row."""
+    done = (
+        select(Recommendation.user_id)
+        .join(DailyFeature, _is_current())
+        .where(Recommendation.date == day, Recommendation.model_version == model_version)
+    )
+    rows = (
+        db.query(DailyFeature.user_id)
+        .filter(DailyFeature.date == day, DailyFeature.user_id.not_in(done))
+        .order_by(DailyFeature.user_id)
+        .all()
+    )
+    return [user_id for (user_id,) in rows]
+
+
+def _to_columns(rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    names = {name for row in rows for name, value in row.items() if isinstance(value, (int, float))}
+    return {
+        name: np.array([row.get(name, np.nan) for row in rows], dtype=np.float64)
+        for name in names
+    }
+
+
+def build_recommendation_rows(
+    db: Session, user_ids: List[str], day: date, top_n: int = 5
+) -> List[Dict[str, Any]]:
+    """
+    Evaluate a chunk of users and return rows ready for the recommendations table.
+
+    Uses the same features as the live GET path (the day's materialized row plus
+    rolling windows) but reads them for the whole chunk in two queries. Trends
+    for the whole chunk are fitted from the same history and stored alongside.
+    """
+    # Taken before reading so events racing with the job leave the row stale
+    computed_at = datetime.utcnow()
+    oldest = day - timedelta(days=max(WINDOW_SIZES) - 1)
+    history = (
+        db.query(DailyFeature)
+        .filter(
+            DailyFeature.user_id.in_(user_ids),
+            DailyFeature.date >= oldest,
+            DailyFeature.date <= day,
+        )
+        .order_by(DailyFeature.user_id, DailyFeature.date)
+        .all()
+    )
+    targets = (
+        db.query(UserTarget)
+        .filter(UserTarget.user_id.in_(user_ids))
+        .order_by(UserTarget.created_at)
+        .all()
+    )
+
+    windows: Dict[str, UserWindows] = {}
+    today: Dict[str, DailyFeature] = {}
+    for row in history:
+        windows.setdefault(row.user_id, UserWindows(loaded_at=0.0)).set_row(row)
+        if row.date == day:
+            today[row.user_id] = row
+    latest_targets = {target.user_id: target for target in targets}
+
+    user_ids = [user_id for user_id in user_ids if user_id in today]
+    features = [
+        {**row_to_features(today[user_id]), **windows[user_id].features(day.toordinal())}
+        for user_id in user_ids
+    ]
+    user_targets = [user_targets_to_features(latest_targets.get(user_id)) for user_id in user_ids]
+
+    recs = recommender.generate_recommendations_batch(
+        _to_columns(features), _to_columns(user_targets), top_n=top_n, n_rows=len(user_ids)
+    )
+    trends = compute_trends([
+        {feature: windows[user_id].series(feature, day.toordinal(), TREND_DAYS) for feature in TREND_FEATURES}
+        for user_id in user_ids
+    ])
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "date": day,
+            "channel": CHANNEL,
+            "content": {"recommendations": user_recs, **user_trends},
+            "rules_applied": [rec["id"] for rec in user_recs],
+            "model_version": recommender.rules_version,
+            "status": "ready",
+            "created_at": computed_at,
+        }
+        for user_id, user_recs, user_trends in zip(user_ids, recs, trends)
+    ]
+
+
+def store_recommendation_rows(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """Bulk upsert precomputed rows in one transaction; returns the number written."""
+    if not rows:
+        return 0
+
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name in ("sqlite", "postgresql"):
+        if dialect_name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(Recommendation)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "date", "model_version"],
+            set_={
+                column: stmt.excluded[column]
+                for column in ("content", "rules_applied", "status", "channel", "created_at")
+            },
+        )
+    else:
+        stmt = insert(Recommendation)
+
+    db.execute(stmt, rows)
+    db.commit()
+    return len(rows)
+
+
+def _init_worker(database_url: str) -> None:
+    global _worker_sessions
+    _worker_sessions = _make_sessionmaker(database_url)
+
+
+def _evaluate_chunk(user_ids: List[str], day_iso: str, top_n: int) -> List[Dict[str, Any]]:
+    with _worker_sessions() as db:
+        return build_recommendation_rows(db, user_ids, date.fromisoformat(day_iso), top_n)
+
+
+def run_precompute(
+    day: date,
+    database_url: str = SQLALCHEMY_DATABASE_URL,
+    chunk_size: int = 1000,
+    workers: Optional[int] = None,
+    top_n: int = 5,
+) -> Dict[str, Any]:
+    """
+    Precompute recommendations for every pending user on ``day``.
+
+    Workers only read and evaluate; the parent process writes each finished
+    chunk, which keeps a single writer on SQLite. With ``workers=1`` chunks
+    are evaluated in-process.
+    """
+    sessions = _make_sessionmaker(database_url)
+    workers = workers or os.cpu_count() or 1
+    with sessions() as db:
+        pending = pending_user_ids(db, day, recommender.rules_version)
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    logger.info("Precomputing %d users in %d chunks for %s", len(pending), len(chunks), day)
+
+    written = 0
+    with sessions() as db:
+        if workers <= 1:
+            for chunk in chunks:
+                written += store_recommendation_rows(db, build_recommendation_rows(db, chunk, day, top_n))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(database_url,)
+            ) as pool:
+                futures = [pool.submit(_evaluate_chunk, chunk, day.isoformat(), top_n) for chunk in chunks]
+                for future in as_completed(futures):
+                    written += store_recommendation_rows(db, future.result())
+
+    return {
+        "date": day.isoformat(),
+        "model_version": recommender.rules_version,
+        "pending_users": len(pending),
+        "chunks": len(chunks),
+        "written": written,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompute recommendations for a day.")
+    parser.add_argument("--date", type=date.fromisoformat,
+                        default=datetime.utcnow().date() - timedelta(days=1),
+                        help="Day to precompute (default: yesterday, UTC)")
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top-n", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    summary = run_precompute(
+        args.date,
+        database_url=args.database_url,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        top_n=args.top_n,
+    )
+    logger.info("Precompute finished: %s", summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,33 +5,30 @@ This module aggregates metrics from raw events and generates simple, non-clinica
 recommendations based on YAML-defined rules. In the future, this can be extended with ML-based models.
 """
 
-import os
-import yaml
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 
+from .rule_engine import RuleCache, RuleSyntaxError, compile_expression
+
+RULES_DIR = Path(__file__).parent.parent.parent.parent.parent / "rules"
+
+# Compiled rules shared across requests; rule files are only re-read when they change
+rule_cache = RuleCache(RULES_DIR)
+
 
 def load_rules() -> List[Dict[str, Any]]:
-    """Load recommendation rules from YAML files in the rules directory."""
-    rules_dir = Path(__file__).parent.parent.parent.parent / "rules"
-    rules = []
-    for yaml_file in rules_dir.glob("*.yaml"):
-        with open(yaml_file, 'r', encoding='utf-8') as f:
-            rule = yaml.safe_load(f)
-            if rule:
-                rules.append(rule)
-    return rules
+    """Return the valid recommendation rules from the rules directory as loaded from YAML."""
+    return [rule.raw for rule in rule_cache.rules()]
 
 
 def evaluate_condition(condition: str, metrics: Dict[str, Any], targets: Dict[str, Any]) -> bool:
     """Evaluate a simple condition string against metrics and targets."""
-    # Simple evaluation for conditions like "daily_features.fiber_g < user_targets.fiber_g * 0.8"
+    # Conditions look like "daily_features.fiber_g < user_targets.fiber_g * 0.8"
     try:
-        # Replace variable references
-        eval_str = condition.replace("daily_features.", "metrics.").replace("user_targets.", "targets.")
-        return eval(eval_str)
-    except:
+        predicate, _ = compile_expression(condition)
+    except RuleSyntaxError:
         return False
+    return predicate(metrics, targets)
 
 
 def generate_recommendations(metrics: Dict[str, Any], targets: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
@@ -39,19 +36,11 @@ def generate_recommendations(metrics: Dict[str, Any], targets: Optional[Dict[str
     if targets is None:
         targets = {"fiber_g": 25, "calories": 2000}  # Default targets
 
-    rules = load_rules()
-    recommendations = []
-
-    for rule in rules:
-        rule_id = rule.get("id")
-        condition = rule.get("when", {}).get("daily_features.fiber_g", "")
-        if evaluate_condition(condition, metrics, targets):
-            recommendations.append({
-                "id": rule_id,
-                "message": rule.get("then", {}).get("message", ""),
-                "rationale": rule.get("then", {}).get("rationale", ""),
-                "guardrails": rule.get("then", {}).get("guardrails", [])
-            })
+    recommendations = [
+        rule.to_recommendation()
+        for rule in rule_cache.rules()
+        if rule.matches(metrics, targets)
+    ]
 
     # Fallback to simple heuristics if no rules match
     if not recommendations:
@@ -6,8 +6,197 @@ activity, and sleep patterns. Includes both rule-based heuristics and
 machine learning model integration for more sophisticated predictions.
 """
 
-from typing import List, Dict, Any
-from datetime import datetime
+import copy
+import math
+import numbers
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Callable, List, Dict, Any, FrozenSet, Iterable, Mapping, Optional, Tuple
+from datetime import date, datetime
+
+import numpy as np
+
+from .cache import LRUTTLCache, canonical_hash
+from .trends import TREND_FEATURES
+
+PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+# Personas with their own rule bundle; any other persona gets the default bundle
+PERSONAS = ("athlete", "vegan", "shift_worker")
+
+
+def normalize_persona(persona: Any) -> Optional[str]:
+    """Map a persona label ("Shift worker", "athletes", ...) to a bundle key, or None."""
+    if not isinstance(persona, str):
+        return None
+    key = persona.strip().lower().replace("-", "_").replace(" ", "_")
+    if key not in PERSONAS and key.endswith("s"):
+        key = key[:-1]
+    return key if key in PERSONAS else None
+
+
+class _ColumnView:
+    """
+    Column accessor mirroring ``dict.get`` over a batch of feature rows.
+
+    Missing columns and null cells resolve to the default, which matches the
+    scalar path receiving a dict without that key.
+    """
+
+    def __init__(self, columns: Mapping[str, np.ndarray], n_rows: int):
+        self.columns = columns
+        self.n_rows = n_rows
+
+    def get(self, key: str, default: Any = 0) -> np.ndarray:
+        column = self.columns.get(key)
+        if column is None:
+            return np.broadcast_to(np.asarray(default, dtype=np.float64), (self.n_rows,))
+        return np.where(np.isnan(column), default, column)
+
+
+def _to_columns(table: Any) -> Dict[str, Any]:
+    """Return a name -> column mapping for a dict of arrays or a pandas/polars frame."""
+    if table is None:
+        return {}
+    if isinstance(table, Mapping):
+        return dict(table)
+    return {str(name): table[name] for name in table.columns}
+
+
+def _is_null(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _as_float_column(values: Any) -> Optional[Tuple[np.ndarray, Optional[np.ndarray]]]:
+    """
+    Convert a column to float64, with nulls as NaN; None if it is not one-dimensional.
+
+    Also returns a mask of the cells that are not numbers (NaN in the
+    column), or None when every cell is a number or null.
+    """
+    array = np.asarray(values)
+    if array.ndim != 1:
+        return None
+    if array.dtype.kind in "biuf":
+        return array.astype(np.float64), None
+    cells = array.tolist()
+    if all(kind is type(None) or issubclass(kind, numbers.Real) for kind in set(map(type, cells))):
+        return np.asarray(array, dtype=np.float64), None
+    column = np.full(len(cells), np.nan)
+    odd = np.zeros(len(cells), dtype=bool)
+    for index, value in enumerate(cells):
+        if _is_null(value):
+            continue
+        if isinstance(value, numbers.Real):
+            column[index] = value
+        else:
+            odd[index] = True
+    return column, (odd if odd.any() else None)
+
+
+def _unique_rows(masks: np.ndarray):
+    """Return (unique rows, inverse index) of a 2-D boolean matrix."""
+    n_rows, n_columns = masks.shape
+    if n_columns == 0:
+        return np.zeros((1, 0), dtype=bool), np.zeros(n_rows, dtype=np.intp)
+    if n_columns > 62:
+        patterns, inverse = np.unique(masks, axis=0, return_inverse=True)
+        return patterns, inverse.ravel()
+
+    # Encode each row as an integer bit pattern; much faster than np.unique(axis=0)
+    weights = np.left_shift(1, np.arange(n_columns, dtype=np.int64))
+    codes, inverse = np.unique(masks.astype(np.int64) @ weights, return_inverse=True)
+    patterns = (codes[:, None] & weights) != 0
+    return patterns, inverse.ravel()
+
+
+class _ReadRecorder(dict):
+    """Empty mapping that records every key a rule condition asks for."""
+
+    def __init__(self):
+        super().__init__()
+        self.keys_read: set = set()
+
+    def get(self, key, default=None):
+        self.keys_read.add(key)
+        return default
+
+    def __getitem__(self, key):
+        self.keys_read.add(key)
+        raise KeyError(key)
+
+
+def _infer_reads(condition) -> FrozenSet[str]:
+    """
+    Infer the features a condition reads by running it against a recorder.
+
+    Only the branch taken with every feature missing is observed, so rules
+    with data-dependent branches should declare ``reads`` explicitly.
+    """
+    recorder = _ReadRecorder()
+    try:
+        condition(recorder)
+    except Exception:
+        pass
+    return frozenset(recorder.keys_read)
+
+
+class _RuleBundle:
+    """
+    The rules that apply to one persona, compiled once.
+
+    Rules are kept in output order and indexed by the features they read, so
+    evaluation never visits rules that cannot apply to the persona.
+    """
+
+    __slots__ = ("persona", "ranked_rules", "rules_by_feature")
+
+    def __init__(self, persona: Optional[str], rules: Iterable[Dict[str, Any]]):
+        self.persona = persona
+        # Rules in output order, so the first triggered rules are the top N
+        self.ranked_rules = sorted(
+            rules, key=lambda r: (PRIORITY_ORDER.get(r["priority"], 3), r["id"])
+        )
+        # Feature name -> ranks of the rules that read it
+        self.rules_by_feature: Dict[str, List[int]] = {}
+        for rank, rule in enumerate(self.ranked_rules):
+            for feature in rule["reads"]:
+                self.rules_by_feature.setdefault(feature, []).append(rank)
+
+    def ranks_for_features(self, feature_names: Iterable[str]) -> List[int]:
+        return sorted({
+            rank
+            for name in feature_names
+            for rank in self.rules_by_feature.get(name, ())
+        })
+
+
+def _applies_to(rule: Dict[str, Any], persona: Optional[str]) -> bool:
+    """Whether a rule belongs in the bundle of ``persona`` (None = default bundle)."""
+    if persona in rule.get("exclude_personas", ()):
+        return False
+    personas = rule.get("personas")
+    return personas is None or persona in personas
+
+
+class _UserRuleState:
+    """Last evaluated features and triggered rules for one user."""
+
+    __slots__ = ("daily_features", "user_targets", "features", "bundle", "triggered", "day", "loaded_at")
+
+    def __init__(self, loaded_at: float):
+        self.daily_features: Dict[str, Any] = {}
+        self.user_targets: Dict[str, Any] = {}
+        self.features: Dict[str, Any] = {}
+        self.bundle: Optional[_RuleBundle] = None
+        # Sorted ranks (indexes into the bundle's ranked rules) of triggered rules
+        self.triggered: List[int] = []
+        # Day the features describe, when tracked through track_user
+        self.day: Optional[date] = None
+        self.loaded_at = loaded_at
 
 
 class NutritionRecommender:
@@ -15,17 +204,62 @@ class NutritionRecommender:
     Main recommendation engine for nutrition and wellness insights.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        max_tracked_users: int = 100_000,
+        max_age_seconds: float = 900.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
         """Initialize the recommender with rule-based system."""
         self.rules = self._load_rules()
+        for rule in self.rules:
+            if "reads" not in rule:
+                rule["reads"] = _infer_reads(rule["condition"])
+        # One precompiled bundle per persona; None is the default bundle
+        self._bundles: Dict[Optional[str], _RuleBundle] = {
+            persona: _RuleBundle(persona, [rule for rule in self.rules if _applies_to(rule, persona)])
+            for persona in (None, *PERSONAS)
+        }
+
+        # Every feature some rule reads
+        self._read_features = frozenset().union(*(rule["reads"] for rule in self.rules))
+
+        self.max_tracked_users = max_tracked_users
+        self.max_age_seconds = max_age_seconds
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._user_states: "OrderedDict[str, _UserRuleState]" = OrderedDict()
+
+        # Identifies the rulebook; part of every cache key so rule changes never serve stale results
+        self.rules_version = canonical_hash([
+            [rule["id"], rule["message"], rule["rationale"], rule["tags"],
+             rule["priority"], sorted(rule["reads"]),
+             rule.get("personas"), rule.get("exclude_personas")]
+            for rule in sorted(self.rules, key=lambda r: r["id"])
+        ])[:16]
+
+    def bundle_for(self, persona: Any) -> _RuleBundle:
+        """The precompiled rule bundle for a persona (default bundle if unknown)."""
+        return self._bundles[normalize_persona(persona)]
 
     def _load_rules(self) -> List[Dict[str, Any]]:
-        """Load recommendation rules from configuration."""
+        """
+        Load recommendation rules from configuration.
+
+        Each ``condition`` serves both paths: it gets a feature dict for one
+        user, or a :class:`_ColumnView` whose ``get`` returns whole columns
+        for a batch. Conditions therefore combine comparisons with ``&`` and
+        ``|`` rather than ``and``/``or``/``not`` or branches.
+        """
         return [
             {
                 "id": "fiber_boost_simple",
                 "name": "Increase Fiber Intake",
-                "condition": lambda f: f.get("fiber_g", 0) < f.get("target_fiber_g", 25) * 0.8,
+                # Prefer the rolling 7-day average when it is available
+                "condition": lambda f: (
+                    f.get("fiber_g_7d_avg", f.get("fiber_g", 0)) < f.get("target_fiber_g", 25) * 0.8
+                ),
+                "reads": frozenset({"fiber_g_7d_avg", "fiber_g", "target_fiber_g"}),
                 "message": "Try increasing fiber intake by 6–8g/day: add an apple and a handful of almonds.",
                 "rationale": "Your 7-day average fiber intake is below target.",
                 "tags": ["nutrition", "digestive-health"],
@@ -35,6 +269,7 @@ class NutritionRecommender:
                 "id": "water_intake_reminder",
                 "name": "Hydration Reminder",
                 "condition": lambda f: f.get("water_ml", 0) < 2000,
+                "reads": frozenset({"water_ml"}),
                 "message": "Drink more water! Aim for at least 8-10 glasses per day.",
                 "rationale": "Proper hydration supports energy and metabolism.",
                 "tags": ["hydration", "wellness"],
@@ -44,15 +279,19 @@ class NutritionRecommender:
                 "id": "protein_target",
                 "name": "Protein Goal",
                 "condition": lambda f: f.get("protein_g", 0) < f.get("target_protein_g", 50) * 0.9,
+                "reads": frozenset({"protein_g", "target_protein_g"}),
                 "message": "Increase protein intake to support muscle health and satiety.",
                 "rationale": "Adequate protein is essential for body composition.",
                 "tags": ["nutrition", "protein"],
-                "priority": "medium"
+                "priority": "medium",
+                # Replaced by persona-specific protein rules
+                "exclude_personas": ["athlete", "vegan"]
             },
             {
                 "id": "sleep_quality",
                 "name": "Sleep Optimization",
                 "condition": lambda f: f.get("sleep_hours", 0) < 7,
+                "reads": frozenset({"sleep_hours"}),
                 "message": "Aim for 7-9 hours of quality sleep each night.",
                 "rationale": "Better sleep improves metabolism and recovery.",
                 "tags": ["sleep", "wellness"],
@@ -62,6 +301,7 @@ class NutritionRecommender:
                 "id": "activity_reminder",
                 "name": "Daily Movement",
                 "condition": lambda f: f.get("steps", 0) < 8000,
+                "reads": frozenset({"steps"}),
                 "message": "Try to reach 10,000 steps today with regular movement.",
                 "rationale": "Daily activity strengthens cardiovascular health.",
                 "tags": ["activity", "fitness"],
@@ -70,37 +310,95 @@ class NutritionRecommender:
             {
                 "id": "balanced_macros",
                 "name": "Macro Balance",
-                "condition": lambda f: not self._check_macro_balance(f),
+                "condition": self._macros_unbalanced,
+                "reads": frozenset({"total_calories", "protein_g", "carbs_g", "fat_g"}),
                 "message": "Aim for balanced macronutrients: 40% carbs, 30% protein, 30% fat.",
                 "rationale": "Balanced macros support sustained energy and health.",
                 "tags": ["nutrition", "macros"],
                 "priority": "low"
+            },
+            {
+                "id": "athlete_protein",
+                "name": "Training Protein",
+                "condition": lambda f: f.get("protein_g", 0) < f.get("target_protein_g", 50) * 1.2,
+                "reads": frozenset({"protein_g", "target_protein_g"}),
+                "message": "Spread 20–30g of protein across each meal and have some after training.",
+                "rationale": "Training raises protein needs for muscle repair and adaptation.",
+                "tags": ["nutrition", "protein", "training"],
+                "priority": "high",
+                "personas": ["athlete"]
+            },
+            {
+                "id": "athlete_refuel",
+                "name": "Training Refuel",
+                "condition": lambda f: (f.get("steps", 0) >= 12000) & (f.get("carbs_g", 0) < 250),
+                "reads": frozenset({"steps", "carbs_g"}),
+                "message": "Refuel with carbohydrates such as rice, oats or fruit after long sessions.",
+                "rationale": "Carbohydrates replenish glycogen used during high activity days.",
+                "tags": ["nutrition", "training"],
+                "priority": "medium",
+                "personas": ["athlete"]
+            },
+            {
+                "id": "vegan_protein_sources",
+                "name": "Plant Protein",
+                "condition": lambda f: f.get("protein_g", 0) < f.get("target_protein_g", 50),
+                "reads": frozenset({"protein_g", "target_protein_g"}),
+                "message": "Combine legumes, tofu, tempeh and whole grains to reach your protein goal.",
+                "rationale": "Mixing plant proteins covers all essential amino acids.",
+                "tags": ["nutrition", "protein", "plant-based"],
+                "priority": "medium",
+                "personas": ["vegan"]
+            },
+            {
+                "id": "shift_sleep_regularity",
+                "name": "Shift Sleep Anchor",
+                "condition": lambda f: f.get("sleep_regularity", 1) < 0.5,
+                "reads": frozenset({"sleep_regularity"}),
+                "message": "Keep a fixed 4-hour core sleep block, even when shifts rotate.",
+                "rationale": "An anchor sleep period limits circadian disruption from shift work.",
+                "tags": ["sleep", "shift-work"],
+                "priority": "high",
+                "personas": ["shift_worker"]
+            },
+            {
+                "id": "shift_late_meals",
+                "name": "Night Shift Meals",
+                "condition": lambda f: f.get("late_meal_freq", 0) > 0.5,
+                "reads": frozenset({"late_meal_freq"}),
+                "message": "Eat your main meal before the shift and keep night snacks light.",
+                "rationale": "Large meals at night are digested poorly during the biological night.",
+                "tags": ["nutrition", "shift-work"],
+                "priority": "low",
+                "personas": ["shift_worker"]
             }
         ]
 
     @staticmethod
-    def _check_macro_balance(features: Dict[str, Any]) -> bool:
-        """Check if macronutrient ratios are balanced."""
+    def _macros_unbalanced(features: Any) -> Any:
+        """Whether macronutrient ratios are outside the balanced ranges, given enough data."""
         total_calories = features.get("total_calories", 0)
-        if total_calories < 100:  # Not enough data
-            return True
-
-        # Calculate macro percentages
-        protein_cals = features.get("protein_g", 0) * 4
-        carbs_cals = features.get("carbs_g", 0) * 4
-        fat_cals = features.get("fat_g", 0) * 9
-
-        if total_calories == 0:
-            return True
+        enough_data = total_calories >= 100
+        # Days without enough data are never flagged; divide them by 1 instead
+        safe_total = total_calories * enough_data + (total_calories < 100)
+        protein_pct = (features.get("protein_g", 0) * 4 / safe_total) * 100
+        carbs_pct = (features.get("carbs_g", 0) * 4 / safe_total) * 100
+        fat_pct = (features.get("fat_g", 0) * 9 / safe_total) * 100
 
-        protein_pct = (protein_cals / total_calories) * 100
-        carbs_pct = (carbs_cals / total_calories) * 100
-        fat_pct = (fat_cals / total_calories) * 100
+        return enough_data & ((protein_pct < 25) | (protein_pct > 40) |
+                              (carbs_pct < 40) | (carbs_pct > 55) |
+                              (fat_pct < 25) | (fat_pct > 35))
 
-        # Check if within reasonable ranges
-        return (25 <= protein_pct <= 40 and
-                40 <= carbs_pct <= 55 and
-                25 <= fat_pct <= 35)
+    @staticmethod
+    def _rule_payload(rule: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the recommendation object emitted for a triggered rule."""
+        return {
+            "id": rule["id"],
+            "message": rule["message"],
+            "rationale": rule["rationale"],
+            "tags": rule["tags"],
+            "priority": rule["priority"]
+        }
 
     def generate_recommendations(
         self,
@@ -116,51 +414,335 @@ class NutritionRecommender:
             user_targets: User's nutrition targets
             top_n: Number of top recommendations to return
 
+        A ``persona`` entry selects the persona's rule bundle.
+
         Returns:
             List of recommendation objects
         """
         # Merge features with targets
         features = {**daily_features, **user_targets}
 
-        # Apply rules
+        # Apply the persona's rules; they are already in priority order
         triggered_rules = []
-        for rule in self.rules:
+        for rule in self.bundle_for(features.get("persona")).ranked_rules:
+            if self._is_triggered(rule, features):
+                triggered_rules.append(self._rule_payload(rule))
+
+        return triggered_rules[:top_n]
+
+    @staticmethod
+    def _is_triggered(rule: Dict[str, Any], features: Dict[str, Any]) -> bool:
+        try:
+            return bool(rule["condition"](features))
+        except Exception:
+            # Rules that fail due to missing data do not trigger
+            return False
+
+    def rules_for_features(
+        self, feature_names: Iterable[str], persona: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Return the persona's rules that read any of the given features, in ranked order."""
+        bundle = self.bundle_for(persona)
+        return [bundle.ranked_rules[rank] for rank in bundle.ranks_for_features(feature_names)]
+
+    def update_user_features(
+        self,
+        user_id: str,
+        daily_features: Optional[Dict[str, Any]] = None,
+        user_targets: Optional[Dict[str, Any]] = None,
+        top_n: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Incrementally update a user's features and return their recommendations.
+
+        Only the rules that read a feature whose effective value changed are
+        re-evaluated; every other rule keeps its previous result. The first
+        update for a user (or one evicted from the bounded state), and any
+        update that changes the user's persona, evaluates the full bundle.
+
+        Args:
+            user_id: User whose features changed
+            daily_features: Changed daily feature values
+            user_targets: Changed target values
+            top_n: Number of top recommendations to return
+
+        Returns:
+            Same recommendation objects as :meth:`generate_recommendations`
+            over the user's accumulated features and targets
+        """
+        with self._lock:
+            return self._update_user_state(user_id, daily_features, user_targets, top_n)
+
+    def _update_user_state(
+        self,
+        user_id: str,
+        daily_features: Optional[Dict[str, Any]],
+        user_targets: Optional[Dict[str, Any]],
+        top_n: int
+    ) -> List[Dict[str, Any]]:
+        state = self._user_states.get(user_id)
+        if state is None:
+            state = _UserRuleState(loaded_at=self._clock())
+            state.daily_features.update(daily_features or {})
+            state.user_targets.update(user_targets or {})
+            state.features = {**state.daily_features, **state.user_targets}
+            self._evaluate_bundle(state)
+            self._user_states[user_id] = state
+            while len(self._user_states) > self.max_tracked_users:
+                self._user_states.popitem(last=False)
+        else:
+            self._user_states.move_to_end(user_id)
+            changed = set()
+            for source, updates in (
+                (state.daily_features, daily_features), (state.user_targets, user_targets)
+            ):
+                for key, value in (updates or {}).items():
+                    source[key] = value
+                    # Targets take precedence over daily features with the same key
+                    merged = state.user_targets.get(key, state.daily_features.get(key))
+                    if key not in state.features or state.features[key] != merged:
+                        state.features[key] = merged
+                        changed.add(key)
+
+            if self.bundle_for(state.features.get("persona")) is not state.bundle:
+                self._evaluate_bundle(state)
+                changed = set()
+
+            for rank in state.bundle.ranks_for_features(changed):
+                position = bisect_left(state.triggered, rank)
+                was_triggered = (
+                    position < len(state.triggered) and state.triggered[position] == rank
+                )
+                if self._is_triggered(state.bundle.ranked_rules[rank], state.features):
+                    if not was_triggered:
+                        insort(state.triggered, rank)
+                elif was_triggered:
+                    del state.triggered[position]
+
+        ranked_rules = state.bundle.ranked_rules
+        return [self._rule_payload(ranked_rules[rank]) for rank in state.triggered[:top_n]]
+
+    def _evaluate_bundle(self, state: _UserRuleState) -> None:
+        """Select the bundle for the state's persona and evaluate all of its rules."""
+        state.bundle = self.bundle_for(state.features.get("persona"))
+        state.triggered = [
+            rank for rank, rule in enumerate(state.bundle.ranked_rules)
+            if self._is_triggered(rule, state.features)
+        ]
+
+    def forget_user(self, user_id: str) -> None:
+        """Drop the incremental rule state kept for a user."""
+        with self._lock:
+            self._user_states.pop(user_id, None)
+
+    def track_user(
+        self,
+        user_id: str,
+        day: date,
+        daily_features: Dict[str, Any],
+        user_targets: Dict[str, Any],
+        top_n: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Evaluate a user's full features for a day and keep them for :meth:`observe`.
+
+        The state is dropped after ``max_age_seconds`` so events stored by
+        other processes and changed targets are picked up.
+        """
+        with self._lock:
+            self._user_states.pop(user_id, None)
+            recs = self.update_user_features(user_id, daily_features, user_targets, top_n)
+            self._user_states[user_id].day = day
+            return recs
+
+    def tracked_recommendations(self, user_id: str, day: date, top_n: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """Recommendations from the user's tracked state for ``day``, or None if there is none."""
+        with self._lock:
+            state = self._user_states.get(user_id)
+            if state is None or state.day != day or self._clock() - state.loaded_at >= self.max_age_seconds:
+                return None
+            return self.update_user_features(user_id, top_n=top_n)
+
+    def observe(
+        self,
+        user_id: str,
+        day: date,
+        feature_deltas: Dict[str, float],
+        window_features: Optional[Dict[str, float]],
+    ) -> None:
+        """
+        Apply a committed event to a user tracked for its day.
+
+        ``feature_deltas`` are added to the day's totals, and
+        ``window_features`` replace the rolling features. Only the rules that
+        read a changed feature are evaluated again. Without the rolling
+        features the state is dropped instead of being left stale.
+        """
+        with self._lock:
+            state = self._user_states.get(user_id)
+            if state is None or state.day != day:
+                return
+            if window_features is None:
+                del self._user_states[user_id]
+                return
+            totals = {
+                name: (state.daily_features.get(name) or 0) + delta for name, delta in feature_deltas.items()
+            }
+            self.update_user_features(user_id, {**totals, **window_features})
+
+    def generate_recommendations_batch(
+        self,
+        daily_features: Any,
+        user_targets: Any = None,
+        top_n: int = 5,
+        n_rows: Optional[int] = None,
+        personas: Optional[Iterable[Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Generate recommendations for many users at once.
+
+        Every rule is evaluated as a boolean mask over all rows instead of once
+        per user. Row ``i`` produces exactly what :meth:`generate_recommendations`
+        returns for the dicts formed by row ``i`` of each table, with null cells
+        treated as absent keys. Rows are grouped by persona and each group is
+        evaluated against its own rule bundle only. Rows holding a non-numeric
+        value in a column that rules read are evaluated one by one with the
+        scalar path.
+
+        Args:
+            daily_features: Columnar features, one row per user (dict of
+                arrays, pandas DataFrame or polars DataFrame)
+            user_targets: Optional columnar targets aligned with daily_features
+            top_n: Number of top recommendations to return per row
+            n_rows: Row count; only needed when both tables have no columns
+            personas: Optional persona per row; defaults to a ``persona``
+                column of user_targets or daily_features
+
+        Returns:
+            List of recommendation lists, one per input row. Rows with the same
+            triggered rules share recommendation dicts, so treat them as read-only.
+        """
+        feature_columns = _to_columns(daily_features)
+        target_columns = _to_columns(user_targets)
+        if n_rows is None:
+            n_rows = max(
+                (len(values) for values in (*feature_columns.values(), *target_columns.values())),
+                default=0,
+            )
+
+        columns: Dict[str, np.ndarray] = {}
+        # Rows with a cell the masks cannot represent, such as a string
+        odd_rows = np.zeros(n_rows, dtype=bool)
+        for table in (feature_columns, target_columns):
+            for name, values in table.items():
+                converted = _as_float_column(values)
+                if converted is None or name == "persona":
+                    continue
+                column, odd = converted
+                if odd is not None and name in self._read_features:
+                    odd_rows |= odd
+                # Same precedence as {**daily_features, **user_targets}
+                previous = columns.get(name)
+                columns[name] = column if previous is None else np.where(np.isnan(column), previous, column)
+
+        if top_n <= 0:
+            return [[] for _ in range(n_rows)]
+
+        if personas is None:
+            personas = target_columns.get("persona", feature_columns.get("persona"))
+        if personas is None:
+            results = self._evaluate_bundle_batch(self._bundles[None], columns, n_rows, top_n)
+        else:
+            # Evaluate each persona's rows against its own bundle only
+            bundle_keys = list(self._bundles)
+            codes = np.fromiter(
+                (bundle_keys.index(normalize_persona(persona)) for persona in personas),
+                dtype=np.intp, count=n_rows,
+            )
+            results = [[] for _ in range(n_rows)]
+            for code in np.unique(codes).tolist():
+                rows = np.flatnonzero(codes == code)
+                group = self._evaluate_bundle_batch(
+                    self._bundles[bundle_keys[code]],
+                    {name: column[rows] for name, column in columns.items()},
+                    len(rows),
+                    top_n,
+                )
+                for row, recs in zip(rows.tolist(), group):
+                    results[row] = recs
+
+        # Rules may fail on such cells and then do not trigger, as in the scalar path
+        if odd_rows.any():
+            tables = [
+                {name: np.asarray(values, dtype=object) for name, values in table.items()}
+                for table in (feature_columns, target_columns)
+            ]
+            persona_column = None if personas is None else np.asarray(personas, dtype=object)
+            for row in np.flatnonzero(odd_rows).tolist():
+                results[row] = self._scalar_row(*tables, persona_column, row, top_n)
+        return results
+
+    def _scalar_row(
+        self,
+        feature_columns: Dict[str, np.ndarray],
+        target_columns: Dict[str, np.ndarray],
+        personas: Optional[np.ndarray],
+        row: int,
+        top_n: int
+    ) -> List[Dict[str, Any]]:
+        """:meth:`generate_recommendations` for one row of the batch tables, nulls left out."""
+        daily, targets = (
+            {name: values[row] for name, values in table.items() if not _is_null(values[row])}
+            for table in (feature_columns, target_columns)
+        )
+        if personas is not None:
+            targets["persona"] = personas[row]
+        return self.generate_recommendations(daily, targets, top_n)
+
+    def _evaluate_bundle_batch(
+        self, bundle: _RuleBundle, columns: Dict[str, np.ndarray], n_rows: int, top_n: int
+    ) -> List[List[Dict[str, Any]]]:
+        """Evaluate one bundle's rules as masks over rows that share a persona."""
+        view = _ColumnView(columns, n_rows)
+        masks = np.zeros((n_rows, len(bundle.ranked_rules)), dtype=bool)
+        for index, rule in enumerate(bundle.ranked_rules):
             try:
-                if rule["condition"](features):
-                    triggered_rules.append({
-                        "id": rule["id"],
-                        "message": rule["message"],
-                        "rationale": rule["rationale"],
-                        "tags": rule["tags"],
-                        "priority": rule["priority"]
-                    })
+                masks[:, index] = rule["condition"](view)
             except Exception:
                 # Skip rules that fail due to missing data
                 pass
 
-        # Sort by priority and return top N
-        priority_order = {"high": 0, "medium": 1, "low": 2}
-        triggered_rules.sort(
-            key=lambda x: (priority_order.get(x["priority"], 3), x["id"])
-        )
-
-        return triggered_rules[:top_n]
+        # Rows that trigger the same set of rules get the same recommendations, so
+        # build each distinct result once and share the recommendation dicts
+        patterns, inverse = _unique_rows(masks)
+        payloads = [self._rule_payload(rule) for rule in bundle.ranked_rules]
+        templates = [
+            [payload for payload, triggered in zip(payloads, pattern) if triggered][:top_n]
+            for pattern in patterns.tolist()
+        ]
+        return [list(templates[index]) for index in inverse.tolist()]
 
-    def generate_insights(self, daily_features: Dict[str, Any]) -> Dict[str, Any]:
+    def generate_insights(
+        self, daily_features: Dict[str, Any], trends: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
         Generate detailed insights about user health patterns.
 
         Args:
             daily_features: User's daily metrics
+            trends: The user's trends from ``services.trends``; without them
+                every trend is reported as insufficient-data
 
         Returns:
             Dictionary with insights
         """
+        trends = trends or {}
         insights = {
             "timestamp": datetime.utcnow().isoformat(),
             "summary": self._generate_summary(daily_features),
             "alerts": self._generate_alerts(daily_features),
-            "trends": self._estimate_trends(daily_features)
+            "trends": trends.get("trends") or {key: "insufficient-data" for key in TREND_FEATURES.values()},
+            "trend_slopes": trends.get("trend_slopes", {}),
         }
         return insights
 
@@ -190,19 +772,16 @@ class NutritionRecommender:
             alerts.append("⚠️ Severe sleep deficiency")
         return alerts
 
-    @staticmethod
-    def _estimate_trends(features: Dict[str, Any]) -> Dict[str, str]:
-        """Estimate trends based on available data."""
-        return {
-            "fiber_trend": "increasing" if features.get("fiber_g", 0) > 15 else "needs-improvement",
-            "activity_trend": "good" if features.get("steps", 0) > 8000 else "needs-improvement",
-            "sleep_trend": "good" if features.get("sleep_hours", 0) >= 7 else "needs-improvement"
-        }
-
 
 # Instantiate global recommender
 recommender = NutritionRecommender()
 
+# Results of generate_recommendations, keyed by input hash and rules version
+recommendation_cache = LRUTTLCache(
+    max_entries=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("RECOMMENDATION_CACHE_TTL_SECONDS", "300")),
+)
+
 
 def generate_recommendations(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -220,9 +799,25 @@ def generate_recommendations(payload: Dict[str, Any]) -> Dict[str, Any]:
             "fiber_g": 25,
             "target_protein_g": 50,
             ...
-        }
+        },
+        "user_id": "optional, enables invalidation when the user's events change"
     }
+
+    Results are served from ``recommendation_cache`` when the same payload was
+    seen recently under the same rules version. A result depends only on the
+    payload, so entries never go stale. ``user_id`` only tags the entry so
+    that the user's new events free it early; entries without it expire after
+    the cache TTL. Each call returns its own copy, which the caller may modify.
+
+    Insights are not included: their trends need the user's stored history,
+    which a payload does not carry. They are served by
+    ``GET /recommendations/{user_id}/insights``.
     """
+    key = canonical_hash(payload, recommender.rules_version)
+    cached = recommendation_cache.get(key)
+    if cached is not None:
+        return copy.deepcopy(cached)
+
     daily_features = payload.get("daily_features", {})
     user_targets = payload.get("user_targets", {})
 
@@ -233,13 +828,11 @@ def generate_recommendations(payload: Dict[str, Any]) -> Dict[str, Any]:
         top_n=5
     )
 
-    # Generate insights
-    insights = recommender.generate_insights(daily_features)
-
-    return {
+    result = {
         "status": "ok",
         "timestamp": datetime.utcnow().isoformat(),
         "recommendations": recs,
-        "insights": insights,
         "input": payload
     }
+    recommendation_cache.set(key, copy.deepcopy(result), user_id=payload.get("user_id"))
+    return result
@@ -0,0 +1,310 @@
+"""
+Compiled rule engine for the YAML recommendation rules.
+
+Rules in the ``rules/`` directory are parsed once into :class:`CompiledRule`
+objects. Conditions are written in a small, restricted expression grammar
+(arithmetic, comparisons, ``and``/``or``/``not`` and references to
+``daily_features.*`` / ``user_targets.*``) and compiled into plain Python
+closures, so evaluating a rule never goes through ``eval``.
+
+:class:`RuleCache` keeps the compiled set in memory and only re-reads a rule
+file when it is added, removed or its mtime changes.
+"""
+
+import ast
+import logging
+import operator
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# Expression namespaces and the argument they are resolved against
+NAMESPACES = {"daily_features": 0, "user_targets": 1}
+
+Predicate = Callable[[Mapping[str, Any], Mapping[str, Any]], bool]
+_Evaluator = Callable[[Mapping[str, Any], Mapping[str, Any]], Any]
+
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+_COMPARE_OPS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+
+_UNARY_OPS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.Not: operator.not_,
+}
+
+
+class RuleSyntaxError(ValueError):
+    """Raised when a rule condition is outside the supported grammar."""
+
+
+class _MissingValue(LookupError):
+    """Raised during evaluation when a referenced feature is not available."""
+
+
+def _compile_node(node: ast.AST, reads: set) -> _Evaluator:
+    """Recursively compile a whitelisted AST node into an evaluator closure."""
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, (bool, int, float, str)):
+            value = node.value
+            return lambda metrics, targets: value
+        raise RuleSyntaxError(f"Unsupported constant: {node.value!r}")
+
+    if isinstance(node, ast.Attribute):
+        if not (isinstance(node.value, ast.Name) and node.value.id in NAMESPACES):
+            raise RuleSyntaxError(
+                "Only daily_features.<name> and user_targets.<name> references are allowed"
+            )
+        namespace = node.value.id
+        key = node.attr
+        reads.add(f"{namespace}.{key}")
+        index = NAMESPACES[namespace]
+
+        def lookup(metrics: Mapping[str, Any], targets: Mapping[str, Any]) -> Any:
+            source = metrics if index == 0 else targets
+            try:
+                return source[key]
+            except (KeyError, TypeError):
+                raise _MissingValue(f"{namespace}.{key}")
+
+        return lookup
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        op = _BINARY_OPS[type(node.op)]
+        left = _compile_node(node.left, reads)
+        right = _compile_node(node.right, reads)
+        return lambda metrics, targets: op(left(metrics, targets), right(metrics, targets))
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        op = _UNARY_OPS[type(node.op)]
+        operand = _compile_node(node.operand, reads)
+        return lambda metrics, targets: op(operand(metrics, targets))
+
+    if isinstance(node, ast.BoolOp):
+        values = [_compile_node(value, reads) for value in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda metrics, targets: all(v(metrics, targets) for v in values)
+        return lambda metrics, targets: any(v(metrics, targets) for v in values)
+
+    if isinstance(node, ast.Compare):
+        if not all(type(op) in _COMPARE_OPS for op in node.ops):
+            raise RuleSyntaxError("Unsupported comparison operator")
+        operands = [_compile_node(node.left, reads)] + [
+            _compile_node(comparator, reads) for comparator in node.comparators
+        ]
+        ops = [_COMPARE_OPS[type(op)] for op in node.ops]
+
+        def compare(metrics: Mapping[str, Any], targets: Mapping[str, Any]) -> bool:
+            left = operands[0](metrics, targets)
+            for op, operand in zip(ops, operands[1:]):
+                right = operand(metrics, targets)
+                if not op(left, right):
+                    return False
+                left = right
+            return True
+
+        return compare
+
+    raise RuleSyntaxError(f"Unsupported expression element: {type(node).__name__}")
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str) -> Tuple[Predicate, FrozenSet[str]]:
+    """
+    Compile a condition expression into a predicate.
+
+    Args:
+        source: Expression such as ``"daily_features.fiber_g < user_targets.fiber_g * 0.8"``
+
+    Returns:
+        Tuple of (predicate, referenced feature names). The predicate returns
+        False when a referenced value is missing or cannot be compared.
+
+    Raises:
+        RuleSyntaxError: If the expression is not valid in the rule grammar.
+    """
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as exc:
+        raise RuleSyntaxError(f"Invalid rule expression {source!r}: {exc.msg}") from exc
+
+    reads: set = set()
+    evaluator = _compile_node(tree.body, reads)
+
+    def predicate(metrics: Mapping[str, Any], targets: Mapping[str, Any]) -> bool:
+        try:
+            return bool(evaluator(metrics, targets))
+        except (_MissingValue, TypeError, ZeroDivisionError):
+            return False
+
+    return predicate, frozenset(reads)
+
+
+def _when_to_expression(when: Any) -> str:
+    """Translate a rule's ``when`` block into a single expression string."""
+    if isinstance(when, str):
+        return when
+    if not isinstance(when, dict) or not when:
+        raise RuleSyntaxError("Rule 'when' must be an expression or a non-empty mapping")
+
+    clauses = []
+    for subject, condition in when.items():
+        if isinstance(condition, str):
+            clauses.append(f"({subject} {condition})")
+        else:
+            clauses.append(f"({subject} == {condition!r})")
+    return " and ".join(clauses)
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """A YAML rule whose condition has been compiled into a predicate."""
+
+    id: str
+    expression: str
+    predicate: Predicate = field(repr=False, compare=False)
+    reads: FrozenSet[str] = frozenset()
+    message: str = ""
+    rationale: str = ""
+    guardrails: Tuple[str, ...] = ()
+    raw: Dict[str, Any] = field(default_factory=dict, repr=False, compare=False)
+
+    def matches(self, metrics: Mapping[str, Any], targets: Mapping[str, Any]) -> bool:
+        """Return True if the rule applies to the given metrics and targets."""
+        return self.predicate(metrics, targets)
+
+    def to_recommendation(self) -> Dict[str, Any]:
+        """Build the recommendation payload emitted when the rule matches."""
+        return {
+            "id": self.id,
+            "message": self.message,
+            "rationale": self.rationale,
+            "guardrails": list(self.guardrails),
+        }
+
+
+def compile_rule(rule: Dict[str, Any]) -> CompiledRule:
+    """
+    Compile a rule loaded from YAML.
+
+    Raises:
+        RuleSyntaxError: If the rule is malformed or its condition is invalid.
+    """
+    if not isinstance(rule, dict) or "id" not in rule:
+        raise RuleSyntaxError("Rule must be a mapping with an 'id'")
+
+    expression = _when_to_expression(rule.get("when"))
+    predicate, reads = compile_expression(expression)
+    then = rule.get("then") or {}
+    return CompiledRule(
+        id=str(rule["id"]),
+        expression=expression,
+        predicate=predicate,
+        reads=reads,
+        message=then.get("message", ""),
+        rationale=then.get("rationale", ""),
+        guardrails=tuple(then.get("guardrails", [])),
+        raw=rule,
+    )
+
+
+def _load_rule_file(path: Path) -> List[CompiledRule]:
+    """Parse and compile every rule in a YAML file, skipping invalid ones."""
+    with open(path, "r", encoding="utf-8") as f:
+        documents = [doc for doc in yaml.safe_load_all(f) if doc]
+
+    compiled = []
+    for document in documents:
+        for rule in document if isinstance(document, list) else [document]:
+            try:
+                compiled.append(compile_rule(rule))
+            except RuleSyntaxError as exc:
+                logger.warning("Skipping invalid rule in %s: %s", path.name, exc)
+    return compiled
+
+
+class RuleCache:
+    """
+    In-memory cache of compiled rules for a rules directory.
+
+    The directory is stat'ed at most once per ``check_interval`` seconds and a
+    file is only re-parsed when its mtime or size changes.
+    """
+
+    def __init__(self, rules_dir: Path, check_interval: float = 1.0):
+        self.rules_dir = Path(rules_dir)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._files: Dict[Path, Tuple[Tuple[int, int], List[CompiledRule]]] = {}
+        self._rules: Tuple[CompiledRule, ...] = ()
+        self._version = 0
+        self._last_check: Optional[float] = None
+
+    @property
+    def version(self) -> int:
+        """Monotonic counter incremented every time the compiled set changes."""
+        return self._version
+
+    def rules(self) -> Tuple[CompiledRule, ...]:
+        """Return the compiled rules, reloading changed files if needed."""
+        now = time.monotonic()
+        if self._last_check is not None and now - self._last_check < self.check_interval:
+            return self._rules
+
+        with self._lock:
+            if self._last_check is None or now - self._last_check >= self.check_interval:
+                self._refresh()
+                self._last_check = now
+        return self._rules
+
+    def invalidate(self) -> None:
+        """Force the next call to :meth:`rules` to re-check the rule files."""
+        self._last_check = None
+
+    def _refresh(self) -> None:
+        current: Dict[Path, Tuple[int, int]] = {}
+        for path in sorted(self.rules_dir.glob("*.yaml")):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            current[path] = (stat.st_mtime_ns, stat.st_size)
+
+        changed = current.keys() != self._files.keys()
+        files = {}
+        for path, signature in current.items():
+            cached = self._files.get(path)
+            if cached is not None and cached[0] == signature:
+                files[path] = cached
+                continue
+            changed = True
+            try:
+                files[path] = (signature, _load_rule_file(path))
+            except (OSError, yaml.YAMLError) as exc:
+                logger.warning("Failed to load rule file %s: %s", path.name, exc)
+                files[path] = (signature, [])
+
+        if changed:
+            self._files = files
+            self._rules = tuple(rule for _, rules in files.values() for rule in rules)
+            self._version += 1
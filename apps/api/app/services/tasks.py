@@ -1,6 +1,8 @@
 # apps/api/app/services/tasks.py
 
+import logging
 import os
+from typing import Any, List
 from celery import Celery
 from .recommendations import aggregate_metrics, generate_rule_based_recommendations
 
@@ -17,6 +19,8 @@ celery_app.conf.update(
     enable_utc=True,
 )
 
+logger = logging.getLogger(__name__)
+
 @celery_app.task(name="process_event")
 def process_event(event_type: str, event_data: dict) -> None:
     # TODO: persist to DB or feature store
@@ -30,3 +34,11 @@ def process_event(event_type: str, event_data: dict) -> None:
     # metrics = aggregate_metrics(events)
     # recs = generate_rule_based_recommendations(metrics)
     # save_recommendations(user_id=event_data["user_id"], date=date.today(), recs=recs)
+
+
+@celery_app.task(name="process_events_batch")
+def process_events_batch(events: List[List[Any]]) -> int:
+    """Process ``[event_type, event_data]`` pairs published together by the ingest dispatcher."""
+    for event_type, event_data in events:
+        process_event(event_type, event_data)
+    return len(events)
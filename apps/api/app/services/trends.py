@@ -0,0 +1,125 @@
+"""
+services/trends.py
+
+Trend estimation over users' daily history.
+
+A trend is the least-squares slope of a feature over the last ``TREND_DAYS``
+days, fitted for many users at once as one matrix operation per feature. Days
+without data are masked out of the fit. History comes from the in-memory
+rolling windows (the same ones the recommendation path already hydrates), and
+results are cached per (user, day) until the user's next event.
+"""
+
+import os
+from datetime import date
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .cache import LRUTTLCache
+from .windows import WINDOW_SIZES, feature_windows
+
+# Number of days the slope is fitted over (at most the longest window)
+TREND_DAYS = min(int(os.getenv("TREND_DAYS", "14")), max(WINDOW_SIZES))
+
+# Fewer days with data than this yields "insufficient-data"
+MIN_TREND_DAYS = 3
+
+# Daily features with a trend, and the insight key each is reported under
+TREND_FEATURES = {
+    "fiber_g": "fiber_trend",
+    "steps": "activity_trend",
+    "sleep_hours": "sleep_trend",
+}
+
+# Slopes smaller than this fraction of the feature's mean per day are "stable"
+STABLE_SLOPE_RATIO = 0.01
+
+
+def least_squares_slopes(values: np.ndarray) -> np.ndarray:
+    """
+    Fit a per-row least-squares slope of ``values`` against the day index.
+
+    Args:
+        values: (users, days) array, NaN marking days without data
+
+    Returns:
+        Slope per row in units per day; NaN for rows with fewer than
+        ``MIN_TREND_DAYS`` days of data.
+    """
+    present = ~np.isnan(values)
+    y = np.where(present, values, 0.0)
+    x = np.arange(values.shape[1], dtype=np.float64)
+
+    n = present.sum(axis=1)
+    sum_x = present @ x
+    sum_xx = present @ (x * x)
+    sum_y = y.sum(axis=1)
+    sum_xy = y @ x
+
+    denominator = n * sum_xx - sum_x * sum_x
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes = (n * sum_xy - sum_x * sum_y) / denominator
+    slopes[(n < MIN_TREND_DAYS) | (denominator == 0)] = np.nan
+    return slopes
+
+
+def _label(slope: float, mean: float) -> str:
+    if np.isnan(slope):
+        return "insufficient-data"
+    scale = abs(mean) if mean else 1.0
+    if slope > STABLE_SLOPE_RATIO * scale:
+        return "increasing"
+    if slope < -STABLE_SLOPE_RATIO * scale:
+        return "decreasing"
+    return "stable"
+
+
+def compute_trends(histories: Sequence[Mapping[str, Sequence[Optional[float]]]]) -> List[Dict[str, Any]]:
+    """
+    Estimate trends for many users at once.
+
+    Args:
+        histories: Per user, a mapping of feature name to its daily values
+            (oldest first, None for days without data)
+
+    Returns:
+        Per user, ``{"trends": {insight_key: label}, "trend_slopes": {feature: slope}}``
+    """
+    results: List[Dict[str, Any]] = [{"trends": {}, "trend_slopes": {}} for _ in histories]
+    if not histories:
+        return results
+
+    for feature, key in TREND_FEATURES.items():
+        values = np.array([history.get(feature, ()) for history in histories], dtype=np.float64)
+        if values.ndim != 2:
+            raise ValueError(f"Histories for '{feature}' must all have the same length")
+        slopes = least_squares_slopes(values)
+        counts = np.maximum((~np.isnan(values)).sum(axis=1), 1)
+        means = np.nansum(values, axis=1) / counts
+
+        for result, slope, mean in zip(results, slopes.tolist(), means.tolist()):
+            result["trends"][key] = _label(slope, mean)
+            result["trend_slopes"][feature] = None if np.isnan(slope) else slope
+    return results
+
+
+# Trends per (user_id, day), dropped when the user ingests a new event
+trend_cache = LRUTTLCache(
+    max_entries=int(os.getenv("TREND_CACHE_SIZE", "50000")),
+    ttl_seconds=float(os.getenv("TREND_CACHE_TTL_SECONDS", "3600")),
+)
+
+
+def get_trends(db: Session, user_id: str, day: date) -> Dict[str, Any]:
+    """Cached trends for a user as of a day, read from the rolling windows."""
+    key = (user_id, day.toordinal())
+    cached = trend_cache.get(key)
+    if cached is not None:
+        return cached
+
+    history = feature_windows.series(db, user_id, day, tuple(TREND_FEATURES), TREND_DAYS)
+    trends = compute_trends([history])[0]
+    trend_cache.set(key, trends, user_id=user_id)
+    return trends
@@ -0,0 +1,179 @@
+"""
+services/user_deletion.py
+
+Background deletion of all data of a user.
+
+``DELETE /users/{user_id}`` records a job in ``user_deletion_jobs`` and
+returns at once; the job then removes the user's events, daily features,
+recommendations and targets, and finally the user row. Each table is
+emptied in chunks of ``USER_DELETE_CHUNK_SIZE`` rows, each in its own short
+transaction, with a ``USER_DELETE_PAUSE_MS`` pause in between. The write lock
+is therefore never held for long: on SQLite, where a single writer locks the
+whole database, ingestion for other users gets a turn between every two
+chunks, however many events the deleted user has.
+
+Rows deleted so far are recorded per table on the job, so its progress can
+be polled. Deleting is idempotent: a job that failed is finished by deleting
+the user again, and so is one interrupted by a restart once it has gone
+``USER_DELETE_STALE_SECONDS`` without progress.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from ..models.database import DailyFeature, Event, Recommendation, User, UserDeletionJob, UserTarget
+from .idempotency import recent_event_keys
+from .recommender import recommendation_cache, recommender
+from .trends import trend_cache
+from .users import known_users
+from .windows import feature_windows
+
+logger = logging.getLogger(__name__)
+
+USER_DELETE_CHUNK_SIZE = int(os.getenv("USER_DELETE_CHUNK_SIZE", "1000"))
+USER_DELETE_PAUSE_MS = float(os.getenv("USER_DELETE_PAUSE_MS", "10"))
+# A running job without progress for this long is taken over by the next request
+USER_DELETE_STALE_SECONDS = float(os.getenv("USER_DELETE_STALE_SECONDS", "300"))
+
+ACTIVE_STATUSES = ("pending", "running")
+
+# Tables holding user data, in deletion order, with the column identifying a
+# row among the user's rows. Events go first: they are by far the largest
+# table, and derived rows deleted before them could be rebuilt from them.
+USER_TABLES = [
+    ("events", Event, Event.id),
+    ("daily_features", DailyFeature, DailyFeature.date),
+    ("recommendations", Recommendation, Recommendation.id),
+    ("user_targets", UserTarget, UserTarget.id),
+]
+
+
+def job_to_dict(job: UserDeletionJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "user_id": job.user_id,
+        "status": job.status,
+        "deleted": job.deleted or {},
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+async def create_deletion_job(db: AsyncSession, user_id: str) -> UserDeletionJob:
+    """Record a pending deletion job, or return the user's job that is still active."""
+    active = await db.scalar(
+        select(UserDeletionJob)
+        .where(UserDeletionJob.user_id == user_id, UserDeletionJob.status.in_(ACTIVE_STATUSES))
+        .order_by(UserDeletionJob.created_at.desc())
+        .limit(1)
+    )
+    if active is not None:
+        return active
+    job = UserDeletionJob(id=str(uuid.uuid4()), user_id=user_id, status="pending", deleted={})
+    db.add(job)
+    await db.commit()
+    return job
+
+
+async def run_deletion_job(
+    sessions: async_sessionmaker,
+    job_id: str,
+    chunk_size: int = USER_DELETE_CHUNK_SIZE,
+    pause_ms: float = USER_DELETE_PAUSE_MS,
+) -> None:
+    """
+    Delete the job's user data chunk by chunk, recording progress on the job.
+
+    Does nothing unless the job is pending, or running without progress for
+    ``USER_DELETE_STALE_SECONDS`` (its process died): the job is claimed with
+    a conditional UPDATE, so concurrent calls run it once.
+    """
+    async with sessions() as db:
+        stale_before = datetime.utcnow() - timedelta(seconds=USER_DELETE_STALE_SECONDS)
+        claimed = await db.execute(
+            update(UserDeletionJob)
+            .where(
+                UserDeletionJob.id == job_id,
+                or_(
+                    UserDeletionJob.status == "pending",
+                    and_(UserDeletionJob.status == "running", UserDeletionJob.updated_at < stale_before),
+                ),
+            )
+            .values(status="running", updated_at=datetime.utcnow())
+        )
+        await db.commit()
+        if claimed.rowcount != 1:
+            return
+        job = await db.get(UserDeletionJob, job_id)
+        user_id = job.user_id
+        deleted = dict(job.deleted or {})
+
+    try:
+        for table, model, key_column in USER_TABLES:
+            deleted.setdefault(table, 0)
+            while True:
+                async with sessions() as db:
+                    count = await _delete_chunk(db, model, key_column, user_id, chunk_size)
+                    deleted[table] += count
+                    await _update_job(db, job_id, deleted=dict(deleted))
+                    await db.commit()
+                if count < chunk_size:
+                    break
+                await asyncio.sleep(pause_ms / 1000)
+
+        async with sessions() as db:
+            await db.execute(delete(User).where(User.id == user_id))
+            await _update_job(db, job_id, status="completed", finished_at=datetime.utcnow())
+            await db.commit()
+    except Exception as exc:
+        logger.exception("Deleting data of user %s failed", user_id)
+        async with sessions() as db:
+            await _update_job(
+                db, job_id, status="failed", error=f"{exc.__class__.__name__}: {exc}", finished_at=datetime.utcnow()
+            )
+            await db.commit()
+    finally:
+        forget_user(user_id)
+
+
+async def _delete_chunk(db: AsyncSession, model, key_column, user_id: str, chunk_size: int) -> int:
+    """Delete up to ``chunk_size`` of the user's rows of one table; returns how many."""
+    columns: List[Any] = [key_column]
+    if model is Event:
+        columns.append(Event.idempotency_key)
+    rows = (await db.execute(select(*columns).where(model.user_id == user_id).limit(chunk_size))).all()
+    if not rows:
+        return 0
+    await db.execute(delete(model).where(model.user_id == user_id, key_column.in_([row[0] for row in rows])))
+    if model is Event:
+        # A re-sent copy of a deleted event is new data again, not a duplicate
+        for row in rows:
+            recent_event_keys.discard(row[1])
+    return len(rows)
+
+
+async def _update_job(db: AsyncSession, job_id: str, **values: Any) -> None:
+    job = await db.get(UserDeletionJob, job_id)
+    for name, value in values.items():
+        setattr(job, name, value)
+
+
+def forget_user(user_id: str) -> None:
+    """Drop what this process keeps in memory about a user."""
+    known_users.discard(user_id)
+    feature_windows.forget(user_id)
+    recommender.forget_user(user_id)
+    recommendation_cache.invalidate_user(user_id)
+    trend_cache.invalidate_user(user_id)
+
+
+async def get_deletion_job(db: AsyncSession, job_id: str) -> Optional[UserDeletionJob]:
+    return await db.get(UserDeletionJob, job_id)
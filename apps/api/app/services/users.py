@@ -0,0 +1,60 @@
+"""
+services/users.py
+
+Lazy creation of user rows on event ingest.
+
+Events reference ``users.id``, so ingest has to make sure the user exists.
+Ids already seen by this process are kept in a bounded LRU set. Returning
+users cost no statement at all. Unknown ids are created with one
+``INSERT ... ON CONFLICT DO NOTHING``, which is safe when several processes
+see a new user at the same time.
+"""
+
+import os
+from typing import Iterable, List
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..models.database import User
+from .cache import LRUSet
+
+
+class KnownUserCache(LRUSet):
+    """
+    Bounded, thread-safe LRU set of user ids known to exist in the database.
+
+    Add ids only after the transaction creating them committed; discard an id
+    when the user is deleted.
+    """
+
+
+known_users = KnownUserCache(max_entries=int(os.getenv("KNOWN_USER_CACHE_SIZE", "100000")))
+
+
+def ensure_users(db: Session, user_ids: Iterable[str]) -> List[str]:
+    """
+    Create any of ``user_ids`` not known to exist, inside the caller's transaction.
+
+    Issues no statement when every id is cached. Returns the ids that were not
+    cached; pass them to ``known_users.add`` once the caller has committed, so
+    a rolled-back transaction never leaves a phantom id in the cache.
+    """
+    unknown = sorted({user_id for user_id in user_ids if user_id not in known_users})
+    if not unknown:
+        return []
+
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name in ("sqlite", "postgresql"):
+        if dialect_name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(User).on_conflict_do_nothing(index_elements=["id"])
+        db.execute(stmt, [{"id": user_id} for user_id in unknown])
+    else:
+        existing = {user_id for (user_id,) in db.query(User.id).filter(User.id.in_(unknown))}
+        missing = [user_id for user_id in unknown if user_id not in existing]
+        if missing:
+            db.execute(insert(User), [{"id": user_id} for user_id in missing])
+    return unknown
@@ -0,0 +1,367 @@
+"""
+services/windows.py
+
+Rolling 7- and 28-day feature windows maintained with O(1) updates.
+
+Each user keeps one ring buffer per (feature, window size), indexed by day.
+The buffers hold running sums and sums of squares, so adding an event,
+rolling over to a new day or expiring the oldest day costs constant time and
+reading averages/regularity never touches raw events. Buffers are hydrated
+from the ``daily_features`` table the first time a user is read.
+
+A feature counts only on days that have data for it: a day with meals but no
+sleep event leaves the sleep windows (averages, std, regularity) untouched,
+and NULL daily columns are read as absent rather than zero.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+from sqlalchemy.orm import Session
+
+from ..models.database import DailyFeature
+
+WINDOW_SIZES = (7, 28)
+
+# Daily columns tracked in rolling windows
+WINDOW_FEATURES = ("calories", "protein_g", "fiber_g", "steps", "sleep_hours")
+
+T = TypeVar("T")
+
+# Window of 0/1 flags marking days with at least one late meal
+LATE_MEAL_DAYS = "late_meal_days"
+
+
+class RollingWindow:
+    """
+    Ring buffer over the last ``size`` days with running sum and sum of squares.
+
+    Days without any data do not count towards the mean. Moving forward by
+    ``g`` days clears ``min(g, size)`` slots, so every operation is bounded by
+    the (constant) window size.
+    """
+
+    __slots__ = ("size", "_values", "_present", "_sum", "_sum_sq", "_count", "_last_day")
+
+    def __init__(self, size: int):
+        self.size = size
+        self._values = [0.0] * size
+        self._present = [False] * size
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._count = 0
+        self._last_day: Optional[int] = None
+
+    @property
+    def count(self) -> int:
+        """Number of days in the window that have data."""
+        return self._count
+
+    def _advance(self, day: int) -> None:
+        if self._last_day is None:
+            self._last_day = day
+            return
+        if day <= self._last_day:
+            return
+        if day - self._last_day >= self.size:
+            self._values = [0.0] * self.size
+            self._present = [False] * self.size
+            self._sum = self._sum_sq = 0.0
+            self._count = 0
+        else:
+            for expired in range(self._last_day + 1, day + 1):
+                self._clear_slot(expired % self.size)
+        self._last_day = day
+
+    def _clear_slot(self, slot: int) -> None:
+        if self._present[slot]:
+            value = self._values[slot]
+            self._sum -= value
+            self._sum_sq -= value * value
+            self._count -= 1
+            self._values[slot] = 0.0
+            self._present[slot] = False
+
+    def add(self, day: int, delta: float) -> None:
+        """Add ``delta`` to the value of ``day`` (a date ordinal)."""
+        self._advance(day)
+        if day <= self._last_day - self.size:
+            return  # Older than the window
+        slot = day % self.size
+        old = self._values[slot]
+        new = old + delta
+        if not self._present[slot]:
+            self._present[slot] = True
+            self._count += 1
+        self._values[slot] = new
+        self._sum += new - old
+        self._sum_sq += new * new - old * old
+
+    def get(self, day: int) -> float:
+        """Value of ``day``, or 0.0 if it has no data or is outside the window."""
+        if self._last_day is None or not self._last_day - self.size < day <= self._last_day:
+            return 0.0
+        return self._values[day % self.size]
+
+    def set(self, day: int, value: float) -> None:
+        """Replace the value of ``day`` (a date ordinal)."""
+        self.add(day, value - self.get(day))
+
+    def remove(self, day: int) -> None:
+        """Mark ``day`` as having no data."""
+        if self._last_day is not None and self._last_day - self.size < day <= self._last_day:
+            self._clear_slot(day % self.size)
+
+    def _totals(self, as_of: Optional[int]) -> Tuple[float, float, int]:
+        """Sum, sum of squares and count as of a later day, without moving the window."""
+        total, total_sq, count = self._sum, self._sum_sq, self._count
+        if as_of is None or self._last_day is None or as_of <= self._last_day:
+            return total, total_sq, count
+        # Days that would expire by ``as_of``; at most ``size`` of them
+        for day in range(self._last_day - self.size + 1, min(as_of - self.size, self._last_day) + 1):
+            slot = day % self.size
+            if self._present[slot]:
+                value = self._values[slot]
+                total -= value
+                total_sq -= value * value
+                count -= 1
+        return total, total_sq, count
+
+    def mean(self, as_of: Optional[int] = None) -> Optional[float]:
+        """Mean over days with data, leaving out days older than ``as_of``'s window."""
+        total, _, count = self._totals(as_of)
+        return total / count if count else None
+
+    def std(self, as_of: Optional[int] = None) -> Optional[float]:
+        """Population standard deviation over days with data."""
+        total, total_sq, count = self._totals(as_of)
+        if not count:
+            return None
+        mean = total / count
+        # Running sums can drift slightly below zero variance
+        return math.sqrt(max(total_sq / count - mean * mean, 0.0))
+
+    def values(self) -> Iterable[Tuple[int, float]]:
+        """(day, value) pairs for days with data, oldest first."""
+        if self._last_day is None:
+            return []
+        days = range(self._last_day - self.size + 1, self._last_day + 1)
+        return [(day, self._values[day % self.size]) for day in days if self._present[day % self.size]]
+
+    def series(self, end: int, days: int) -> List[Optional[float]]:
+        """Values of the ``days`` days ending at ``end``, None where there is no data."""
+        if days > self.size:
+            raise ValueError(f"Cannot read {days} days from a {self.size}-day window")
+        result: List[Optional[float]] = []
+        for day in range(end - days + 1, end + 1):
+            slot = day % self.size
+            in_window = self._last_day is not None and self._last_day - self.size < day <= self._last_day
+            result.append(self._values[slot] if in_window and self._present[slot] else None)
+        return result
+
+
+class UserWindows:
+    """All rolling windows for one user."""
+
+    __slots__ = ("windows", "loaded_at", "latest_day")
+
+    def __init__(self, loaded_at: float):
+        self.windows: Dict[Tuple[str, int], RollingWindow] = {
+            (feature, size): RollingWindow(size)
+            for feature in (*WINDOW_FEATURES, LATE_MEAL_DAYS)
+            for size in WINDOW_SIZES
+        }
+        self.loaded_at = loaded_at
+        self.latest_day: Optional[int] = None
+
+    def _mark_day(self, day: int, late_meal: bool) -> None:
+        self.latest_day = day if self.latest_day is None else max(self.latest_day, day)
+        for size in WINDOW_SIZES:
+            window = self.windows[(LATE_MEAL_DAYS, size)]
+            window.set(day, max(window.get(day), 1.0 if late_meal else 0.0))
+
+    def add(self, day: int, deltas: Dict[str, float]) -> None:
+        """Add one event's contribution to a day; only the features it sets gain data."""
+        for feature in WINDOW_FEATURES:
+            if feature in deltas:
+                for size in WINDOW_SIZES:
+                    self.windows[(feature, size)].add(day, deltas[feature])
+        self._mark_day(day, deltas.get("late_meals", 0) > 0)
+
+    def set(self, day: int, values: Dict[str, Optional[float]]) -> None:
+        """Replace a day's totals with a materialized daily row; None means no data."""
+        for feature in WINDOW_FEATURES:
+            value = values.get(feature)
+            for size in WINDOW_SIZES:
+                if value is None:
+                    self.windows[(feature, size)].remove(day)
+                else:
+                    self.windows[(feature, size)].set(day, value)
+        self._mark_day(day, (values.get("late_meals") or 0) > 0)
+
+    def set_row(self, row: DailyFeature) -> None:
+        """Replace a day's totals with a ``daily_features`` row."""
+        values = {feature: getattr(row, feature) for feature in (*WINDOW_FEATURES, "late_meals")}
+        self.set(row.date.toordinal(), values)
+
+    def features(self, as_of: int) -> Dict[str, float]:
+        """Rolling averages and regularity metrics as of a day ordinal (>= latest_day); reads only."""
+        features: Dict[str, float] = {}
+        for size in WINDOW_SIZES:
+            for feature in WINDOW_FEATURES:
+                mean = self.windows[(feature, size)].mean(as_of)
+                if mean is not None:
+                    features[f"{feature}_{size}d_avg"] = mean
+
+            sleep_std = self.windows[("sleep_hours", size)].std(as_of)
+            if sleep_std is not None:
+                features[f"sleep_hours_{size}d_std"] = sleep_std
+                features[f"sleep_regularity_{size}d"] = 1.0 / (1.0 + sleep_std)
+
+            late_meal_freq = self.windows[(LATE_MEAL_DAYS, size)].mean(as_of)
+            if late_meal_freq is not None:
+                features[f"late_meal_freq_{size}d"] = late_meal_freq
+
+        # Names used by DailyFeatures in the recommendation API
+        if "calories_7d_avg" in features:
+            features["kcal_avg"] = features["calories_7d_avg"]
+        if "sleep_regularity_7d" in features:
+            features["sleep_regularity"] = features["sleep_regularity_7d"]
+        if "late_meal_freq_7d" in features:
+            features["late_meal_freq"] = features["late_meal_freq_7d"]
+        return features
+
+    def series(self, feature: str, as_of: int, days: int) -> List[Optional[float]]:
+        """Daily values of a feature for the ``days`` days ending at ``as_of``."""
+        return self.windows[(feature, max(WINDOW_SIZES))].series(as_of, days)
+
+
+class FeatureWindowStore:
+    """
+    Bounded in-process store of per-user rolling windows.
+
+    Ingest calls :meth:`observe` with each event's deltas (O(1), no I/O) for
+    users already in memory. Reads hydrate unknown users from their last 28
+    ``daily_features`` rows; hydrated state is refreshed after
+    ``max_age_seconds`` so events ingested by other processes are picked up.
+    """
+
+    def __init__(
+        self,
+        max_users: int = 50_000,
+        max_age_seconds: float = 900.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_users = max_users
+        self.max_age_seconds = max_age_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._users: "OrderedDict[str, UserWindows]" = OrderedDict()
+        # Users being hydrated -> (loads in flight, events observed meanwhile)
+        self._loading: Dict[str, List[int]] = {}
+
+    def observe(self, user_id: str, day: date, deltas: Dict[str, float]) -> None:
+        """Apply an ingested event's deltas if the user's windows are in memory."""
+        with self._lock:
+            windows = self._users.get(user_id)
+            if windows is not None:
+                windows.add(day.toordinal(), deltas)
+            elif user_id in self._loading:
+                self._loading[user_id][1] += 1
+
+    def cached_features(self, user_id: str, as_of: date) -> Optional[Dict[str, float]]:
+        """Rolling features from windows already in memory and current, without hydrating."""
+        day = as_of.toordinal()
+        with self._lock:
+            windows = self._users.get(user_id)
+            if (
+                windows is None
+                or self._clock() - windows.loaded_at >= self.max_age_seconds
+                or (windows.latest_day is not None and day < windows.latest_day)
+            ):
+                return None
+            return windows.features(day)
+
+    def forget(self, user_id: str) -> None:
+        """Drop a user's windows; they are re-hydrated on the next read."""
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def features(self, db: Session, user_id: str, as_of: date) -> Dict[str, float]:
+        """Rolling window features for a user as of a day."""
+        day = as_of.toordinal()
+        return self._read(db, user_id, as_of, lambda windows: windows.features(day))
+
+    def series(
+        self, db: Session, user_id: str, as_of: date, features: Sequence[str], days: int
+    ) -> Dict[str, List[Optional[float]]]:
+        """Daily history of ``features`` over the ``days`` days ending at ``as_of``."""
+        day = as_of.toordinal()
+        return self._read(
+            db, user_id, as_of,
+            lambda windows: {feature: windows.series(feature, day, days) for feature in features},
+        )
+
+    def _read(self, db: Session, user_id: str, as_of: date, reader: Callable[[UserWindows], T]) -> T:
+        """
+        Apply ``reader`` to the user's windows, hydrating them if needed.
+
+        Readers never move the live windows. A past day is computed from its
+        own load; so is a day after today, whose load would leave out days
+        still inside the live windows.
+        """
+        day = as_of.toordinal()
+        detached = as_of > date.today()
+        with self._lock:
+            windows = self._users.get(user_id)
+            if windows is not None and self._clock() - windows.loaded_at < self.max_age_seconds:
+                if windows.latest_day is not None and day < windows.latest_day:
+                    detached = True
+                else:
+                    self._users.move_to_end(user_id)
+                    return reader(windows)
+            loading = self._loading.setdefault(user_id, [0, 0])
+            loading[0] += 1
+            observed = loading[1]
+
+        try:
+            windows = self._load(db, user_id, as_of)
+        finally:
+            with self._lock:
+                loading[0] -= 1
+                # An event committed during the load may or may not be in it
+                detached = detached or loading[1] != observed
+                if not loading[0]:
+                    del self._loading[user_id]
+        if detached:
+            return reader(windows)
+        with self._lock:
+            self._users[user_id] = windows
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            return reader(windows)
+
+    def _load(self, db: Session, user_id: str, as_of: date) -> UserWindows:
+        oldest = as_of - timedelta(days=max(WINDOW_SIZES) - 1)
+        rows = (
+            db.query(DailyFeature)
+            .filter(
+                DailyFeature.user_id == user_id,
+                DailyFeature.date >= oldest,
+                DailyFeature.date <= as_of,
+            )
+            .order_by(DailyFeature.date)
+            .all()
+        )
+        windows = UserWindows(loaded_at=self._clock())
+        for row in rows:
+            windows.set_row(row)
+        return windows
+
+
+feature_windows = FeatureWindowStore()
@@ -0,0 +1,200 @@
+"""
+services/write_behind.py
+
+Optional write-behind mode for event ingest.
+
+With ``EVENT_WRITE_BEHIND=1`` the single-event endpoints validate an event,
+put it on a bounded in-process queue and return immediately. A background
+task drains the queue and writes micro-batches with the same chunk writer as
+``POST /events/batch``: every ``WRITE_BEHIND_FLUSH_MS`` milliseconds or
+``WRITE_BEHIND_BATCH_SIZE`` events, whichever comes first. This turns a burst
+of single-row transactions into a few bulk ones, which matters most on
+SQLite's single writer. Events are handed to the Celery dispatcher only after
+their micro-batch is committed, and events the writer skips as duplicates are
+not dispatched at all, the same as on the synchronous path.
+
+When the queue is full the endpoints answer 429 with ``Retry-After`` instead
+of letting latency pile up, and 503 while the flusher is not running, also
+after it has died. Queued events live only in memory: the
+application lifespan flushes the queue on shutdown, but events still queued
+when the process crashes are lost.
+"""
+
+import asyncio
+import logging
+import math
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from ..models.database import AsyncSessionLocal
+from .dispatch import TaskEvent, event_dispatcher
+from .event_batch import EventRow, publish_changes, store_event_chunk
+from .users import known_users
+
+logger = logging.getLogger(__name__)
+
+# Queue sentinel asking the flusher to write what it has and exit
+_STOP = object()
+
+
+class WriterUnavailable(Exception):
+    """The writer cannot take an event right now; retry after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: int, queue_full: bool):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.queue_full = queue_full
+
+
+async def write_events(rows: List[EventRow]) -> List[int]:
+    """Store a micro-batch in one transaction and publish its changes; returns duplicate indexes."""
+    async with AsyncSessionLocal() as db:
+        changes, new_users, duplicates = await db.run_sync(store_event_chunk, rows)
+    known_users.add(new_users)
+    publish_changes(changes)
+    return duplicates
+
+
+class WriteBehindWriter:
+    """Bounded event queue drained by a background micro-batching flusher."""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        max_queue: int = 10_000,
+        batch_size: int = 500,
+        flush_interval_ms: float = 50.0,
+        write: Callable[[List[EventRow]], Awaitable[List[int]]] = write_events,
+        dispatch: Callable[[List[TaskEvent]], None] = event_dispatcher.submit_many,
+    ):
+        self.enabled = enabled
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._write = write
+        self._dispatch = dispatch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._accepting = False
+        # Events accepted but not yet written, including the batch being flushed
+        self._pending = 0
+        self.written = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.batches = 0
+        self.rejected = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog is expected to be written."""
+        return max(1, math.ceil(self._pending / self.batch_size * self.flush_interval))
+
+    async def start(self) -> None:
+        """Start the flusher on the running event loop."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        self._task.add_done_callback(self._finished)
+        self._accepting = True
+
+    async def stop(self) -> None:
+        """Stop accepting events and wait until everything queued is written."""
+        if not self.running:
+            return
+        self._accepting = False
+        await self._queue.put(_STOP)
+        await self._task
+
+    def _finished(self, task: asyncio.Task) -> None:
+        if not self._accepting:
+            return
+        # Ended without stop(): crashed, or cancelled along with its event loop
+        self._accepting = False
+        error = None if task.cancelled() else task.exception()
+        logger.error(
+            "Write-behind flusher stopped unexpectedly; %d queued events were not written",
+            self._pending, exc_info=error,
+        )
+
+    def submit(self, row: EventRow, event: TaskEvent) -> None:
+        """
+        Queue an event for writing; raises WriterUnavailable instead of blocking.
+
+        ``event`` is dispatched to Celery once ``row`` has been stored, unless
+        the writer skips it as a duplicate.
+        """
+        if not self._accepting or not self.running:
+            self.rejected += 1
+            raise WriterUnavailable("Event writer is not running", retry_after=1, queue_full=False)
+        if self._pending >= self.max_queue:
+            self.rejected += 1
+            raise WriterUnavailable("Event queue is full", retry_after=self.retry_after(), queue_full=True)
+        self._pending += 1
+        self._queue.put_nowait((row, event))
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[EventRow, TaskEvent]]) -> None:
+        try:
+            duplicates = set(await self._write([row for row, _ in batch]))
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Write-behind flush of %d events failed", len(batch))
+        else:
+            self.written += len(batch) - len(duplicates)
+            self.duplicates += len(duplicates)
+            self.batches += 1
+            self._dispatch([
+                event for index, (_, event) in enumerate(batch) if index not in duplicates
+            ])
+        finally:
+            self._pending -= len(batch)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "pending": self._pending,
+            "max_queue": self.max_queue,
+            "written": self.written,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "batches": self.batches,
+            "rejected": self.rejected,
+        }
+
+
+event_writer = WriteBehindWriter(
+    enabled=os.getenv("EVENT_WRITE_BEHIND", "0").lower() in ("1", "true", "yes"),
+    max_queue=int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000")),
+    batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500")),
+    flush_interval_ms=float(os.getenv("WRITE_BEHIND_FLUSH_MS", "50")),
+)
@@ -0,0 +1,148 @@
+"""
+Benchmark concurrent read throughput: sync Session inside ``async def`` vs AsyncSession.
+
+Usage (from apps/api):
+    python benchmarks/bench_async_db.py --requests 2000 --concurrency 50 --query-ms 2
+
+Two routes serve the same daily_features lookup. ``/sync`` uses the blocking
+Session from an ``async def`` handler (the previous pattern), so every query
+stalls the event loop for all in-flight requests. ``/async`` uses the async
+engine. ``--query-ms`` adds simulated server-side latency to each request's
+query, standing in for the network round trip of a real database server;
+``--database-url`` points both routes at another database instead.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from typing import Dict
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.database import Base, async_database_url, engine_options
+from app.services.daily_features import apply_event, event_deltas, get_daily_features, row_to_metrics
+
+DAY = date(2024, 1, 1)
+
+
+def _add_sleep_function(engine, query_ms: float) -> None:
+    @event.listens_for(engine, "connect")
+    def register(dbapi_connection, _):
+        dbapi_connection.create_function("bench_sleep", 0, lambda: time.sleep(query_ms / 1000) or 0)
+
+
+def build_app(database_url: str, query_ms: float, pool_size: int) -> FastAPI:
+    # Both pools fit every in-flight request: with a smaller sync pool, a
+    # checkout blocks the loop that would run the teardown releasing connections
+    sync_engine = create_engine(database_url, **{**engine_options(database_url), "pool_size": pool_size})
+    async_url = async_database_url(database_url)
+    async_engine = create_async_engine(async_url, **{**engine_options(async_url), "pool_size": pool_size})
+    if database_url.startswith("sqlite"):
+        _add_sleep_function(sync_engine, query_ms)
+        _add_sleep_function(async_engine.sync_engine, query_ms)
+    latency = text("SELECT bench_sleep()") if database_url.startswith("sqlite") else text(
+        f"SELECT pg_sleep({query_ms / 1000})"
+    )
+
+    sync_sessions = sessionmaker(bind=sync_engine)
+    async_sessions = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    def sync_db():
+        with sync_sessions() as db:
+            yield db
+
+    async def async_db():
+        async with async_sessions() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/sync/{user_id}")
+    async def read_sync(user_id: str, db=Depends(sync_db)):
+        if query_ms:
+            db.execute(latency)
+        return row_to_metrics(get_daily_features(db, user_id, DAY))
+
+    @app.get("/async/{user_id}")
+    async def read_async(user_id: str, db=Depends(async_db)):
+        if query_ms:
+            await db.execute(latency)
+        return row_to_metrics(await db.run_sync(get_daily_features, user_id, DAY))
+
+    return app
+
+
+def seed(database_url: str, n_users: int) -> None:
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        for i in range(n_users):
+            apply_event(db, f"user-{i}", DAY, event_deltas("diet", {"calories": 100 + i}))
+        db.commit()
+    engine.dispose()
+
+
+async def drive(app: FastAPI, route: str, n_requests: int, concurrency: int, n_users: int) -> float:
+    """Issue n_requests with at most ``concurrency`` in flight; return requests/second."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue = iter(range(n_requests))
+
+        async def worker():
+            for i in queue:
+                response = await client.get(f"/{route}/user-{i % n_users}")
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return n_requests / (time.perf_counter() - start)
+
+
+def run(n_requests: int, concurrency: int, query_ms: float, database_url: str = None) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        n_users = 100
+        if database_url is None:
+            seed(url, n_users)
+        app = build_app(url, query_ms, pool_size=concurrency)
+
+        # One event loop for everything: pooled async connections are bound to it
+        async def measure() -> Dict[str, float]:
+            results = {}
+            for route in ("sync", "async"):
+                await drive(app, route, concurrency, concurrency, n_users)  # Warm up pools
+                results[route] = await drive(app, route, n_requests, concurrency, n_users)
+            return results
+
+        return asyncio.run(measure())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--query-ms", type=float, default=2.0)
+    parser.add_argument("--database-url", help="Seeded database to use instead of a temporary SQLite file")
+    args = parser.parse_args()
+
+    print(f"{'concurrency':>11} {'sync req/s':>12} {'async req/s':>12} {'speedup':>9}")
+    for concurrency in args.concurrency:
+        result = run(args.requests, concurrency, args.query_ms, args.database_url)
+        print(
+            f"{concurrency:>11} {result['sync']:>12,.0f} {result['async']:>12,.0f} "
+            f"{result['async'] / result['sync']:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
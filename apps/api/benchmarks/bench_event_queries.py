@@ -0,0 +1,125 @@
+"""
+Benchmark per-user event reads with and without the (user_id, timestamp) index.
+
+Usage (from apps/api):
+    python benchmarks/bench_event_queries.py --rows 10000000
+
+Fills a temporary SQLite events table with ``--rows`` events spread over
+``--users`` users and a year, then runs the query behind
+``GET /events/{user_id}?from=...&to=...&type=...`` before and after creating
+``ix_events_user_id_timestamp``. For each phase it prints the query plan
+(without the index a full SCAN, or with ``--type`` a walk of every event of
+that type; with it a SEARCH on a user_id/timestamp range) and the median
+latency over ``--queries`` random users.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import sqlite
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.database import Base
+from app.services.event_queries import user_events_query
+
+INDEX_NAME = "ix_events_user_id_timestamp"
+EPOCH = datetime(2024, 1, 1)
+EVENT_TYPES = ("diet", "activity", "sleep")
+
+
+def seed(path: str, n_rows: int, n_users: int, seed: int = 0) -> None:
+    """Create the schema without the composite index and bulk-load random events."""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP INDEX {INDEX_NAME}"))
+    engine.dispose()
+
+    rng = random.Random(seed)
+    seconds_per_year = 365 * 24 * 3600
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=OFF")
+    connection.execute("PRAGMA synchronous=OFF")
+    chunk = 100_000
+    for offset in range(0, n_rows, chunk):
+        rows = [
+            (
+                f"user-{rng.randrange(n_users)}",
+                rng.choice(EVENT_TYPES),
+                (EPOCH + timedelta(seconds=rng.randrange(seconds_per_year))).strftime("%Y-%m-%d %H:%M:%S.%f"),
+                rng.uniform(50, 800),
+            )
+            for _ in range(min(chunk, n_rows - offset))
+        ]
+        connection.executemany(
+            "INSERT INTO events (user_id, event_type, timestamp, calories) VALUES (?, ?, ?, ?)", rows
+        )
+        connection.commit()
+    connection.close()
+
+
+def query_plan(engine, user_id: str, start: datetime, end: datetime, event_type: Optional[str]) -> List[str]:
+    # Generated values only, so rendering them inline is safe here
+    sql = user_events_query(user_id, start, end, event_type).compile(
+        dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def time_queries(engine, n_queries: int, n_users: int, event_type: Optional[str], seed: int = 1) -> Dict[str, float]:
+    """Run the range query for random users and 30-day windows; return latency stats in ms."""
+    rng = random.Random(seed)
+    latencies = []
+    with engine.connect() as conn:
+        for _ in range(n_queries):
+            start = EPOCH + timedelta(days=rng.randrange(335))
+            stmt = user_events_query(f"user-{rng.randrange(n_users)}", start, start + timedelta(days=30), event_type)
+            began = time.perf_counter()
+            conn.execute(stmt).fetchall()
+            latencies.append((time.perf_counter() - began) * 1000)
+    return {"median_ms": statistics.median(latencies), "max_ms": max(latencies)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--type", dest="event_type", choices=EVENT_TYPES, help="Also filter on event type")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "events.db")
+        began = time.perf_counter()
+        seed(path, args.rows, args.users)
+        print(f"Seeded {args.rows:,} events for {args.users:,} users in {time.perf_counter() - began:.1f}s")
+
+        engine = create_engine(f"sqlite:///{path}")
+        sample = ("user-0", EPOCH + timedelta(days=100), EPOCH + timedelta(days=130), args.event_type)
+        for phase in ("without index", "with index"):
+            if phase == "with index":
+                began = time.perf_counter()
+                with engine.begin() as conn:
+                    conn.execute(text(f"CREATE INDEX {INDEX_NAME} ON events (user_id, timestamp)"))
+                print(f"\nCreated {INDEX_NAME} in {time.perf_counter() - began:.1f}s")
+            print(f"\n{phase}:")
+            for step in query_plan(engine, *sample):
+                print(f"  plan: {step}")
+            stats = time_queries(engine, args.queries, args.users, args.event_type)
+            print(f"  median {stats['median_ms']:.2f} ms, max {stats['max_ms']:.2f} ms over {args.queries} queries")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark /ingest/fetch with a client per request versus the shared pooled client.
+
+Usage (from apps/api):
+    python benchmarks/bench_http_client.py --requests 500 --concurrency 20
+
+Serves a small CSV from a local HTTP/1.1 server that waits ``--handshake-ms``
+on every new connection, standing in for the TCP and TLS setup of a remote
+source. The fetch route is then called ``--requests`` times, ``--concurrency``
+at a time, once opening a client per request (as the route used to) and once
+with the shared client, and the p50/p95 latency and the number of connections
+the server accepted are printed for each.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.routes.ingest import FetchRequest, fetch_remote
+from app.services.http_client import create_http_client
+
+CSV_BODY = ("timestamp,calories\n" + "".join(f"2024-01-01T08:{i:02d}:00,{100 + i}\n" for i in range(50))).encode()
+
+
+def start_server(handshake_ms: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self) -> None:
+            super().setup()
+            self.server.connections += 1
+            time.sleep(handshake_ms / 1000)
+
+        def do_GET(self) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/csv")
+            self.send_header("Content-Length", str(len(CSV_BODY)))
+            self.end_headers()
+            self.wfile.write(CSV_BODY)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run(url: str, n_requests: int, concurrency: int, fetch: Callable) -> List[float]:
+    """Call ``fetch`` for every request with bounded concurrency; return latencies in ms."""
+    payload = FetchRequest(url=url)
+    latencies: List[float] = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with gate:
+            began = time.perf_counter()
+            await fetch(payload)
+            latencies.append((time.perf_counter() - began) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    return latencies
+
+
+async def per_request(payload: FetchRequest):
+    async with httpx.AsyncClient(follow_redirects=True, timeout=15) as client:
+        return await fetch_remote(payload, client)
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {"p50_ms": statistics.median(ordered), "p95_ms": ordered[int(len(ordered) * 0.95) - 1]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--handshake-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    server = start_server(args.handshake_ms)
+    url = f"http://127.0.0.1:{server.server_address[1]}/meals.csv"
+
+    async def shared_phase() -> List[float]:
+        async with create_http_client() as client:
+            return await run(url, args.requests, args.concurrency, lambda payload: fetch_remote(payload, client))
+
+    phases = {
+        "client per request": lambda: run(url, args.requests, args.concurrency, per_request),
+        "shared client": shared_phase,
+    }
+    for name, phase in phases.items():
+        server.connections = 0
+        stats = summarize(asyncio.run(phase()))
+        print(
+            f"{name:>20}: p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms, "
+            f"{server.connections} connections for {args.requests} requests"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark the vectorized batch recommender against the per-user scalar path.
+
+Usage (from apps/api):
+    python benchmarks/bench_recommender_batch.py --users 100000
+
+Prints users/second for both paths and verifies that they produce identical
+recommendations for every generated user.
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.recommender import NutritionRecommender
+
+
+def make_features(n_users: int, seed: int = 0, null_ratio: float = 0.05) -> Dict[str, np.ndarray]:
+    """Generate random columnar daily features (with some nulls) for n_users."""
+    rng = np.random.default_rng(seed)
+    ranges = {
+        "fiber_g": (0, 40),
+        "fiber_g_7d_avg": (0, 40),
+        "water_ml": (0, 4000),
+        "protein_g": (0, 150),
+        "carbs_g": (0, 400),
+        "fat_g": (0, 150),
+        "total_calories": (0, 3500),
+        "sleep_hours": (3, 10),
+        "steps": (0, 15000),
+        "target_fiber_g": (15, 35),
+        "target_protein_g": (40, 120),
+    }
+    columns = {}
+    for name, (low, high) in ranges.items():
+        column = rng.uniform(low, high, n_users).round(1)
+        column[rng.random(n_users) < null_ratio] = np.nan
+        columns[name] = column
+    return columns
+
+
+def _row(columns: Dict[str, np.ndarray], index: int) -> Dict[str, float]:
+    return {
+        name: float(column[index])
+        for name, column in columns.items()
+        if not np.isnan(column[index])
+    }
+
+
+def run(n_users: int, top_n: int = 5, verify: bool = True) -> Dict[str, float]:
+    """Time the scalar and batch paths over n_users and return users/second."""
+    recommender = NutritionRecommender()
+    columns = make_features(n_users)
+    rows = [_row(columns, i) for i in range(n_users)]
+
+    start = time.perf_counter()
+    scalar = [recommender.generate_recommendations(row, {}, top_n=top_n) for row in rows]
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = recommender.generate_recommendations_batch(columns, top_n=top_n)
+    batch_seconds = time.perf_counter() - start
+
+    if verify and scalar != batch:
+        raise AssertionError("Batch recommendations differ from the scalar path")
+
+    return {
+        "users": n_users,
+        "scalar_users_per_second": n_users / scalar_seconds,
+        "batch_users_per_second": n_users / batch_seconds,
+        "speedup": scalar_seconds / batch_seconds,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--no-verify", action="store_true", help="Skip the scalar/batch equality check")
+    args = parser.parse_args()
+
+    print(f"{'users':>10} {'scalar users/s':>16} {'batch users/s':>16} {'speedup':>9}")
+    for n_users in args.users:
+        result = run(n_users, top_n=args.top_n, verify=not args.no_verify)
+        print(
+            f"{result['users']:>10} {result['scalar_users_per_second']:>16,.0f} "
+            f"{result['batch_users_per_second']:>16,.0f} {result['speedup']:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
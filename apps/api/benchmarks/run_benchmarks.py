@@ -0,0 +1,318 @@
+"""
+Benchmark suite for the recommendation and aggregation hot paths.
+
+Usage (from apps/api):
+    python benchmarks/run_benchmarks.py                        # run and print
+    python benchmarks/run_benchmarks.py --output results.json  # also write JSON
+    python benchmarks/run_benchmarks.py --save-baseline        # refresh the stored baseline
+    python benchmarks/run_benchmarks.py --compare              # fail on regressions
+
+Each case runs at several input sizes with fixed seeds. A timed sample calls
+a case as many times as it takes to last ``MIN_SAMPLE_SECONDS``, and the
+reported time per call is the best of ``--repeat`` samples, which is the
+most stable statistic on a shared machine.
+
+Absolute times drift with CPU frequency and load, even between two runs on
+one machine, so every sample of a case directly follows a sample of a fixed
+calibration workload, and the case's ``relative`` time is the median ratio
+of the two. ``--compare`` judges those relative times: a case slower than
+the baseline by more than ``--threshold`` is re-run ``--confirm`` times and
+counts as a regression only if it is slower every time, and any regression
+makes the runner exit with status 1.
+
+The stored baseline is still per-machine: calibration evens out noise on one
+machine, not the different ratios of another CPU or Python build. Regenerate
+it with ``--save-baseline`` on the machine that runs ``--compare`` (and after
+intended performance changes) rather than comparing against a baseline
+committed from elsewhere.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.schemas.user_input import AnalyzeMealRequest, FoodItem
+from app.services.meal_analyzer import NUTRITION_DB, analyze_meal
+from app.services.recommendations import aggregate_metrics
+from app.services.recommendations import generate_recommendations as generate_yaml_recommendations
+from app.services.recommender import NutritionRecommender
+
+from bench_recommender_batch import make_features
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_SIZES = (100, 1_000, 10_000)
+
+# A case builds its input for a size and returns the callable to time
+Case = Callable[[int], Callable[[], Any]]
+
+# Shortest timed sample; quicker cases are called repeatedly per sample
+MIN_SAMPLE_SECONDS = 0.02
+
+_CALIBRATION_VALUES = [random.Random(42).uniform(0, 1000) for _ in range(20_000)]
+
+
+def _random_events(n: int, rng: random.Random) -> List[Dict[str, Any]]:
+    events = []
+    for _ in range(n):
+        kind = rng.choice(("diet", "activity", "sleep"))
+        if kind == "diet":
+            events.append({
+                "type": "diet",
+                "calories": rng.uniform(50, 900),
+                "fiber_g": rng.uniform(0, 10),
+                "protein_g": rng.uniform(0, 40),
+                "carbs_g": rng.uniform(0, 90),
+                "fat_g": rng.uniform(0, 40),
+            })
+        elif kind == "activity":
+            events.append({"type": "activity", "steps": rng.randint(100, 5000)})
+        else:
+            events.append({"type": "sleep", "duration_minutes": rng.uniform(60, 540)})
+    return events
+
+
+def _feature_rows(n: int) -> List[Dict[str, float]]:
+    columns = make_features(n, seed=1, null_ratio=0.0)
+    return [{name: float(column[i]) for name, column in columns.items()} for i in range(n)]
+
+
+def case_aggregate_metrics(n: int) -> Callable[[], Any]:
+    events = _random_events(n, random.Random(0))
+    return lambda: aggregate_metrics(events)
+
+
+def case_recommender_scalar(n: int) -> Callable[[], Any]:
+    recommender = NutritionRecommender()
+    rows = _feature_rows(n)
+    return lambda: [recommender.generate_recommendations(row, {}) for row in rows]
+
+
+def case_recommender_batch(n: int) -> Callable[[], Any]:
+    recommender = NutritionRecommender()
+    columns = make_features(n, seed=1)
+    return lambda: recommender.generate_recommendations_batch(columns)
+
+
+def case_generate_insights(n: int) -> Callable[[], Any]:
+    recommender = NutritionRecommender()
+    rows = _feature_rows(n)
+    return lambda: [recommender.generate_insights(row) for row in rows]
+
+
+def case_yaml_recommendations(n: int) -> Callable[[], Any]:
+    rows = _feature_rows(n)
+    targets = {"fiber_g": 25, "calories": 2000}
+    return lambda: [generate_yaml_recommendations(row, targets) for row in rows]
+
+
+def case_analyze_meal(n: int) -> Callable[[], Any]:
+    rng = random.Random(0)
+    names = list(NUTRITION_DB) + ["grilled " + name for name in NUTRITION_DB] + ["unknown food"]
+    request = AnalyzeMealRequest(items=[FoodItem(name=rng.choice(names)) for _ in range(n)])
+    return lambda: analyze_meal(request)
+
+
+CASES: Dict[str, Case] = {
+    "aggregate_metrics": case_aggregate_metrics,
+    "recommender.generate_recommendations": case_recommender_scalar,
+    "recommender.generate_recommendations_batch": case_recommender_batch,
+    "recommender.generate_insights": case_generate_insights,
+    "recommendations.generate_recommendations": case_yaml_recommendations,
+    "meal_analyzer.analyze_meal": case_analyze_meal,
+}
+
+
+def calibration_workload() -> float:
+    """Fixed interpreter-bound work, timed next to every case to normalise its time."""
+    buckets: Dict[int, float] = {}
+    for value in _CALIBRATION_VALUES:
+        buckets[int(value) % 64] = buckets.get(int(value) % 64, 0.0) + value * value
+    return sum(sorted(_CALIBRATION_VALUES)[:10]) + max(buckets.values())
+
+
+def _loops(fn: Callable[[], Any]) -> int:
+    """Calls of ``fn`` per sample for a sample to last ``MIN_SAMPLE_SECONDS``; also warms it up."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= MIN_SAMPLE_SECONDS:
+            return number
+        number *= 2
+
+
+def _sample(fn: Callable[[], Any], number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number
+
+
+def time_case(fn: Callable[[], Any], repeat: int) -> Tuple[List[float], List[float]]:
+    """
+    Time ``repeat`` samples of ``fn``, each right after a sample of the calibration workload.
+
+    Returns the seconds per call in each sample of ``fn`` and of the calibration.
+    """
+    number = _loops(fn)
+    calibration_number = _loops(calibration_workload)
+    timings, calibrations = [], []
+    for _ in range(repeat):
+        calibrations.append(_sample(calibration_workload, calibration_number))
+        timings.append(_sample(fn, number))
+    return timings, calibrations
+
+
+def run_case(name: str, n: int, repeat: int) -> Dict[str, Any]:
+    """Time one case at one size; ``relative`` is its median ratio to the calibration."""
+    timings, calibrations = time_case(CASES[name](n), repeat)
+    best = min(timings)
+    return {
+        "case": name,
+        "n": n,
+        "best_seconds": best,
+        "median_seconds": statistics.median(timings),
+        "items_per_second": n / best if best else float("inf"),
+        "calibration_seconds": min(calibrations),
+        "relative": statistics.median(t / c for t, c in zip(timings, calibrations)),
+    }
+
+
+def run_suite(
+    sizes=DEFAULT_SIZES, repeat: int = 5, cases: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Run every case at every size and return JSON-serializable results."""
+    results: Dict[str, Dict[str, Any]] = {}
+    for name in CASES:
+        if cases and name not in cases:
+            continue
+        for n in sizes:
+            results[f"{name}[n={n}]"] = run_case(name, n, repeat)
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def _ratio(result: Dict[str, Any], reference: Optional[Dict[str, Any]]) -> Optional[float]:
+    """Slowdown of a result against its baseline; calibrated when both sides were calibrated."""
+    if not reference:
+        return None
+    field = "relative" if "relative" in result and "relative" in reference else "best_seconds"
+    if not reference[field]:
+        return None
+    return result[field] / reference[field]
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> Dict[str, str]:
+    """
+    Compare results against a baseline.
+
+    Returns a message keyed by case for every case whose (calibrated) time
+    regressed by more than ``threshold`` (e.g. 0.25 = 25% slower). Cases
+    missing from either side are ignored.
+    """
+    regressions = {}
+    for key, result in current["results"].items():
+        reference = baseline.get("results", {}).get(key)
+        ratio = _ratio(result, reference)
+        if ratio is not None and ratio > 1 + threshold:
+            regressions[key] = (
+                f"{key}: {result['best_seconds'] * 1e3:.3f}ms vs baseline "
+                f"{reference['best_seconds'] * 1e3:.3f}ms ({(ratio - 1) * 100:+.0f}% calibrated)"
+            )
+    return regressions
+
+
+def confirm(
+    regressions: Dict[str, str], current: Dict[str, Any], baseline: Dict[str, Any],
+    threshold: float, repeat: int, rounds: int,
+) -> Dict[str, str]:
+    """Re-run regressed cases ``rounds`` times; keep only those slower in every round."""
+    for _ in range(rounds):
+        if not regressions:
+            break
+        rerun = {
+            key: run_case(current["results"][key]["case"], current["results"][key]["n"], repeat)
+            for key in regressions
+        }
+        regressions = compare({"results": rerun}, baseline, threshold)
+    return regressions
+
+
+def _print_results(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    print(f"{'case':<58} {'best':>10} {'items/s':>14} {'vs base':>9}")
+    for key, result in results["results"].items():
+        ratio = _ratio(result, (baseline or {}).get("results", {}).get(key))
+        delta = "" if ratio is None else f"{(ratio - 1) * 100:+.0f}%"
+        print(
+            f"{key:<58} {result['best_seconds'] * 1e3:>8.3f}ms "
+            f"{result['items_per_second']:>14,.0f} {delta:>9}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation hot paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="Only run these cases")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline")
+    parser.add_argument("--compare", action="store_true", help="Exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed relative slowdown before failing (default: 0.25)")
+    parser.add_argument("--confirm", type=int, default=2,
+                        help="Re-runs a regression must reproduce in before failing (default: 2)")
+    args = parser.parse_args()
+
+    results = run_suite(sizes=args.sizes, repeat=args.repeat, cases=args.case)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+
+    if args.compare:
+        if baseline is None:
+            sys.exit(f"No baseline at {args.baseline}; run with --save-baseline first")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRe-running {len(regressions)} slower case(s) to confirm...")
+            regressions = confirm(
+                regressions, results, baseline, args.threshold, args.repeat, args.confirm
+            )
+        if regressions:
+            print("\nRegressions beyond threshold:")
+            for message in regressions.values():
+                print(f"  {message}")
+            sys.exit(1)
+        print("\nNo regressions beyond threshold.")
+
+
+if __name__ == "__main__":
+    main()
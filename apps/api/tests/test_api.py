@@ -5,26 +5,33 @@ recommendations, and security measures.
 """
 
 import pytest
+import json
 import os
 import sys
 from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 # Add parent directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-# Mock Celery before importing the app
-sys.modules['celery'] = MagicMock()
+# Publish tasks to Celery's in-memory broker instead of Redis
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
 
 # Create test database
 SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///./test_nutrition.db"
 engine = create_engine(SQLALCHEMY_TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# TestClient runs each request on a fresh event loop, so async connections are not pooled
+async_engine = create_async_engine("sqlite+aiosqlite:///./test_nutrition.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 from app.main import app, settings
-from app.models.database import Base, get_db
+from app.models.database import Base, get_async_db, get_async_sessionmaker, get_db
 
 # Create all tables for testing
 Base.metadata.create_all(bind=engine)
@@ -36,7 +43,13 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+app.dependency_overrides[get_async_sessionmaker] = lambda: TestingAsyncSessionLocal
 
 # Mock the process_event task
 with patch('app.services.tasks.process_event') as mock_process:
@@ -123,6 +136,309 @@ def test_sleep_event(mock_process) -> None:
     assert data["sleep_quality"] == 4
 
 
+@patch('app.services.tasks.process_event')
+def test_events_update_daily_features(mock_process) -> None:
+    """Test that ingested events are materialized into daily metrics."""
+    mock_process.delay = MagicMock(return_value=None)
+    user = "daily-user"
+    for food, calories, fiber in [("Apple", 95.0, 4.0), ("Oats", 150.0, 4.5)]:
+        payload = {
+            "user_id": user,
+            "timestamp": "2024-02-01T08:00:00Z",
+            "food": food,
+            "calories": calories,
+            "protein": 1.0,
+            "carbs": 20.0,
+            "fat": 0.5,
+            "fiber": fiber,
+        }
+        assert client.post("/events/diet", json=payload, headers=headers).status_code == 200
+    activity = {
+        "user_id": user,
+        "timestamp": "2024-02-01T12:00:00Z",
+        "activity_type": "walking",
+        "duration_minutes": 40.0,
+        "calories_burned": 150.0,
+        "steps": 4200,
+    }
+    assert client.post("/events/activity", json=activity, headers=headers).status_code == 200
+    sleep = {
+        "user_id": user,
+        "timestamp": "2024-02-01T23:00:00Z",
+        "duration_minutes": 390,
+        "sleep_quality": 3,
+    }
+    assert client.post("/events/sleep", json=sleep, headers=headers).status_code == 200
+
+    response = client.get(f"/api/metrics?user_id={user}&date=2024-02-01", headers=headers)
+    assert response.status_code == 200
+    metrics = response.json()
+    assert metrics["calories"] == 245.0
+    assert metrics["fiber_g"] == 8.5
+    assert metrics["steps"] == 4200
+    assert metrics["sleep_hours"] == 6.5
+
+    response = client.get(f"/recommendations/{user}?date=2024-02-01", headers=headers)
+    assert response.status_code == 200
+    ids = [rec["id"] for rec in response.json()["recommendations"]]
+    assert "sleep_quality" in ids
+    assert "activity_reminder" in ids
+
+    # A later event updates the tracked result
+    assert client.post("/events/activity", json={**activity, "steps": 8000}, headers=headers).status_code == 200
+    response = client.get(f"/recommendations/{user}?date=2024-02-01", headers=headers)
+    assert "activity_reminder" not in [rec["id"] for rec in response.json()["recommendations"]]
+
+    response = client.get(f"/recommendations/{user}?date=2024-02-02", headers=headers)
+    assert response.status_code == 404
+
+
+@patch('app.services.tasks.process_event')
+def test_batch_event_ingest_ndjson(mock_process) -> None:
+    """Test that mixed NDJSON events are stored per chunk and bad lines are reported."""
+    mock_process.delay = MagicMock(return_value=None)
+    user = "batch-user"
+    lines = [
+        {"type": "diet", "user_id": user, "timestamp": "2024-04-01T08:00:00Z", "food": "Oats",
+         "calories": 150.0, "protein": 5.0, "carbs": 27.0, "fat": 3.0, "fiber": 4.0},
+        {"type": "activity", "user_id": user, "timestamp": "2024-04-01T12:00:00Z",
+         "activity_type": "run", "duration_minutes": 30.0, "calories_burned": 300.0, "steps": 5000},
+        {"type": "sleep", "user_id": user, "timestamp": "2024-04-01T23:00:00Z"},
+        {"type": "yoga", "user_id": user, "timestamp": "2024-04-01T09:00:00Z"},
+        {"type": "sleep", "user_id": user, "timestamp": "2024-04-01T23:30:00Z",
+         "duration_minutes": 420, "sleep_quality": 4},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines[:3]) + "\n{not json\n"
+    body += "\n".join(json.dumps(line) for line in lines[3:]) + "\n"
+
+    response = client.post(
+        "/events/batch", content=body,
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["accepted"] == 3
+    assert result["rejected"] == 3
+    assert [error["line"] for error in result["errors"]] == [3, 4, 5]
+    assert "duration_minutes" in result["errors"][0]["error"]
+
+    metrics = client.get(f"/api/metrics?user_id={user}&date=2024-04-01", headers=headers).json()
+    assert metrics["calories"] == 150.0
+    assert metrics["steps"] == 5000
+    assert metrics["sleep_hours"] == 7.0
+
+
+@patch('app.services.tasks.process_event')
+def test_batch_event_ingest_json_array(mock_process) -> None:
+    """Test that a JSON array body is accepted by the batch endpoint."""
+    mock_process.delay = MagicMock(return_value=None)
+    events = [
+        {"type": "activity", "user_id": "batch-array-user", "timestamp": f"2024-04-02T0{hour}:00:00Z",
+         "activity_type": "walk", "duration_minutes": 10.0, "calories_burned": 40.0, "steps": 1000}
+        for hour in range(5)
+    ]
+    response = client.post("/events/batch", json=events, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["accepted"] == 5
+
+    metrics = client.get("/api/metrics?user_id=batch-array-user&date=2024-04-02", headers=headers).json()
+    assert metrics["steps"] == 5000
+
+
+def test_batch_event_ingest_rejects_oversized_bodies(monkeypatch) -> None:
+    """Bodies or records over the configured sizes fail with 413."""
+    from app.routers import events as events_router
+    monkeypatch.setattr(events_router, "BATCH_MAX_BYTES", 1000)
+    monkeypatch.setattr(events_router, "BATCH_MAX_RECORD_CHARS", 100)
+    ndjson_headers = {**headers, "Content-Type": "application/x-ndjson"}
+
+    line = json.dumps({"type": "sleep", "user_id": "oversized-user", "food": "x" * 200})
+    response = client.post("/events/batch", content=line, headers=ndjson_headers)
+    assert response.status_code == 413
+    assert "Line 1" in response.json()["detail"]
+
+    response = client.post("/events/batch", content=b"\n" * 2000, headers=ndjson_headers)
+    assert response.status_code == 413
+
+    def chunked():
+        yield b"\n" * 600
+        yield b"\n" * 600
+
+    response = client.post("/events/batch", content=chunked(), headers=ndjson_headers)
+    assert response.status_code == 413
+
+
+def test_resent_events_are_deduplicated() -> None:
+    """Retried single events and overlapping batches are stored, and aggregated, once."""
+    user = "retry-user"
+    payload = {
+        "user_id": user,
+        "timestamp": "2024-07-01T08:00:00Z",
+        "activity_type": "walk",
+        "duration_minutes": 20.0,
+        "calories_burned": 90.0,
+        "steps": 2500,
+    }
+    first = client.post("/events/activity", json=payload, headers=headers)
+    assert first.status_code == 200
+    assert "X-Duplicate-Event" not in first.headers
+    retry = client.post("/events/activity", json=payload, headers=headers)
+    assert retry.status_code == 200
+    assert retry.headers["X-Duplicate-Event"] == "true"
+
+    later = dict(payload, timestamp="2024-07-01T18:00:00Z")
+    batch = [{"type": "activity", **payload}, {"type": "activity", **later}, {"type": "activity", **later}]
+    result = client.post("/events/batch", json=batch, headers=headers).json()
+    assert result["accepted"] == 1
+    assert result["duplicates"] == 2
+    assert result["duplicate_lines"] == [1, 3]
+
+    metrics = client.get(f"/api/metrics?user_id={user}&date=2024-07-01", headers=headers).json()
+    assert metrics["steps"] == 5000
+    assert len(client.get(f"/events/{user}", headers=headers).json()) == 2
+
+
+def test_get_user_events_filters_by_time_range_and_type() -> None:
+    """GET /events/{user_id} applies from/to/type filters and returns events oldest first."""
+    user = "range-user"
+    records = [
+        {"type": "sleep", "user_id": user, "timestamp": "2024-03-03T23:00:00", "duration_minutes": 420, "sleep_quality": 4},
+        {"type": "diet", "user_id": user, "timestamp": "2024-03-01T08:00:00", "food": "Oats",
+         "calories": 150.0, "protein": 5.0, "carbs": 27.0, "fat": 3.0},
+        {"type": "diet", "user_id": user, "timestamp": "2024-03-02T08:00:00", "food": "Eggs",
+         "calories": 140.0, "protein": 12.0, "carbs": 1.0, "fat": 10.0},
+        {"type": "activity", "user_id": user, "timestamp": "2024-03-02T18:00:00", "activity_type": "running",
+         "duration_minutes": 30.0, "calories_burned": 300.0},
+    ]
+    assert client.post("/events/batch", json=records, headers=headers).json()["accepted"] == 4
+
+    everything = client.get(f"/events/{user}", headers=headers).json()
+    assert [event["timestamp"][:10] for event in everything] == ["2024-03-01", "2024-03-02", "2024-03-02", "2024-03-03"]
+
+    response = client.get(
+        f"/events/{user}", params={"from": "2024-03-02T00:00:00", "to": "2024-03-03T00:00:00"}, headers=headers
+    )
+    assert response.status_code == 200
+    assert [event["event_type"] for event in response.json()] == ["diet", "activity"]
+
+    response = client.get(f"/events/{user}", params={"from": "2024-03-02T00:00:00", "type": "diet"}, headers=headers)
+    assert [event["food"] for event in response.json()] == ["Eggs"]
+
+    assert client.get(f"/events/{user}", params={"type": "meal"}, headers=headers).status_code == 422
+    assert client.get(f"/events/{user}", params={"from": "yesterday"}, headers=headers).status_code == 422
+
+
+def test_get_user_events_keyset_pagination() -> None:
+    """Pages follow X-Next-Cursor without gaps or repeats; the last page has no cursor."""
+    user = "paged-user"
+    records = [
+        {"type": "activity", "user_id": user, "timestamp": f"2024-04-{day:02d}T07:00:00", "activity_type": "walking",
+         "duration_minutes": 20.0, "calories_burned": 80.0}
+        for day in range(1, 8)
+    ]
+    # Two events share a timestamp, so the cursor must also break ties by id
+    records.append(dict(records[2], activity_type="cycling"))
+    assert client.post("/events/batch", json=records, headers=headers).json()["accepted"] == 8
+
+    seen = []
+    pages = 0
+    params = {"limit": 3}
+    while True:
+        response = client.get(f"/events/{user}", params=params, headers=headers)
+        assert response.status_code == 200
+        assert len(response.json()) <= 3
+        seen.extend(event["id"] for event in response.json())
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"limit": 3, "cursor": cursor}
+    assert pages == 3
+    assert len(seen) == len(set(seen)) == 8
+    everything = client.get(f"/events/{user}", params={"limit": 100}, headers=headers)
+    assert [event["id"] for event in everything.json()] == seen
+    assert "X-Next-Cursor" not in everything.headers
+
+    assert client.get(f"/events/{user}", params={"cursor": "not-a-cursor"}, headers=headers).status_code == 422
+    assert client.get(f"/events/{user}", params={"limit": 0}, headers=headers).status_code == 422
+
+
+def test_stream_user_events_ndjson() -> None:
+    """The stream endpoint returns every matching event as one JSON object per line."""
+    user = "stream-user"
+    records = [
+        {"type": "diet", "user_id": user, "timestamp": f"2024-05-01T{hour:02d}:00:00", "food": "Rice",
+         "calories": 200.0, "protein": 4.0, "carbs": 44.0, "fat": 0.4}
+        for hour in range(6)
+    ]
+    assert client.post("/events/batch", json=records, headers=headers).json()["accepted"] == 6
+
+    response = client.get(f"/events/{user}/stream", params={"from": "2024-05-01T02:00:00"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["timestamp"] for event in events] == [f"2024-05-01T{hour:02d}:00:00" for hour in range(2, 6)]
+    assert events == client.get(f"/events/{user}", params={"from": "2024-05-01T02:00:00"}, headers=headers).json()
+
+
+def test_export_events_endpoint_is_incremental(tmp_path) -> None:
+    """POST /events/export writes stored events once; a second run has nothing new."""
+    record = {"type": "sleep", "user_id": "export-user", "timestamp": "2024-06-01T23:00:00",
+              "duration_minutes": 450, "sleep_quality": 4}
+    assert client.post("/events/batch", json=[record], headers=headers).json()["accepted"] == 1
+
+    with patch("app.routers.events.EXPORT_DIR", str(tmp_path)):
+        first = client.post("/events/export", headers=headers)
+        assert first.status_code == 200
+        assert first.json()["exported"] >= 1
+        assert (tmp_path / "event_type=sleep" / "date=2024-06-01").is_dir()
+
+        second = client.post("/events/export", headers=headers).json()
+        assert second["exported"] == 0
+        assert second["high_water_mark"] == first.json()["high_water_mark"]
+
+
+@patch('app.services.tasks.process_event')
+def test_write_behind_mode_queues_events_and_applies_backpressure(mock_process) -> None:
+    """Test that queued events are flushed and dispatched on shutdown and a full queue returns 429."""
+    from app.services import write_behind
+
+    mock_process.delay = MagicMock(return_value=None)
+    written = []
+    dispatched = []
+
+    async def write(rows):
+        written.extend(rows)
+        return []
+
+    writer = write_behind.WriteBehindWriter(
+        enabled=True, max_queue=2, batch_size=100, flush_interval_ms=60_000,
+        write=write, dispatch=dispatched.extend,
+    )
+    payload = {
+        "user_id": "write-behind-user",
+        "timestamp": "2024-05-01T08:00:00Z",
+        "activity_type": "walk",
+        "duration_minutes": 10.0,
+        "calories_burned": 40.0,
+        "steps": 1000,
+    }
+    with patch.object(write_behind, "event_writer", writer):
+        with TestClient(app) as lifespan_client:
+            for _ in range(2):
+                response = lifespan_client.post("/events/activity", json=payload, headers=headers)
+                assert response.status_code == 200
+            response = lifespan_client.post("/events/activity", json=payload, headers=headers)
+            assert response.status_code == 429
+            assert int(response.headers["Retry-After"]) >= 1
+            assert written == []
+            assert dispatched == []
+
+    assert len(written) == 2
+    assert written[0][0] == "write-behind-user"
+    assert [event_type for event_type, _ in dispatched] == ["activity", "activity"]
+
+
 # ==================== Meal Analysis ====================
 
 def test_analyze_meal() -> None:
@@ -155,12 +471,124 @@ def test_get_recommendations() -> None:
     assert response.status_code in [200, 404]
 
 
+@patch('app.services.tasks.process_event')
+def test_recommendations_are_cached_until_new_event(mock_process) -> None:
+    """Test that repeated payloads hit the cache and new events invalidate it."""
+    mock_process.delay = MagicMock(return_value=None)
+    payload = {
+        "user_id": "cache-user",
+        "daily_features": {"fiber_g": 10, "steps": 1000},
+        "user_targets": {"fiber_g": 25},
+    }
+    before = client.get("/recommendations/cache/stats", headers=headers).json()
+    first = client.post("/recommendations", json=payload, headers=headers)
+    second = client.post("/recommendations", json=payload, headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+
+    after = client.get("/recommendations/cache/stats", headers=headers).json()
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"] + 1
+
+    event = {
+        "user_id": "cache-user",
+        "timestamp": "2024-01-01T00:00:00Z",
+        "activity_type": "running",
+        "duration_minutes": 30.0,
+        "calories_burned": 300.0,
+    }
+    assert client.post("/events/activity", json=event, headers=headers).status_code == 200
+    stats = client.get("/recommendations/cache/stats", headers=headers).json()
+    assert stats["invalidations"] == after["invalidations"] + 1
+
+
+@patch('app.services.tasks.process_event')
+def test_insights_report_fiber_trend_from_history(mock_process) -> None:
+    """Test that insights fit trends over stored days and refresh after new events."""
+    mock_process.delay = MagicMock(return_value=None)
+    user = "trend-user"
+    for day, fiber in [(1, 5.0), (2, 8.0), (3, 11.0)]:
+        payload = {
+            "user_id": user,
+            "timestamp": f"2024-03-0{day}T08:00:00Z",
+            "food": "Oats",
+            "calories": 150.0,
+            "protein": 5.0,
+            "carbs": 27.0,
+            "fat": 3.0,
+            "fiber": fiber,
+        }
+        assert client.post("/events/diet", json=payload, headers=headers).status_code == 200
+
+    response = client.get(f"/recommendations/{user}/insights?date=2024-03-03", headers=headers)
+    assert response.status_code == 200
+    insights = response.json()
+    assert insights["trends"]["fiber_trend"] == "increasing"
+    assert insights["trend_slopes"]["fiber_g"] == 3.0
+
+    payload["fiber"] = -20.0
+    assert client.post("/events/diet", json=payload, headers=headers).status_code == 200
+    insights = client.get(f"/recommendations/{user}/insights?date=2024-03-03", headers=headers).json()
+    assert insights["trends"]["fiber_trend"] == "decreasing"
+
+
+def test_batch_recommendations() -> None:
+    """Test columnar batch recommendation endpoint."""
+    payload = {
+        "user_ids": ["u1", "u2"],
+        "daily_features": {
+            "fiber_g": [5, 30],
+            "sleep_hours": [5, 8],
+            "steps": [2000, None],
+        },
+        "user_targets": {"target_fiber_g": [25, 25]},
+        "top_n": 2,
+    }
+    response = client.post("/recommendations/batch", json=payload, headers=headers)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["user_id"] for r in results] == ["u1", "u2"]
+    assert [rec["id"] for rec in results[0]["recommendations"]] == [
+        "fiber_boost_simple", "sleep_quality"
+    ]
+    assert len(results[1]["recommendations"]) == 2
+
+
+def test_batch_recommendations_rejects_ragged_columns() -> None:
+    """Test that columns must align with user_ids."""
+    payload = {"user_ids": ["u1", "u2"], "daily_features": {"fiber_g": [5]}}
+    response = client.post("/recommendations/batch", json=payload, headers=headers)
+    assert response.status_code == 422
+
+
 # ==================== User Management ====================
 
 def test_user_delete() -> None:
-    """Test user deletion endpoint."""
-    response = client.delete("/users/test-user", headers=headers)
-    assert response.status_code in [204, 404]
+    """Deleting a user enqueues a job that removes their data and reports progress."""
+    user = "deleted-user"
+    records = [
+        {"type": "diet", "user_id": user, "timestamp": f"2024-08-0{day}T08:00:00", "food": "Toast",
+         "calories": 120.0, "protein": 4.0, "carbs": 20.0, "fat": 2.0}
+        for day in range(1, 4)
+    ]
+    assert client.post("/events/batch", json=records, headers=headers).json()["accepted"] == 3
+
+    response = client.delete(f"/users/{user}", headers=headers)
+    assert response.status_code == 202
+    job = response.json()
+    assert job["user_id"] == user
+    assert response.headers["Location"] == f"/users/deletion-jobs/{job['job_id']}"
+
+    status = client.get(response.headers["Location"], headers=headers).json()
+    assert status["status"] == "completed"
+    assert status["deleted"]["events"] == 3
+    assert status["deleted"]["daily_features"] == 3
+    assert client.get(f"/events/{user}", headers=headers).json() == []
+    assert client.get(f"/api/metrics?user_id={user}&date=2024-08-01", headers=headers).json()["calories"] == 0
+
+    # Once deleted, the same events are new data again
+    assert client.post("/events/batch", json=records[:1], headers=headers).json()["accepted"] == 1
+    assert client.get("/users/deletion-jobs/unknown", headers=headers).status_code == 404
 
 
 # ==================== Security Tests ====================
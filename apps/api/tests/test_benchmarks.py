@@ -0,0 +1,74 @@
+"""Tests for the benchmark runner's regression comparison and case coverage."""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+import run_benchmarks
+from run_benchmarks import CASES, compare, confirm, run_suite
+
+
+def _results(**timings):
+    return {"results": {key: {"best_seconds": seconds} for key, seconds in timings.items()}}
+
+
+def _calibrated(**timings):
+    return {"results": {
+        key: {"best_seconds": best, "relative": relative}
+        for key, (best, relative) in timings.items()
+    }}
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    """Only cases slower than the baseline by more than the threshold are reported"""
+    baseline = _results(a=1.0, b=1.0, c=1.0)
+    current = _results(a=1.2, b=1.3, c=0.5, d=9.0)
+
+    regressions = compare(current, baseline, threshold=0.25)
+
+    assert list(regressions) == ["b"]
+    assert regressions["b"].startswith("b:")
+
+
+def test_compare_uses_calibrated_times_when_both_sides_have_them():
+    """A machine twice as slow overall is not a regression; a case slower than its calibration is"""
+    baseline = _calibrated(a=(1.0, 10.0), b=(1.0, 10.0))
+    current = _calibrated(a=(2.0, 10.5), b=(1.1, 15.0))
+
+    assert list(compare(current, baseline, threshold=0.25)) == ["b"]
+    assert list(compare(_results(a=2.0, b=1.1), baseline, threshold=0.25)) == ["a"]
+
+
+def test_confirm_keeps_only_regressions_that_reproduce(monkeypatch):
+    """A slowdown seen once is dropped unless every re-run is slower too"""
+    baseline = _calibrated(flaky=(1.0, 10.0), slow=(1.0, 10.0))
+    current = {"results": {
+        key: {"case": key, "n": 5, "best_seconds": 2.0, "relative": 20.0}
+        for key in ("flaky", "slow")
+    }}
+    reruns = []
+
+    def run_case(name, n, repeat):
+        reruns.append(name)
+        relative = 20.0 if name == "slow" else 10.0
+        return {"case": name, "n": n, "best_seconds": 1.0, "relative": relative}
+
+    monkeypatch.setattr(run_benchmarks, "run_case", run_case)
+    regressions = compare(current, baseline, 0.25)
+    regressions = confirm(regressions, current, baseline, 0.25, repeat=1, rounds=2)
+
+    assert list(regressions) == ["slow"]
+    assert reruns == ["flaky", "slow", "slow"]
+
+
+def test_run_suite_covers_every_case():
+    """A tiny run produces one JSON-serializable result per case and size"""
+    results = run_suite(sizes=[5], repeat=1)
+
+    assert set(results["results"]) == {f"{name}[n=5]" for name in CASES}
+    for result in results["results"].values():
+        assert result["n"] == 5
+        assert result["best_seconds"] >= 0
+        assert result["relative"] >= 0
@@ -0,0 +1,136 @@
+"""Tests for binary fetches served from the blob store through signed URLs."""
+
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routes import blobs, ingest
+from app.routes.ingest import FetchRequest, fetch_remote
+from app.services.blob_store import BlobStore, BlobWriter
+from app.services.signed_urls import sign_url
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+class _Body(httpx.AsyncByteStream):
+    """Body read from the network, unlike ``content=`` which MockTransport pre-reads."""
+
+    def __init__(self, data: bytes):
+        self._data = data
+
+    async def __aiter__(self):
+        for start in range(0, len(self._data), 100):
+            yield self._data[start:start + 100]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch) -> BlobStore:
+    store = BlobStore(str(tmp_path / "blobs"))
+    monkeypatch.setattr(ingest, "blob_store", store)
+    monkeypatch.setattr(blobs, "blob_store", store)
+    return store
+
+
+def _fetch(payload: FetchRequest, body: bytes = PNG, content_type: str = "image/png"):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": content_type}, stream=_Body(body))
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await fetch_remote(payload, client)
+
+    return asyncio.run(scenario())
+
+
+def test_binary_fetch_returns_a_signed_url_serving_ranges(store) -> None:
+    """The image is stored once under its digest and served, in part or whole, without the API key."""
+    result = _fetch(FetchRequest(url="https://cdn.example/meal.png", signed_ttl_seconds=60))
+    assert result.data is None
+    assert result.signed_url.startswith("/blobs/")
+    assert _fetch(FetchRequest(url="https://mirror.example/meal.png")).signed_url.split("?")[0] == result.signed_url.split("?")[0]
+    assert sum(len(files) for _, _, files in os.walk(store.root)) == 1
+
+    client = TestClient(app)
+    whole = client.get(result.signed_url)
+    assert whole.status_code == 200
+    assert whole.content == PNG
+    assert whole.headers["content-type"] == "image/png"
+    assert whole.headers["x-content-type-options"] == "nosniff"
+    assert "content-disposition" not in whole.headers
+
+    part = client.get(result.signed_url, headers={"Range": "bytes=8-15"})
+    assert part.status_code == 206
+    assert part.content == PNG[8:16]
+    assert part.headers["content-range"] == f"bytes 8-15/{len(PNG)}"
+
+
+@pytest.mark.parametrize("content_type", ["text/html; charset=utf-8", "image/svg+xml", "application/javascript"])
+def test_active_content_is_served_as_a_download(store, content_type) -> None:
+    """Types a browser could run in the API's origin are sent as an octet-stream attachment."""
+    body = b"<script>alert(document.cookie)</script>"
+    signed_url = _fetch(FetchRequest(url="https://cdn.example/page"), body, content_type).signed_url
+
+    response = TestClient(app).get(signed_url)
+    assert response.status_code == 200
+    assert response.content == body
+    assert response.headers["content-type"] == "application/octet-stream"
+    assert response.headers["content-disposition"].startswith("attachment")
+    assert response.headers["x-content-type-options"] == "nosniff"
+
+
+def test_blob_file_io_runs_off_the_event_loop(store, monkeypatch) -> None:
+    """Writes and the commit run in worker threads, with small network chunks gathered first."""
+    calls = []
+    for name in ("write", "commit"):
+        def record(self, *args, _name=name, _method=getattr(BlobWriter, name)):
+            calls.append((_name, threading.current_thread() is threading.main_thread()))
+            return _method(self, *args)
+        monkeypatch.setattr(BlobWriter, name, record)
+
+    assert _fetch(FetchRequest(url="https://cdn.example/meal.png")).signed_url
+    assert calls == [("write", False), ("commit", False)]
+
+
+def test_tampered_or_expired_urls_are_refused(store) -> None:
+    """The digest, content type and expiry are all covered by the signature."""
+    signed_url = _fetch(FetchRequest(url="https://cdn.example/meal.png")).signed_url
+    client = TestClient(app)
+    assert client.get(signed_url.replace("type=image%2Fpng", "type=text%2Fhtml")).status_code == 403
+    assert client.get(signed_url[:-1] + ("0" if signed_url[-1] != "0" else "1")).status_code == 403
+
+    expired = sign_url(signed_url.split("&expires=")[0], -60)
+    assert client.get(expired).status_code == 403
+
+
+def test_oversized_binary_leaves_no_blob(store) -> None:
+    """A body cut off at max_bytes fails with 413 and is not stored."""
+    with pytest.raises(HTTPException) as caught:
+        _fetch(FetchRequest(url="https://cdn.example/meal.png", max_bytes=500))
+    assert caught.value.status_code == 413
+    assert sum(len(files) for _, _, files in os.walk(store.root)) == 0
+
+
+def test_blobs_not_stored_again_within_max_age_are_pruned(store) -> None:
+    """Storing an existing blob again restarts its age; older blobs are removed."""
+    digests = []
+    for body in (b"old", b"kept"):
+        writer = store.writer()
+        writer.write(body)
+        digests.append(writer.commit()[0])
+        os.utime(store.path(digests[-1]), (0, 0))
+    writer = store.writer()
+    writer.write(b"kept")
+    assert writer.commit() == (digests[1], False)
+
+    assert store.prune(force=True) == 1
+    assert store.size(digests[0]) is None
+    assert store.size(digests[1]) == 4
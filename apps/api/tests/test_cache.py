@@ -0,0 +1,63 @@
+"""Unit tests for the LRU + TTL result cache."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.cache import LRUTTLCache, canonical_hash
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_canonical_hash_ignores_key_order() -> None:
+    """Equal payloads hash the same regardless of dict ordering."""
+    assert canonical_hash({"a": 1, "b": {"c": 2, "d": 3}}, "v1") == canonical_hash(
+        {"b": {"d": 3, "c": 2}, "a": 1}, "v1"
+    )
+    assert canonical_hash({"a": 1}, "v1") != canonical_hash({"a": 1}, "v2")
+
+
+def test_lru_eviction_and_counters() -> None:
+    """The least recently used entry is evicted when the cache is full."""
+    cache = LRUTTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (3, 1, 1)
+
+
+def test_entries_expire_after_ttl() -> None:
+    """Entries older than the TTL are treated as misses."""
+    clock = FakeClock()
+    cache = LRUTTLCache(max_entries=10, ttl_seconds=5, clock=clock)
+    cache.set("a", 1)
+    clock.now = 4.9
+    assert cache.get("a") == 1
+    clock.now = 5.0
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_invalidate_user_drops_only_that_users_entries() -> None:
+    """Invalidation removes every entry tagged with the user."""
+    cache = LRUTTLCache(max_entries=10, ttl_seconds=60)
+    cache.set("a", 1, user_id="u1")
+    cache.set("b", 2, user_id="u1")
+    cache.set("c", 3, user_id="u2")
+
+    assert cache.invalidate_user("u1") == 2
+    assert cache.get("a") is None and cache.get("b") is None
+    assert cache.get("c") == 3
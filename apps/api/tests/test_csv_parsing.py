@@ -0,0 +1,94 @@
+"""Tests for typed, columnar CSV parsing."""
+
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import polars as pl
+import pytest
+
+from app.services.csv_parsing import CsvSchema, iter_csv_batches, to_records
+
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def _batches(text: str, schema=None, size: int = 7, batch_rows: int = 2):
+    async def collect():
+        return [batch async for batch in iter_csv_batches(_chunks(text.encode(), size), schema, batch_rows)]
+
+    return asyncio.run(collect())
+
+
+def test_rows_are_split_across_chunks_and_numbered_by_first_line() -> None:
+    """Quoted values may hold commas, quotes and newlines; blank rows are skipped."""
+    text = (
+        "﻿user_id,food,calories\r\n"
+        'u1,"rice, ""white""\nsteamed",300\r\n'
+        "\r\n"
+        ",,\r\n"
+        "u1,salad,150\r\n"
+        "u2,egg,80"
+    )
+    batches = _batches(text)
+    assert len(batches) > 1
+    assert [position for positions, _, _ in batches for position in positions] == [2, 6, 7]
+    rows = [row for _, frame, _ in batches for row in to_records(frame)]
+    assert rows[0] == {"user_id": "u1", "food": 'rice, "white"\nsteamed', "calories": 300}
+    assert [row["food"] for row in rows] == ['rice, "white"\nsteamed', "salad", "egg"]
+
+
+def test_column_types_are_inferred_once_from_the_first_batch() -> None:
+    """Signs, exponents and thousands separators are numbers; zero-padded codes stay text."""
+    text = (
+        "kcal,grams,zip,note\n"
+        '"1,234.5",-2,01234,a\n'
+        "1.5e2,+3,98765,\n"
+        "oops,4,00001,b\n"
+    )
+    batches = _batches(text, batch_rows=2)
+    first, second = batches
+    assert first[1].schema == pl.Schema({"kcal": pl.Float64, "grams": pl.Int64, "zip": pl.String, "note": pl.String})
+    assert first[1].get_column("kcal").to_list() == [1234.5, 150.0]
+    assert first[1].get_column("grams").to_list() == [-2, 3]
+    assert first[2] == {}
+    # Later batches keep the first batch's types; a cell that does not fit is an error
+    assert second[0] == [4]
+    assert second[2] == {0: "kcal: cannot read 'oops' as a number"}
+
+
+def test_declared_schema_maps_columns_onto_event_fields() -> None:
+    """Declared columns are renamed and typed like their Event fields; others are dropped."""
+    schema = CsvSchema.declared({"Energy (kcal)": "calories", "When": "timestamp", "Steps": "steps", "Who": "user_id"})
+    text = (
+        "Who,When,Energy (kcal),Steps,Ignored\n"
+        "42,2024-01-01T08:00:00Z,\"2,100\",1000,x\n"
+        "43,2024-01-01 10:30:00,95.5,12.5,y\n"
+    )
+    (positions, frame, errors), = _batches(text, lambda frame: schema, batch_rows=10)
+    assert frame.columns == ["calories", "timestamp", "steps", "user_id"]
+    assert frame.get_column("user_id").to_list() == ["42", "43"]
+    assert frame.get_column("timestamp").to_list() == [datetime(2024, 1, 1, 8), datetime(2024, 1, 1, 10, 30)]
+    assert frame.get_column("calories").to_list() == [2100.0, 95.5]
+    assert errors == {1: "Steps: cannot read '12.5' as an integer"}
+
+    with pytest.raises(ValueError, match="Unknown Event fields"):
+        CsvSchema.declared({"kcal": "energy"})
+    with pytest.raises(ValueError, match="not in the file"):
+        _batches("a,b\n1,2\n", lambda frame: schema)
+
+
+def test_quote_parity_is_carried_across_chunks() -> None:
+    """A quoted value spanning many chunks and lines is one row; one left open is a ValueError."""
+    text = 'id,note\n1,"' + "a,b\n" * 50 + '"\n2,plain\n'
+    (positions, frame, errors), = _batches(text, size=3, batch_rows=100)
+    assert positions == [2, 53]
+    assert frame.get_column("note").to_list() == ["a,b\n" * 50, "plain"]
+
+    with pytest.raises(ValueError, match="Malformed CSV between lines 2 and 3"):
+        _batches('id,note\n1,"open\n2,x\n', size=3)
@@ -0,0 +1,75 @@
+"""Tests for batched publishing of ingested events to Celery."""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Publish tasks to Celery's in-memory broker instead of Redis
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+
+from celery.contrib.testing.worker import start_worker
+
+from app.services.dispatch import EventDispatcher
+from app.services.tasks import celery_app, process_events_batch
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_publishes_full_batches_without_waiting_and_the_rest_on_stop() -> None:
+    """A full buffer is published at once; stop() publishes what is left."""
+    batches = []
+    dispatcher = EventDispatcher(publish=batches.append, batch_size=3, flush_interval_ms=60_000)
+    dispatcher.submit_many([("diet", {"n": i}) for i in range(7)])
+
+    _wait_for(lambda: len(batches) == 2)
+    assert [len(batch) for batch in batches] == [3, 3]
+    dispatcher.stop()
+    assert [event["n"] for batch in batches for _, event in batch] == list(range(7))
+    assert dispatcher.stats()["published"] == 7
+
+
+def test_publishes_partial_batches_after_the_flush_interval() -> None:
+    """Events below the batch size go out together once the interval elapses."""
+    batches = []
+    dispatcher = EventDispatcher(publish=batches.append, batch_size=100, flush_interval_ms=20)
+    dispatcher.submit("sleep", {"n": 1})
+    dispatcher.submit("diet", {"n": 2})
+
+    _wait_for(lambda: sum(len(batch) for batch in batches) == 2)
+    assert batches[0][0] == ("sleep", {"n": 1})
+    dispatcher.stop()
+
+
+def test_failed_publish_and_overflow_are_counted() -> None:
+    """A failing broker loses the batch; an overfull buffer drops the oldest events."""
+    def broken(batch):
+        raise ConnectionError("broker down")
+
+    dispatcher = EventDispatcher(publish=broken, batch_size=2, flush_interval_ms=60_000, max_buffer=3)
+    with dispatcher._condition:  # Hold the flusher off while the buffer overflows
+        dispatcher.submit_many([("diet", {"n": i}) for i in range(5)])
+        assert dispatcher.stats()["dropped"] == 2
+    dispatcher.stop()
+    assert dispatcher.stats() == {"buffered": 0, "published": 0, "batches": 0, "failed": 3, "dropped": 2}
+
+
+def test_batches_run_as_process_events_batch_tasks_on_the_in_memory_broker() -> None:
+    """Each published batch is one process_events_batch task handling all of its events."""
+    results = []
+    dispatcher = EventDispatcher(
+        publish=lambda batch: results.append(process_events_batch.delay([list(event) for event in batch])),
+        batch_size=2,
+        flush_interval_ms=20,
+    )
+    with start_worker(celery_app, perform_ping_check=False):
+        dispatcher.submit_many([("diet", {"user_id": "u1"}), ("activity", {"user_id": "u1"}), ("sleep", {"user_id": "u2"})])
+        dispatcher.stop()
+        assert [result.get(timeout=10) for result in results] == [2, 1]
@@ -0,0 +1,66 @@
+"""Unit tests for streaming batch record parsing."""
+
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from app.services.event_batch import PayloadTooLarge, RecordError, iter_records
+
+
+def _parse(body: bytes, chunk_size: int, max_record_chars=None):
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+
+    async def collect():
+        return [item async for item in iter_records(chunks(), max_record_chars)]
+
+    return asyncio.run(collect())
+
+
+def test_records_split_across_chunks_are_reassembled() -> None:
+    """Any chunking of the body yields the same records for both formats."""
+    records = [{"type": "diet", "n": i, "food": "café"} for i in range(20)] + [12345, "x"]
+    ndjson = "\n".join(json.dumps(r, ensure_ascii=False) for r in records).encode()
+    array = json.dumps(records, ensure_ascii=False).encode()
+
+    for body in (ndjson, array):
+        for chunk_size in (1, 3, 7, 64, len(body)):
+            assert _parse(body, chunk_size) == list(enumerate(records, start=1))
+
+
+def test_invalid_ndjson_lines_do_not_stop_parsing() -> None:
+    """A malformed line is reported with its line number and parsing continues."""
+    items = _parse(b'{"a": 1}\n\n{oops\n{"b": 2}', chunk_size=4)
+
+    assert items[0] == (1, {"a": 1})
+    assert items[1][0] == 3 and isinstance(items[1][1], RecordError)
+    assert items[2] == (4, {"b": 2})
+
+
+def test_truncated_array_reports_an_error() -> None:
+    """An array body cut off mid-element ends with one error."""
+    items = _parse(b'[{"a": 1}, {"b": ', chunk_size=5)
+
+    assert items[0] == (1, {"a": 1})
+    assert items[1][0] == 2 and isinstance(items[1][1], RecordError)
+    assert _parse(b" [ ] ", chunk_size=2) == []
+
+
+def test_records_over_the_size_limit_are_refused() -> None:
+    """A line or element longer than max_record_chars raises, whether complete or still arriving."""
+    large = json.dumps({"type": "diet", "food": "x" * 500})
+    small = json.dumps({"type": "diet", "food": "oats"})
+    for body in ((small + "\n" + large).encode(), f"[{small}, {large}]".encode()):
+        for chunk_size in (7, len(body)):
+            with pytest.raises(PayloadTooLarge):
+                _parse(body, chunk_size, max_record_chars=100)
+            assert _parse(body, chunk_size, max_record_chars=600)[0] == (1, json.loads(small))
+
+    with pytest.raises(PayloadTooLarge):
+        _parse(b'{"food": "' + b"x" * 500, chunk_size=10, max_record_chars=100)
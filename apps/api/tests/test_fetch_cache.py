@@ -0,0 +1,177 @@
+"""Tests for the on-disk fetch cache."""
+
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import httpx
+
+from app.services.blob_store import BlobStore, BlobWriter
+from app.services.fetch_cache import CachingTransport, FetchCache
+
+
+class _Body(httpx.AsyncByteStream):
+    """Body read from the network, unlike ``content=`` which MockTransport pre-reads."""
+
+    def __init__(self, data: bytes):
+        self._data = data
+
+    async def __aiter__(self):
+        for start in range(0, len(self._data), 4):
+            yield self._data[start:start + 4]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _cache(tmp_path, max_bytes: int = 1024, clock=None) -> FetchCache:
+    return FetchCache(str(tmp_path / "entries"), max_bytes, BlobStore(str(tmp_path / "blobs")), clock or _Clock())
+
+
+def _run(cache: FetchCache, handler, scenario):
+    async def main():
+        transport = CachingTransport(httpx.MockTransport(handler), cache)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await scenario(client)
+
+    return asyncio.run(main())
+
+
+def test_fresh_entries_are_served_without_a_request_and_stale_ones_revalidated(tmp_path) -> None:
+    """Within max-age nothing is sent; afterwards a 304 to If-None-Match serves the stored body."""
+    clock = _Clock()
+    cache = _cache(tmp_path, clock=clock)
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(dict(request.headers))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"', "Cache-Control": "max-age=60"})
+        return httpx.Response(
+            200,
+            headers={"ETag": '"v1"', "Cache-Control": "max-age=60", "Content-Type": "text/csv"},
+            stream=_Body(b"user_id,calories\nu1,300\n"),
+        )
+
+    async def scenario(client):
+        bodies = [(await client.get("https://a.example/diet.csv")).content]
+        bodies.append((await client.get("https://a.example/diet.csv")).content)
+        clock.now += 61
+        response = await client.get("https://a.example/diet.csv")
+        bodies.append(response.content)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "text/csv"
+        return bodies
+
+    bodies = _run(cache, handler, scenario)
+    assert bodies == [b"user_id,calories\nu1,300\n"] * 3
+    assert len(requests) == 2
+    assert requests[1]["if-none-match"] == '"v1"'
+    stats = cache.stats()
+    assert (stats["hits"], stats["revalidated"], stats["misses"], stats["stored"]) == (1, 1, 1, 1)
+    assert stats["hit_rate"] == 2 / 3
+
+    # Entries outlive the process
+    reloaded = _cache(tmp_path, clock=clock)
+    assert reloaded.lookup("https://a.example/diet.csv").headers["etag"] == '"v1"'
+    assert reloaded.stats()["bytes"] == len(bodies[0])
+
+
+def test_partial_and_uncacheable_responses_are_not_stored(tmp_path) -> None:
+    """Bodies closed before the end, no-store responses and credentialed requests leave no entry."""
+    cache = _cache(tmp_path)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        cache_control = "no-store" if request.url.path == "/private.csv" else "max-age=60"
+        return httpx.Response(200, headers={"Cache-Control": cache_control}, stream=_Body(b"x" * 40))
+
+    async def scenario(client):
+        async with client.stream("GET", "https://a.example/big.csv") as response:
+            async for chunk in response.aiter_raw():
+                break
+        await client.get("https://a.example/private.csv")
+        await client.get("https://a.example/secret.csv", headers={"Authorization": "Bearer t"})
+
+    _run(cache, handler, scenario)
+    assert cache.stats()["entries"] == 0
+    assert os.listdir(tmp_path / "blobs" / "tmp") == []
+
+
+def test_least_recently_used_entries_are_evicted_over_the_byte_budget(tmp_path) -> None:
+    """Blobs are deleted with their last entry once the stored bytes exceed max_bytes."""
+    cache = _cache(tmp_path, max_bytes=130)
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request.url.path)
+        return httpx.Response(200, headers={"Cache-Control": "max-age=60"}, stream=_Body(request.url.path.encode() * 10))
+
+    async def scenario(client):
+        for path in ("/a.csv", "/b.csv", "/a.csv", "/c.csv", "/a.csv", "/b.csv"):
+            await client.get(f"https://a.example{path}")
+
+    _run(cache, handler, scenario)
+    # Two 60-byte bodies fit: c evicts b (a was used more recently), then b evicts c
+    assert sent == ["/a.csv", "/b.csv", "/c.csv", "/b.csv"]
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 120, 2)
+    assert sum(len(files) for _, _, files in os.walk(tmp_path / "blobs")) == 2
+
+
+def test_disk_io_runs_off_the_event_loop(tmp_path, monkeypatch) -> None:
+    """Loading, storing, revalidating and reading entries all happen in worker threads."""
+    on_loop = []
+
+    def watch(owner, name):
+        method = getattr(owner, name)
+
+        def wrapper(*args, **kwargs):
+            if threading.current_thread() is threading.main_thread():
+                on_loop.append(name)
+            return method(*args, **kwargs)
+
+        monkeypatch.setattr(owner, name, wrapper)
+
+    for name in ("_load", "_save", "open", "discard"):
+        watch(FetchCache, name)
+    for name in ("write", "commit", "abort"):
+        watch(BlobWriter, name)
+    watch(BlobStore, "writer")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        return httpx.Response(200, headers={"ETag": '"v1"'}, stream=_Body(b"user_id,calories\nu1,300\n"))
+
+    async def scenario(client):
+        return [(await client.get("https://a.example/diet.csv")).content for _ in range(2)]
+
+    assert _run(_cache(tmp_path), handler, scenario) == [b"user_id,calories\nu1,300\n"] * 2
+    assert on_loop == []
+
+
+def test_revalidating_an_entry_evicted_meanwhile_leaves_no_orphan(tmp_path) -> None:
+    """A 304 for an entry dropped during the request does not write its JSON back."""
+    cache = _cache(tmp_path)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"ETag": '"v1"'}, stream=_Body(b"u1,300\n"))
+
+    async def scenario(client):
+        await client.get("https://a.example/diet.csv")
+
+    _run(cache, handler, scenario)
+    entry = cache.lookup("https://a.example/diet.csv")
+    cache.discard(entry.url)
+    cache.refresh(entry, httpx.Headers({"ETag": '"v2"'}))
+
+    assert os.listdir(tmp_path / "entries") == []
+    assert cache.lookup(entry.url) is None
@@ -0,0 +1,120 @@
+"""Tests for the shared outbound HTTP client."""
+
+import asyncio
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import httpx
+import pytest
+
+from app.services.http_client import PerHostLimitTransport, SharedHTTPClient
+
+
+class _Body(httpx.AsyncByteStream):
+    """Body read from the network, unlike ``content=`` which MockTransport pre-reads."""
+
+    def __init__(self, data: bytes):
+        self._data = data
+
+    async def __aiter__(self):
+        yield self._data
+
+
+def test_requests_are_capped_per_host_not_globally() -> None:
+    """Each origin gets at most max_per_host requests in flight; origins do not block each other."""
+    in_flight = Counter()
+    peak = Counter()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        in_flight[host] += 1
+        peak[host] = max(peak[host], in_flight[host])
+        peak["total"] = max(peak["total"], sum(in_flight.values()))
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        return httpx.Response(200, stream=_Body(b"ok"))
+
+    async def scenario():
+        transport = PerHostLimitTransport(httpx.MockTransport(handler), max_per_host=2)
+        async with httpx.AsyncClient(transport=transport) as client:
+            urls = [f"https://{host}/data.csv" for host in ("a.example", "b.example") for _ in range(6)]
+            responses = await asyncio.gather(*(client.get(url) for url in urls))
+        assert all(response.status_code == 200 for response in responses)
+
+    asyncio.run(scenario())
+    assert peak["a.example"] == peak["b.example"] == 2
+    assert peak["total"] == 4
+
+
+def test_slot_is_held_until_a_streamed_response_is_closed() -> None:
+    """A streaming response keeps its slot; failed requests give theirs back."""
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path == "/fail":
+            raise httpx.ConnectError("refused")
+        return httpx.Response(200, stream=_Body(b"x" * 10))
+
+    async def scenario():
+        transport = PerHostLimitTransport(httpx.MockTransport(handler), max_per_host=1)
+        async with httpx.AsyncClient(transport=transport) as client:
+            with pytest.raises(httpx.ConnectError):
+                await client.get("https://a.example/fail")
+            async with client.stream("GET", "https://a.example/big") as response:
+                second = asyncio.create_task(client.get("https://a.example/next"))
+                await asyncio.sleep(0.05)
+                assert not second.done()
+                await response.aread()
+            assert (await asyncio.wait_for(second, 1)).status_code == 200
+
+    asyncio.run(scenario())
+    assert calls == ["/fail", "/big", "/next"]
+
+
+def test_idle_hosts_do_not_keep_a_semaphore() -> None:
+    """Per-host state lasts only while requests to the host are in flight or waiting."""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, stream=_Body(b"ok"))
+
+    async def scenario():
+        transport = PerHostLimitTransport(httpx.MockTransport(handler), max_per_host=1)
+        async with httpx.AsyncClient(transport=transport) as client:
+            await asyncio.gather(*(client.get(f"https://host{i}.example/") for i in range(50)))
+            assert transport._semaphores == {}
+
+            async with client.stream("GET", "https://a.example/big"):
+                waiter = asyncio.create_task(client.get("https://a.example/next"))
+                await asyncio.sleep(0.01)
+                assert len(transport._semaphores) == 1
+                waiter.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await waiter
+            assert transport._semaphores == {}
+
+    asyncio.run(scenario())
+
+
+def test_shared_client_is_reused_until_closed() -> None:
+    """One client per event loop; closing it opens a fresh one on next use."""
+    shared = SharedHTTPClient(factory=lambda: httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(204))))
+
+    async def scenario():
+        first = shared.get()
+        assert shared.get() is first
+        await shared.aclose()
+        assert first.is_closed
+        second = shared.get()
+        assert second is not first
+        return second
+
+    second = asyncio.run(scenario())
+    # A new loop cannot use connections of the old one
+    assert asyncio.run(_get(shared)) is not second
+
+
+async def _get(shared: SharedHTTPClient) -> httpx.AsyncClient:
+    return shared.get()
@@ -0,0 +1,61 @@
+"""Tests for idempotent event ingestion."""
+
+import os
+import sys
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import Base, DailyFeature, Event
+from app.services.event_batch import store_event_chunk
+from app.services.idempotency import event_key, recent_event_keys
+
+
+def test_event_key_depends_on_content_not_field_order() -> None:
+    """Re-sent copies share a key; any change to the event gives a new one."""
+    timestamp = datetime(2024, 1, 1, 8)
+    key = event_key("u1", "diet", timestamp, {"calories": 100.0, "protein_g": 5.0})
+    assert key == event_key("u1", "diet", timestamp, {"protein_g": 5.0, "calories": 100.0})
+    assert key != event_key("u1", "diet", timestamp, {"calories": 101.0, "protein_g": 5.0})
+    assert key != event_key("u2", "diet", timestamp, {"calories": 100.0, "protein_g": 5.0})
+    assert key != event_key("u1", "diet", datetime(2024, 1, 1, 9), {"calories": 100.0, "protein_g": 5.0})
+
+
+def test_duplicates_are_skipped_in_memory_and_by_the_unique_index(tmp_path) -> None:
+    """Recent keys cost no INSERT; keys the process never saw are rejected by the index."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'events.db'}")
+    Base.metadata.create_all(bind=engine)
+    inserts = []
+    event.listen(
+        engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: inserts.append(statement) if statement.startswith("INSERT INTO events") else None,
+    )
+    sessions = sessionmaker(bind=engine)
+    recent_event_keys.clear()
+    breakfast = ("u1", "diet", datetime(2024, 1, 1, 8), {"calories": 300.0})
+    lunch = ("u1", "diet", datetime(2024, 1, 1, 13), {"calories": 500.0})
+
+    with sessions() as db:
+        changes, _, duplicates = store_event_chunk(db, [breakfast, lunch, breakfast])
+        assert duplicates == [2]
+        assert changes[("u1", date(2024, 1, 1))]["calories"] == 800.0
+
+        inserts.clear()
+        assert store_event_chunk(db, [lunch, breakfast]) == ({}, [], [0, 1])
+        assert inserts == []
+
+        # A fresh process (or another worker) has not seen the keys
+        recent_event_keys.clear()
+        dinner = ("u1", "diet", datetime(2024, 1, 1, 19), {"calories": 700.0})
+        changes, _, duplicates = store_event_chunk(db, [breakfast, dinner])
+        assert duplicates == [0]
+        assert changes == {("u1", date(2024, 1, 1)): {"calories": 700.0, "protein_g": 0.0, "carbs_g": 0.0,
+                                                       "fat_g": 0.0, "fiber_g": 0.0}}
+
+        assert db.scalar(select(func.count()).select_from(Event)) == 3
+        daily = db.get(DailyFeature, ("u1", date(2024, 1, 1)))
+        assert daily.calories == 1500.0
+        assert daily.event_count == 3
@@ -0,0 +1,107 @@
+"""Tests for streaming remote fetches in the ingest proxy."""
+
+import asyncio
+import json
+import os
+import sys
+
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.models.database import Base, Event
+from app.routes.ingest import FetchEventsRequest, FetchRequest, fetch_remote, ingest_remote, stream_remote
+
+CSV = (
+    "user_id,timestamp,food,calories,protein,carbs,fat,fiber\r\n"
+    'u1,2024-01-01T08:00:00,"rice, ""white""\nsteamed",300,6,60,1,\r\n'
+    "\r\n"
+    "u1,2024-01-01T13:00:00,salad,150,3,10,9,4\r\n"
+    "u2,2024-01-02T08:00:00,egg,80,6,1,5,\r\n"
+)
+
+
+class _Chunks(httpx.AsyncByteStream):
+    """Body arriving a few bytes at a time, without Content-Length."""
+
+    def __init__(self, data: bytes, size: int = 7):
+        self._data = data
+        self._size = size
+
+    async def __aiter__(self):
+        for start in range(0, len(self._data), self._size):
+            yield self._data[start:start + self._size]
+
+
+def _client(body: str, content_type: str = "text/csv") -> httpx.AsyncClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": content_type}, stream=_Chunks(body.encode()))
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_stream_ends_with_an_error_line_at_the_row_limit() -> None:
+    """Rows up to the limit are streamed; the limit then ends the stream."""
+    async def scenario():
+        async with _client(CSV) as client:
+            response = await stream_remote(FetchRequest(url="https://data.example/meals.csv", max_rows=2), client)
+            body = "".join([chunk async for chunk in response.body_iterator])
+            return [json.loads(line) for line in body.splitlines()]
+
+    lines = asyncio.run(scenario())
+    assert [line.get("food") for line in lines[:2]] == ['rice, "white"\nsteamed', "salad"]
+    assert lines[1]["calories"] == 150.0
+    assert lines[2] == {"error": "Remote file has more than 2 rows"}
+
+
+def test_fetch_stops_reading_at_the_byte_limit() -> None:
+    """A body without Content-Length is cut off once it passes max_bytes."""
+    async def scenario():
+        async with _client(CSV) as client:
+            with pytest.raises(HTTPException) as caught:
+                await fetch_remote(FetchRequest(url="https://data.example/meals.csv", max_bytes=64), client)
+            return caught.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 413
+    assert error.detail == "Remote file is larger than 64 bytes"
+
+
+def test_unterminated_quote_is_a_client_error() -> None:
+    """A quoted value left open to the end of the file fails with 422 and its line range."""
+    async def scenario():
+        async with _client(CSV + 'u3,2024-01-03T08:00:00,"toast,90,3,15,1,1\r\n') as client:
+            with pytest.raises(HTTPException) as caught:
+                await fetch_remote(FetchRequest(url="https://data.example/meals.csv"), client)
+            return caught.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 422
+    assert error.detail.startswith("Malformed CSV between lines 2 and 7")
+
+
+def test_remote_csv_rows_are_ingested_as_events(tmp_path) -> None:
+    """Rows take the requested type, blank cells are dropped, and the batch summary is returned."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'events.db'}")
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db, _client(CSV) as client:
+            payload = FetchEventsRequest(url="https://data.example/meals.csv", event_type="diet")
+            summary = await ingest_remote(payload, client, db)
+            stored = await db.scalar(select(func.count()).select_from(Event))
+        await engine.dispose()
+        return summary, stored
+
+    summary, stored = asyncio.run(scenario())
+    assert summary["accepted"] == stored == 3
+    assert summary["rejected"] == 0
+    assert summary["limit_exceeded"] is None
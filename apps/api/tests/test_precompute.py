@@ -0,0 +1,77 @@
+"""Tests for the nightly recommendation precompute job."""
+
+import os
+import sys
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import Base, Recommendation, User
+from app.services.daily_features import apply_event, event_deltas
+from app.services.precompute import get_precomputed, pending_user_ids, run_precompute
+from app.services.recommender import recommender
+
+DAY = date(2024, 3, 1)
+
+
+def _setup_db(tmp_path):
+    url = f"sqlite:///{tmp_path / 'precompute.db'}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    sessions = sessionmaker(bind=engine)
+    with sessions() as db:
+        for i in range(5):
+            user_id = f"user-{i}"
+            db.add(User(id=user_id))
+            apply_event(db, user_id, DAY, event_deltas("diet", {"calories": 500, "fiber_g": 2 * i}))
+            apply_event(db, user_id, DAY, event_deltas("activity", {"steps": 3000 * i}))
+        db.commit()
+    return url, sessions
+
+
+def test_precompute_writes_rows_and_resumes(tmp_path) -> None:
+    """Each user gets one row with provenance; a rerun only picks up stale users."""
+    url, sessions = _setup_db(tmp_path)
+
+    summary = run_precompute(DAY, database_url=url, chunk_size=2, workers=1)
+    assert summary["pending_users"] == 5
+    assert summary["chunks"] == 3
+    assert summary["written"] == 5
+
+    with sessions() as db:
+        row = get_precomputed(db, "user-0", DAY, recommender.rules_version)
+        assert row is not None
+        assert row.rules_applied == [rec["id"] for rec in row.content["recommendations"]]
+        assert set(row.content["trends"]) == {"fiber_trend", "activity_trend", "sleep_trend"}
+        assert "activity_reminder" in row.rules_applied
+        assert pending_user_ids(db, DAY, recommender.rules_version) == []
+
+        # A late event makes that user's precomputed row stale
+        apply_event(db, "user-3", DAY, event_deltas("activity", {"steps": 1}))
+        db.commit()
+        assert get_precomputed(db, "user-3", DAY, recommender.rules_version) is None
+        assert pending_user_ids(db, DAY, recommender.rules_version) == ["user-3"]
+
+    summary = run_precompute(DAY, database_url=url, workers=2)
+    assert summary["written"] == 1
+    with sessions() as db:
+        assert db.query(Recommendation).count() == 5
+        assert get_precomputed(db, "user-3", DAY, recommender.rules_version) is not None
+
+
+def test_precompute_matches_live_recommendations(tmp_path) -> None:
+    """Precomputed content equals evaluating the same features one user at a time."""
+    url, sessions = _setup_db(tmp_path)
+    run_precompute(DAY, database_url=url, workers=1)
+
+    with sessions() as db:
+        row = get_precomputed(db, "user-2", DAY, recommender.rules_version)
+        expected = recommender.generate_recommendations(
+            {"calories": 500.0, "total_calories": 500.0, "fiber_g": 4.0, "fiber_g_7d_avg": 4.0,
+             "steps": 6000.0, "protein_g": 0.0, "carbs_g": 0.0, "fat_g": 0.0, "sleep_hours": 0.0},
+            {},
+        )
+        assert row.content["recommendations"] == expected
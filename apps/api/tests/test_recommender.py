@@ -0,0 +1,266 @@
+"""Unit tests for the NutritionRecommender rule engine."""
+
+import os
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.recommender import NutritionRecommender, _ColumnView, generate_recommendations
+
+
+def _random_columns(n_rows: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    ranges = {
+        "fiber_g": (0, 40),
+        "fiber_g_7d_avg": (0, 40),
+        "water_ml": (0, 4000),
+        "protein_g": (0, 150),
+        "carbs_g": (0, 400),
+        "fat_g": (0, 150),
+        "total_calories": (0, 3500),
+        "sleep_hours": (3, 10),
+        "steps": (0, 15000),
+    }
+    columns = {}
+    for name, (low, high) in ranges.items():
+        column = rng.uniform(low, high, n_rows)
+        column[rng.random(n_rows) < 0.1] = np.nan
+        columns[name] = column
+    return columns
+
+
+def _row(columns: dict, index: int) -> dict:
+    return {
+        name: float(column[index])
+        for name, column in columns.items()
+        if not np.isnan(column[index])
+    }
+
+
+def test_batch_matches_scalar_path() -> None:
+    """Vectorized batch results equal per-user scalar results row by row."""
+    recommender = NutritionRecommender()
+    features = _random_columns(500)
+    targets = {
+        "target_fiber_g": np.where(np.arange(500) % 3 == 0, np.nan, 30.0),
+        "fiber_g": np.where(np.arange(500) % 7 == 0, 25.0, np.nan),
+    }
+
+    batch = recommender.generate_recommendations_batch(
+        pd.DataFrame(features), pd.DataFrame(targets), top_n=3
+    )
+
+    assert len(batch) == 500
+    for i, recs in enumerate(batch):
+        expected = recommender.generate_recommendations(
+            _row(features, i), _row(targets, i), top_n=3
+        )
+        assert recs == expected
+
+
+# Cell values around every rule threshold, and a balanced-macros day
+_THRESHOLD_VALUES = np.array([0.0, 0.4, 0.5, 0.6, 7.0, 20.0, 25.0, 50.0, 100.0, 250.0, 2000.0, 8000.0, 12000.0])
+_BALANCED_DAY = {"total_calories": 2000.0, "protein_g": 150.0, "carbs_g": 225.0, "fat_g": 66.0}
+
+
+@pytest.mark.parametrize("rule", NutritionRecommender().rules, ids=lambda rule: rule["id"])
+def test_every_rule_agrees_between_scalar_and_batch_paths(rule) -> None:
+    """Each rule's condition gives the same answer per dict and per column, with keys missing at random."""
+    rng = np.random.default_rng(0)
+    n_rows = 2000
+    columns = {}
+    for name in sorted(rule["reads"]):
+        scale = rng.choice([1.0, 40.0, 400.0, 20000.0], n_rows)
+        column = np.where(
+            rng.random(n_rows) < 0.3, rng.choice(_THRESHOLD_VALUES, n_rows), rng.uniform(0, 1, n_rows) * scale
+        )
+        column[:20] = _BALANCED_DAY.get(name, column[0])
+        column[rng.random(n_rows) < 0.25] = np.nan
+        columns[name] = column
+
+    mask = np.broadcast_to(rule["condition"](_ColumnView(columns, n_rows)), (n_rows,))
+    for i in range(n_rows):
+        assert bool(mask[i]) == NutritionRecommender._is_triggered(rule, _row(columns, i)), _row(columns, i)
+
+
+def test_batch_matches_scalar_path_with_text_and_null_cells() -> None:
+    """A string cell makes the rules that use it fail in both paths; None cells are absent keys."""
+    recommender = NutritionRecommender()
+    features = pd.DataFrame(
+        {
+            "water_ml": [500.0, "lots", None, 2500.0],
+            "protein_g": [10.0, 10.0, "n/a", None],
+            "total_calories": [2000.0, 2000.0, 2000.0, 2000.0],
+            "carbs_g": [250.0, 250.0, 250.0, 250.0],
+            "fat_g": [70.0, 70.0, 70.0, 70.0],
+            "notes": ["", "read by no rule", None, "x"],
+        },
+        index=[10, 11, 12, 13],
+    )
+
+    batch = recommender.generate_recommendations_batch(features, top_n=10)
+
+    for i, recs in enumerate(batch):
+        row = {name: value for name, value in features.iloc[i].items() if value is not None and value == value}
+        assert recs == recommender.generate_recommendations(row, {}, top_n=10)
+    ids = [{rec["id"] for rec in recs} for recs in batch]
+    assert "water_intake_reminder" in ids[0] and "water_intake_reminder" not in ids[1]
+    assert "water_intake_reminder" in ids[2]
+
+
+def test_batch_macro_balance() -> None:
+    """Balanced macros do not trigger the macro rule in the batch path."""
+    recommender = NutritionRecommender()
+    features = {
+        "total_calories": [2000.0, 2000.0, 50.0],
+        "protein_g": [150.0, 10.0, 0.0],
+        "carbs_g": [225.0, 10.0, 0.0],
+        "fat_g": [66.0, 10.0, 0.0],
+    }
+
+    batch = recommender.generate_recommendations_batch(features, top_n=10)
+
+    ids = [[rec["id"] for rec in recs] for recs in batch]
+    assert "balanced_macros" not in ids[0]
+    assert "balanced_macros" in ids[1]
+    assert "balanced_macros" not in ids[2]
+
+
+def test_rules_declare_feature_dependencies() -> None:
+    """The feature index maps each feature to the rules that read it."""
+    recommender = NutritionRecommender()
+    assert [rule["id"] for rule in recommender.rules_for_features(["steps"])] == [
+        "activity_reminder"
+    ]
+    assert {rule["id"] for rule in recommender.rules_for_features(["protein_g"])} == {
+        "protein_target", "balanced_macros"
+    }
+
+
+def test_incremental_updates_match_full_evaluation() -> None:
+    """Incremental updates give the same result as evaluating from scratch."""
+    recommender = NutritionRecommender()
+    rng = np.random.default_rng(1)
+    columns = _random_columns(50, seed=2)
+    daily, targets = {}, {}
+
+    for i in range(50):
+        changes = {
+            name: float(column[i])
+            for name, column in columns.items()
+            if rng.random() < 0.3 and not np.isnan(column[i])
+        }
+        target_changes = {"target_fiber_g": float(rng.uniform(15, 35))} if i % 5 == 0 else {}
+        daily.update(changes)
+        targets.update(target_changes)
+
+        recs = recommender.update_user_features("u1", changes, target_changes, top_n=10)
+        assert recs == recommender.generate_recommendations(daily, targets, top_n=10)
+
+
+def test_incremental_update_only_reevaluates_dependent_rules() -> None:
+    """A change to one feature re-evaluates only the rules that read it."""
+    recommender = NutritionRecommender()
+    recommender.update_user_features("u1", {"steps": 1000, "fiber_g": 5, "sleep_hours": 8})
+
+    evaluated = []
+    for rule in recommender.rules:
+        condition = rule["condition"]
+        rule["condition"] = lambda f, rule_id=rule["id"], c=condition: (
+            evaluated.append(rule_id) or c(f)
+        )
+
+    recs = recommender.update_user_features("u1", {"steps": 12000})
+
+    assert evaluated == ["activity_reminder"]
+    assert "activity_reminder" not in [rec["id"] for rec in recs]
+
+
+def test_observed_events_update_tracked_users_for_their_day() -> None:
+    """Event deltas reach a user tracked for that day; other days and stale windows do not keep state."""
+    recommender = NutritionRecommender()
+    day = date(2024, 2, 1)
+    recommender.track_user("u1", day, {"steps": 1000, "fiber_g": 5, "sleep_hours": 8}, {})
+    assert recommender.tracked_recommendations("u1", date(2024, 2, 2)) is None
+
+    evaluated = []
+    for rule in recommender.rules:
+        condition = rule["condition"]
+        rule["condition"] = lambda f, rule_id=rule["id"], c=condition: (
+            evaluated.append(rule_id) or c(f)
+        )
+    recommender.observe("u1", date(2024, 1, 31), {"steps": 11000}, {})
+    recommender.observe("u1", day, {"steps": 11000}, {})
+
+    assert evaluated == ["activity_reminder"]
+    recs = recommender.tracked_recommendations("u1", day, top_n=10)
+    assert recs == recommender.generate_recommendations({"steps": 12000, "fiber_g": 5, "sleep_hours": 8}, {}, top_n=10)
+
+    recommender.observe("u1", day, {"fiber_g": 1}, None)
+    assert recommender.tracked_recommendations("u1", day) is None
+
+
+def test_cached_results_are_returned_as_copies() -> None:
+    """Changing a returned result does not change what later calls get from the cache."""
+    payload = {"daily_features": {"fiber_g": 3, "steps": 17}, "user_targets": {"fiber_g": 25}}
+    first = generate_recommendations(payload)
+    expected = [dict(rec) for rec in first["recommendations"]]
+    first["recommendations"][0]["message"] = "changed"
+    first["recommendations"].clear()
+
+    second = generate_recommendations(payload)
+    assert second["recommendations"] == expected
+    second["recommendations"].pop()
+    assert generate_recommendations(payload)["recommendations"] == expected
+
+
+def test_persona_bundles_hold_only_applicable_rules() -> None:
+    """Each persona is dispatched to a bundle without other personas' rules."""
+    recommender = NutritionRecommender()
+    athlete = {rule["id"] for rule in recommender.bundle_for("Athletes").ranked_rules}
+    default = {rule["id"] for rule in recommender.bundle_for(None).ranked_rules}
+
+    assert {"athlete_protein", "athlete_refuel"} <= athlete
+    assert "protein_target" not in athlete
+    assert not any(rule_id.startswith(("vegan_", "shift_")) for rule_id in athlete)
+    assert not any(rule_id.startswith(("athlete_", "vegan_", "shift_")) for rule_id in default)
+    assert recommender.bundle_for("astronaut") is recommender.bundle_for(None)
+    assert recommender.bundle_for("shift-worker") is recommender.bundle_for("shift_worker")
+
+
+def test_batch_groups_rows_by_persona() -> None:
+    """Mixed-persona batches match the scalar path with each row's persona."""
+    recommender = NutritionRecommender()
+    features = _random_columns(300, seed=3)
+    features["sleep_regularity"] = np.random.default_rng(4).uniform(0, 1, 300)
+    personas = [("athlete", "vegan", "shift_worker", None, "other")[i % 5] for i in range(300)]
+
+    batch = recommender.generate_recommendations_batch(features, top_n=10, personas=personas)
+
+    for i, recs in enumerate(batch):
+        expected = recommender.generate_recommendations(
+            {**_row(features, i), "persona": personas[i]}, {}, top_n=10
+        )
+        assert recs == expected
+
+
+def test_incremental_update_switches_bundle_on_persona_change() -> None:
+    """Changing a user's persona re-evaluates them against the new bundle."""
+    recommender = NutritionRecommender()
+    daily = {"protein_g": 55.0, "steps": 15000, "carbs_g": 100.0}
+    recs = recommender.update_user_features("u1", daily, {"target_protein_g": 50})
+    assert "athlete_protein" not in [rec["id"] for rec in recs]
+
+    recs = recommender.update_user_features("u1", {"persona": "athlete"}, top_n=10)
+
+    assert [rec["id"] for rec in recs] == [
+        rec["id"] for rec in recommender.generate_recommendations(
+            {**daily, "persona": "athlete"}, {"target_protein_g": 50}, top_n=10
+        )
+    ]
+    assert {"athlete_protein", "athlete_refuel"} <= {rec["id"] for rec in recs}
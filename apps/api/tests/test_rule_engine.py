@@ -0,0 +1,75 @@
+"""Unit tests for the compiled YAML rule engine."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.rule_engine import RuleCache, RuleSyntaxError, compile_expression
+
+
+FIBER_RULE = """\
+id: fiber_boost_simple
+when:
+  daily_features.fiber_g: "< user_targets.fiber_g * 0.8"
+then:
+  message: "Eat more fiber."
+  rationale: "Fiber is below target."
+  guardrails: ["non-diagnostic"]
+"""
+
+
+def test_compile_expression_evaluates_and_reports_reads() -> None:
+    """Compiled predicates evaluate against metrics and targets."""
+    predicate, reads = compile_expression(
+        "daily_features.fiber_g < user_targets.fiber_g * 0.8 and not daily_features.steps > 10000"
+    )
+    assert predicate({"fiber_g": 10, "steps": 500}, {"fiber_g": 25})
+    assert not predicate({"fiber_g": 24, "steps": 500}, {"fiber_g": 25})
+    assert reads == {"daily_features.fiber_g", "daily_features.steps", "user_targets.fiber_g"}
+
+
+def test_missing_or_null_values_do_not_match() -> None:
+    """Missing features and None values evaluate to False instead of raising."""
+    predicate, _ = compile_expression("daily_features.fiber_g < user_targets.fiber_g")
+    assert not predicate({}, {"fiber_g": 25})
+    assert not predicate({"fiber_g": None}, {"fiber_g": 25})
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "__import__('os').system('true')",
+        "daily_features.fiber_g.__class__",
+        "open('/etc/passwd')",
+        "[x for x in daily_features]",
+        "metrics.fiber_g < 1",
+    ],
+)
+def test_compile_expression_rejects_unsafe_input(source: str) -> None:
+    """Anything outside the rule grammar is rejected at compile time."""
+    with pytest.raises(RuleSyntaxError):
+        compile_expression(source)
+
+
+def test_rule_cache_reloads_only_on_change(tmp_path) -> None:
+    """Rule files are compiled once and reloaded when their mtime changes."""
+    rule_file = tmp_path / "fiber.yaml"
+    rule_file.write_text(FIBER_RULE, encoding="utf-8")
+    cache = RuleCache(tmp_path, check_interval=0)
+
+    rules = cache.rules()
+    assert [rule.id for rule in rules] == ["fiber_boost_simple"]
+    assert rules[0].matches({"fiber_g": 5}, {"fiber_g": 25})
+    assert rules[0].raw["then"]["message"] == "Eat more fiber."
+    assert cache.rules() is rules
+
+    rule_file.write_text(FIBER_RULE.replace("0.8", "0.1"), encoding="utf-8")
+    stat = rule_file.stat()
+    os.utime(rule_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    reloaded = cache.rules()
+    assert reloaded is not rules
+    assert not reloaded[0].matches({"fiber_g": 5}, {"fiber_g": 25})
@@ -0,0 +1,111 @@
+"""Unit tests for history trend estimation."""
+
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import Base, DailyFeature, User
+from app.services.daily_features import apply_event, event_deltas
+from app.services.event_batch import publish_changes
+from app.services.trends import MIN_TREND_DAYS, TREND_DAYS, compute_trends, get_trends, least_squares_slopes
+from app.services.windows import RollingWindow, feature_windows
+
+
+def test_slopes_match_polyfit_with_missing_days() -> None:
+    """Masked least squares agrees with fitting each row's present days."""
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0, 30, (50, 14))
+    values[rng.random(values.shape) < 0.3] = np.nan
+
+    slopes = least_squares_slopes(values)
+
+    for row, slope in zip(values, slopes):
+        days = np.flatnonzero(~np.isnan(row))
+        if len(days) < MIN_TREND_DAYS:
+            assert np.isnan(slope)
+        else:
+            assert np.isclose(slope, np.polyfit(days, row[days], 1)[0])
+
+
+def test_compute_trends_labels_direction_and_sparse_history() -> None:
+    """Rising, falling, flat and too-short histories get distinct labels."""
+    results = compute_trends([
+        {"fiber_g": [5, 8, 11], "steps": [9000, 7000, 5000], "sleep_hours": [7, 7, 7]},
+        {"fiber_g": [None, None, 12], "steps": [None] * 3, "sleep_hours": [6, None, 8]},
+    ])
+
+    assert results[0]["trends"] == {
+        "fiber_trend": "increasing",
+        "activity_trend": "decreasing",
+        "sleep_trend": "stable",
+    }
+    assert results[0]["trend_slopes"]["fiber_g"] == 3.0
+    assert set(results[1]["trends"].values()) == {"insufficient-data"}
+    assert results[1]["trend_slopes"]["steps"] is None
+
+
+def test_rolling_window_series_marks_missing_and_expired_days() -> None:
+    """Series reads return None outside the window and for days without data."""
+    window = RollingWindow(7)
+    start = date(2024, 1, 1).toordinal()
+    window.add(start, 1.0)
+    window.add(start + 2, 3.0)
+    window.add(start + 7, 8.0)
+
+    assert window.series(start + 8, 7) == [3.0, None, None, None, None, 8.0, None]
+    assert window.series(start + 6, 7)[0] is None  # Expired when start + 7 was added
+
+
+def test_future_dated_trends_leave_current_trends_intact(tmp_path) -> None:
+    """Later-dated trend and feature reads, which share the windows, do not expire today's history."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'trends.db'}")
+    Base.metadata.create_all(bind=engine)
+    today = date.today()
+    with sessionmaker(bind=engine)() as db:
+        db.add(User(id="future-trend-user"))
+        db.add_all(
+            DailyFeature(user_id="future-trend-user", date=today - timedelta(days=offset), fiber_g=20.0 - 3 * offset)
+            for offset in range(3)
+        )
+        db.commit()
+
+        assert get_trends(db, "future-trend-user", today)["trends"]["fiber_trend"] == "increasing"
+        later = today + timedelta(days=60)
+        assert get_trends(db, "future-trend-user", later)["trends"]["fiber_trend"] == "insufficient-data"
+        assert "fiber_g_7d_avg" not in feature_windows.features(db, "future-trend-user", later)
+        publish_changes({("future-trend-user", today): {"fiber_g": 6.0}})
+        trends = get_trends(db, "future-trend-user", today)
+    assert trends["trends"]["fiber_trend"] == "increasing"
+    assert trends["trend_slopes"]["fiber_g"] == 6.0
+
+
+def test_sleep_trend_is_fitted_over_nights_with_sleep_data(tmp_path) -> None:
+    """Days with meals but no sleep event are gaps in the sleep series, not nights of zero sleep."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'trends.db'}")
+    Base.metadata.create_all(bind=engine)
+    today = date.today()
+    with sessionmaker(bind=engine)() as db:
+        db.add_all([User(id="sleep-gap-user"), User(id="sleep-sparse-user")])
+        for offset in range(TREND_DAYS):
+            day = today - timedelta(days=offset)
+            for user_id in ("sleep-gap-user", "sleep-sparse-user"):
+                apply_event(db, user_id, day, event_deltas("diet", {"calories": 500.0, "fiber_g": 10.0}))
+            if offset % 2 == 0:
+                apply_event(db, "sleep-gap-user", day, event_deltas("sleep", {"sleep_hours": 8.0 - 0.1 * offset}))
+            if offset < MIN_TREND_DAYS - 1:
+                apply_event(db, "sleep-sparse-user", day, event_deltas("sleep", {"sleep_hours": 7.0}))
+        db.commit()
+
+        gaps = get_trends(db, "sleep-gap-user", today)
+        sparse = get_trends(db, "sleep-sparse-user", today)
+    assert np.isclose(gaps["trend_slopes"]["sleep_hours"], 0.1)
+    assert gaps["trends"]["sleep_trend"] == "increasing"
+    assert sparse["trends"]["sleep_trend"] == "insufficient-data"
+    assert sparse["trends"]["fiber_trend"] == "stable"
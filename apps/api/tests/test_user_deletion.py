@@ -0,0 +1,102 @@
+"""Tests for chunked background deletion of user data."""
+
+import asyncio
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import Base, DailyFeature, Event, Recommendation, User, UserDeletionJob, UserTarget
+from app.services.user_deletion import create_deletion_job, run_deletion_job
+
+
+def _seed(path) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        for user_id, n_events in (("gone", 25), ("kept", 3)):
+            db.add(User(id=user_id))
+            for i in range(n_events):
+                db.add(Event(user_id=user_id, event_type="diet", timestamp=datetime(2024, 1, 1 + i % 5, 8, i)))
+            for day in range(1, 6):
+                db.add(DailyFeature(user_id=user_id, date=date(2024, 1, day), calories=100.0))
+            db.add(Recommendation(id=f"rec-{user_id}", user_id=user_id, date=date(2024, 1, 5), model_version="v1"))
+            db.add(UserTarget(user_id=user_id, kcal=2000.0))
+        db.commit()
+    engine.dispose()
+
+
+def _count(path, model, user_id) -> int:
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.connect() as conn:
+        count = conn.scalar(select(func.count()).select_from(model).where(model.user_id == user_id))
+    engine.dispose()
+    return count
+
+
+def test_deletes_in_chunks_and_records_progress(tmp_path) -> None:
+    """Every table is emptied in bounded transactions; other users are untouched."""
+    path = tmp_path / "users.db"
+    _seed(path)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    deletes = []
+    event.listen(
+        engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: deletes.append(statement) if statement.startswith("DELETE FROM events") else None,
+    )
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def scenario():
+        async with sessions() as db:
+            job = await create_deletion_job(db, "gone")
+            assert (await create_deletion_job(db, "gone")).id == job.id
+        await run_deletion_job(sessions, job.id, chunk_size=10, pause_ms=0)
+        async with sessions() as db:
+            done = await db.get(UserDeletionJob, job.id)
+            assert await db.get(User, "gone") is None
+            assert await db.get(User, "kept") is not None
+        await engine.dispose()
+        return done
+
+    job = asyncio.run(scenario())
+    assert job.status == "completed"
+    assert job.deleted == {"events": 25, "daily_features": 5, "recommendations": 1, "user_targets": 1}
+    assert job.finished_at is not None
+    assert len(deletes) == 3  # 10 + 10 + 5 events
+    for model in (Event, DailyFeature, Recommendation, UserTarget):
+        assert _count(path, model, "gone") == 0
+    assert _count(path, Event, "kept") == 3
+
+
+def test_job_runs_once_unless_its_runner_went_stale(tmp_path) -> None:
+    """A claimed job is not run again, except after it stopped making progress."""
+    path = tmp_path / "users.db"
+    _seed(path)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def scenario():
+        async with sessions() as db:
+            job = await create_deletion_job(db, "gone")
+            job.status = "running"  # Claimed by a process that is still alive
+            await db.commit()
+        await run_deletion_job(sessions, job.id, pause_ms=0)
+        assert _count(path, Event, "gone") == 25
+
+        async with sessions() as db:
+            job = await db.get(UserDeletionJob, job.id)
+            job.updated_at = datetime.utcnow() - timedelta(hours=1)  # ...that has since died
+            await db.commit()
+        await run_deletion_job(sessions, job.id, pause_ms=0)
+        async with sessions() as db:
+            status = (await db.get(UserDeletionJob, job.id)).status
+        await engine.dispose()
+        return status
+
+    assert asyncio.run(scenario()) == "completed"
+    assert _count(path, Event, "gone") == 0
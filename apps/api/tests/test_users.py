@@ -0,0 +1,51 @@
+"""Tests for the known-user cache used on event ingest."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import Base, User
+from app.services.users import KnownUserCache, ensure_users, known_users
+
+
+def test_known_user_cache_evicts_least_recently_used() -> None:
+    """The cache is bounded and refreshes ids on lookup."""
+    cache = KnownUserCache(max_entries=2)
+    cache.add(["a", "b"])
+    assert "a" in cache
+    cache.add(["c"])
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    cache.discard("a")
+    assert "a" not in cache
+
+
+def test_ensure_users_skips_the_database_for_known_users(tmp_path) -> None:
+    """New ids are upserted once; cached ids cost no statements at all."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}")
+    Base.metadata.create_all(bind=engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    sessions = sessionmaker(bind=engine)
+    known_users.clear()
+
+    with sessions() as db:
+        db.add(User(id="existing"))
+        db.commit()
+        statements.clear()
+
+        created = ensure_users(db, ["existing", "new", "new"])
+        db.commit()
+        known_users.add(created)
+        assert created == ["existing", "new"]
+        assert len(statements) == 1  # One INSERT ... ON CONFLICT DO NOTHING
+
+        statements.clear()
+        assert ensure_users(db, ["existing", "new"]) == []
+        assert statements == []
+        assert {user.id for user in db.query(User)} == {"existing", "new"}
@@ -0,0 +1,138 @@
+"""Unit tests for rolling window features."""
+
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import Base, DailyFeature, User
+from app.services.daily_features import apply_event, event_deltas
+from app.services.windows import FeatureWindowStore, RollingWindow, UserWindows
+
+
+def _sessions(tmp_path, user_id: str, days):
+    engine = create_engine(f"sqlite:///{tmp_path / 'windows.db'}")
+    Base.metadata.create_all(bind=engine)
+    sessions = sessionmaker(bind=engine)
+    with sessions() as db:
+        db.add(User(id=user_id))
+        db.add_all(DailyFeature(user_id=user_id, date=day, fiber_g=10.0) for day in days)
+        db.commit()
+    return sessions
+
+
+def test_rolling_window_matches_naive_computation() -> None:
+    """Running sums agree with recomputing the window from scratch."""
+    rng = np.random.default_rng(0)
+    window = RollingWindow(7)
+    history = {}
+    day = date(2024, 1, 1).toordinal()
+
+    for _ in range(200):
+        day += int(rng.integers(0, 3))
+        value = float(rng.uniform(0, 12))
+        window.add(day, value)
+        history[day] = history.get(day, 0.0) + value
+
+        in_window = [v for d, v in history.items() if day - 7 < d <= day]
+        assert window.count == len(in_window)
+        assert np.isclose(window.mean(), np.mean(in_window))
+        assert np.isclose(window.std(), np.std(in_window))
+
+
+def test_rolling_window_expires_old_days_on_read() -> None:
+    """Reading as of a later day drops days that fell out of the window."""
+    window = RollingWindow(7)
+    start = date(2024, 1, 1).toordinal()
+    window.add(start, 10.0)
+    window.add(start + 3, 20.0)
+
+    assert window.mean(as_of=start + 6) == 15.0
+    assert window.mean(as_of=start + 7) == 20.0
+    assert window.mean(as_of=start + 30) is None
+
+
+def test_user_windows_features() -> None:
+    """Averages, sleep regularity and late-meal frequency over the last 7 days."""
+    windows = UserWindows(loaded_at=0.0)
+    start = date(2024, 1, 1).toordinal()
+    for offset, (fiber, sleep, late) in enumerate([(10, 7, 0), (20, 7, 1), (30, 7, 0), (40, 7, 1)]):
+        windows.add(start + offset, {"fiber_g": fiber, "late_meals": late})
+        windows.add(start + offset, {"sleep_hours": sleep})
+
+    features = windows.features(start + 3)
+    assert features["fiber_g_7d_avg"] == 25.0
+    assert features["fiber_g_28d_avg"] == 25.0
+    assert features["sleep_regularity"] == 1.0
+    assert features["late_meal_freq_7d"] == 0.5
+
+
+def test_future_reads_leave_the_live_windows_in_place(tmp_path) -> None:
+    """Reading a later day drops expired days from the result only; new events still count."""
+    today = date.today()
+    sessions = _sessions(tmp_path, "u1", [today - timedelta(days=2), today - timedelta(days=1)])
+    store = FeatureWindowStore()
+
+    with sessions() as db:
+        assert store.features(db, "u1", today)["fiber_g_7d_avg"] == 10.0
+        assert "fiber_g_7d_avg" not in store.features(db, "u1", today + timedelta(days=400))
+        assert "fiber_g_7d_avg" not in store.features(db, "u1", today + timedelta(days=30))
+        store.observe("u1", today, {"fiber_g": 40.0})
+        assert store.features(db, "u1", today)["fiber_g_7d_avg"] == 20.0
+        assert store.series(db, "u1", today, ("fiber_g",), 3)["fiber_g"] == [10.0, 10.0, 40.0]
+
+
+def test_windows_loaded_while_events_arrive_are_not_kept(tmp_path) -> None:
+    """An event observed during hydration may be missing from the load, so the load is read once and dropped."""
+    today = date.today()
+    sessions = _sessions(tmp_path, "u1", [today])
+    store = FeatureWindowStore()
+    load = store._load
+
+    def load_with_event(db, user_id, as_of):
+        windows = load(db, user_id, as_of)
+        store.observe(user_id, today, {"fiber_g": 40.0})
+        return windows
+
+    store._load = load_with_event
+    with sessions() as db:
+        assert store.features(db, "u1", today)["fiber_g_7d_avg"] == 10.0
+        store._load = load
+        db.get(DailyFeature, ("u1", today)).fiber_g = 50.0
+        db.commit()
+        assert store.features(db, "u1", today)["fiber_g_7d_avg"] == 50.0
+
+
+def test_days_without_sleep_data_leave_sleep_features_alone(tmp_path) -> None:
+    """A diet-only day counts for nutrients but not for sleep averages or regularity, live or hydrated."""
+    today = date.today()
+    sessions = _sessions(tmp_path, "u1", [])
+    with sessions() as db:
+        for offset, sleep in ((2, 7.0), (1, 8.0)):
+            apply_event(db, "u1", today - timedelta(days=offset), event_deltas("sleep", {"sleep_hours": sleep}))
+        db.commit()
+
+    store = FeatureWindowStore()
+    meal = event_deltas("diet", {"calories": 500.0})
+    with sessions() as db:
+        before = store.features(db, "u1", today)
+        store.observe("u1", today, meal)
+        live = store.features(db, "u1", today)
+        apply_event(db, "u1", today, meal)
+        db.commit()
+        assert db.get(DailyFeature, ("u1", today)).sleep_hours is None
+        store.forget("u1")
+        hydrated = store.features(db, "u1", today)
+
+    assert before["sleep_hours_7d_avg"] == 7.5
+    for features in (live, hydrated):
+        for name in ("sleep_hours_7d_avg", "sleep_hours_7d_std", "sleep_regularity"):
+            assert features[name] == before[name]
+        assert features["calories_7d_avg"] == 500.0
+        assert "steps_7d_avg" not in features
@@ -0,0 +1,133 @@
+"""Unit tests for the write-behind event writer."""
+
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.write_behind import WriterUnavailable, WriteBehindWriter
+
+
+def _event(i: int):
+    return (
+        (f"user-{i}", "activity", datetime(2024, 1, 1, 12), {"steps": i}),
+        ("activity", {"user_id": f"user-{i}", "steps": i}),
+    )
+
+
+def _writer(batches, dispatched=None, duplicates=(), **options):
+    async def write(rows):
+        batches.append(list(rows))
+        return [index for index, row in enumerate(rows) if row[0] in duplicates]
+
+    dispatch = (dispatched if dispatched is not None else []).extend
+    return WriteBehindWriter(enabled=True, write=write, dispatch=dispatch, **options)
+
+
+def test_flushes_full_batches_and_drains_on_stop() -> None:
+    """Full batches are written right away; the remainder is written on stop."""
+    batches = []
+
+    async def scenario():
+        writer = _writer(batches, batch_size=3, flush_interval_ms=60_000)
+        await writer.start()
+        for i in range(7):
+            writer.submit(*_event(i))
+        await asyncio.sleep(0.05)
+        assert [len(batch) for batch in batches] == [3, 3]
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert writer.stats()["written"] == 7
+
+
+def test_flushes_partial_batch_after_interval() -> None:
+    """A partial batch is written once the flush interval elapses."""
+    batches = []
+
+    async def scenario():
+        writer = _writer(batches, batch_size=100, flush_interval_ms=20)
+        await writer.start()
+        writer.submit(*_event(1))
+        writer.submit(*_event(2))
+        await asyncio.sleep(0.2)
+        assert [len(batch) for batch in batches] == [2]
+        await writer.stop()
+
+    asyncio.run(scenario())
+
+
+def test_rejects_when_full_or_stopped() -> None:
+    """A full queue and a stopped writer raise instead of blocking."""
+    batches = []
+
+    async def scenario():
+        writer = _writer(batches, max_queue=2, batch_size=100, flush_interval_ms=60_000)
+        with pytest.raises(WriterUnavailable) as stopped:
+            writer.submit(*_event(0))
+        assert not stopped.value.queue_full
+
+        await writer.start()
+        # Events waiting for the flush interval count towards the bound
+        writer.submit(*_event(1))
+        writer.submit(*_event(2))
+        with pytest.raises(WriterUnavailable) as full:
+            writer.submit(*_event(3))
+        assert full.value.queue_full
+        assert full.value.retry_after >= 1
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert sum(len(batch) for batch in batches) == 2
+
+
+def test_rejects_once_the_flusher_has_died(caplog) -> None:
+    """A flusher that ended without stop() is logged and turns events away with 503, not 429."""
+    batches = []
+
+    async def scenario():
+        writer = _writer(batches, batch_size=100, flush_interval_ms=60_000)
+        await writer.start()
+        writer.submit(*_event(1))
+        writer._task.cancel()
+        await asyncio.sleep(0)
+        assert not writer.running
+        with pytest.raises(WriterUnavailable) as stopped:
+            writer.submit(*_event(2))
+        assert not stopped.value.queue_full
+        await writer.stop()
+
+    with caplog.at_level(logging.ERROR, logger="app.services.write_behind"):
+        asyncio.run(scenario())
+    assert "1 queued events were not written" in caplog.text
+    assert batches == []
+
+
+def test_dispatches_only_stored_events_after_the_write() -> None:
+    """Nothing reaches the task queue before its batch is written, and duplicates never do."""
+    batches = []
+    dispatched = []
+
+    async def scenario():
+        writer = _writer(
+            batches, dispatched, duplicates={"user-2"}, batch_size=100, flush_interval_ms=60_000
+        )
+        await writer.start()
+        for i in range(3):
+            writer.submit(*_event(i))
+        await asyncio.sleep(0.05)
+        assert dispatched == []
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert [event["user_id"] for _, event in dispatched] == ["user-0", "user-1"]
+    assert writer.stats()["written"] == 2
+    assert writer.stats()["duplicates"] == 1
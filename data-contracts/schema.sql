@@ -11,15 +11,20 @@ CREATE TABLE IF NOT EXISTS events(
 CREATE TABLE IF NOT EXISTS daily_features(
   user_id UUID NOT NULL,
   date DATE NOT NULL,
+  calories NUMERIC,
   kcal_avg NUMERIC,
   protein_g NUMERIC,
+  carbs_g NUMERIC,
+  fat_g NUMERIC,
   fiber_g NUMERIC,
+  late_meals INTEGER DEFAULT 0,
   late_meal_freq NUMERIC,
   steps NUMERIC,
   sleep_hours NUMERIC,
   sleep_regularity NUMERIC,
   ultra_processed_ratio NUMERIC,
   persona TEXT,
+  event_count INTEGER DEFAULT 0,
   PRIMARY KEY(user_id, date)
 );
 
@@ -33,5 +38,7 @@ CREATE TABLE IF NOT EXISTS recommendations(
   rules_applied TEXT[],
   model_version TEXT,
   status TEXT,
-  feedback JSONB
+  feedback JSONB,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  UNIQUE(user_id, date, model_version)
 );